@@ -21,7 +21,9 @@ import logging
 import math
 import os
 import shutil
+import sys
 import time
+import tracemalloc
 
 import coloredlogs
 import pymongo
@@ -31,10 +33,20 @@ from dotenv import load_dotenv
 import analyzer
 from . import utilities
 from .data import *
-from .process import process_user
+from .equivalence import TOLERANCE, compare_user
+from .manifest import Manifest, run_options
+from .metrics import METRICS
+from .process import process_user, process_users, process_users_pipelined
 from .notifier import notify
 
 
+def fraction_type(value: str) -> float:
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError(f"{value} is not in [0, 1]")
+    return value
+
+
 def set_up_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         prog=analyzer.__prog__,
@@ -76,6 +88,129 @@ def set_up_args() -> argparse.Namespace:
         dest="multiprocessing_enabled",
         help='Enables multiprocessing (it will use all the available CPU minus two).'
     )
+    parser.add_argument(
+        '--workers', '-w',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Process N users at the same time, each one in its own process '
+             '(the users with more interactions are processed first).'
+    )
+    parser.add_argument(
+        '--chunks',
+        metavar='N',
+        type=int,
+        default=0,
+        help='Split the timeline of each user into N chunks and process them '
+             'in parallel (implies --columnar). The chunks overlap by half '
+             'of the widest range, so the results do not change.'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        dest='pruning_enabled',
+        help='Calculate the ranges only on the interactions closer than half '
+             'of the widest range to an emotion frame, dropping the others '
+             'once they are saved (implies --columnar).'
+    )
+    parser.add_argument(
+        '--sample-fraction',
+        metavar='FRACTION',
+        type=fraction_type,
+        default=None,
+        help='Calculate the ranges of a random FRACTION (in [0, 1]) of the '
+             'emotion frames of each user, as done by the split of the '
+             'classification (implies --columnar).'
+    )
+    parser.add_argument(
+        '--stratified',
+        action='store_true',
+        dest='stratification_enabled',
+        help='With --sample-fraction, select up to the same number of '
+             'emotion frames for each of the 7 discretized values of each '
+             'emotion, as done by sample.py.'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='The seed of --sample-fraction (default: 0).'
+    )
+    parser.add_argument(
+        '--columnar',
+        action='store_true',
+        dest="columnar_enabled",
+        help='Store the interactions column by column, using typed arrays '
+             'instead of an object for each interaction.'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        dest="streaming_enabled",
+        help='Stream the interactions from the database sorted by timestamp, '
+             'fetching only the analyzed fields (implies --columnar).'
+    )
+    parser.add_argument(
+        '--cache',
+        metavar='DIR',
+        default=None,
+        dest='cache_dir',
+        help='Keep a copy of the interactions of each user in this directory '
+             'and fetch only the new ones in the following runs (implies '
+             '--columnar).'
+    )
+    parser.add_argument(
+        '--pipeline',
+        metavar='DEPTH',
+        type=int,
+        default=0,
+        dest='pipeline_depth',
+        help='Load the next users and write the results of the previous ones '
+             'while a user is being processed, keeping at most DEPTH users '
+             'waiting between two stages.'
+    )
+    parser.add_argument(
+        '--format',
+        choices=utilities.OUTPUT_FORMATS,
+        default='csv',
+        dest='output_format',
+        help='Set the format of the files of the interactions and of the '
+             'aggregate data (parquet requires pyarrow). With npy, the '
+             'aggregate data of each width is written as a tensor that can '
+             'be memory-mapped.'
+    )
+    parser.add_argument(
+        '--tracemalloc',
+        action='store_true',
+        dest='tracemalloc_enabled',
+        help='Trace the memory allocations and add their peak for each user '
+             'to the metrics (slows down the execution).'
+    )
+    parser.add_argument(
+        '--compare',
+        action='store_true',
+        dest='compare_enabled',
+        help='Do not write the results: compute the aggregate data of each '
+             'user with both the object-based engine and the engine selected '
+             'by the other options (e.g. --columnar), and report the first '
+             'frame and feature where they differ. The exit status is 1 if '
+             'any user differs.'
+    )
+    parser.add_argument(
+        '--tolerance',
+        metavar='TOL',
+        type=float,
+        default=TOLERANCE,
+        help=f'The relative and absolute tolerance used by --compare on the '
+             f'numbers (default: {TOLERANCE}).'
+    )
+    parser.add_argument(
+        '--exact',
+        action='store_true',
+        dest='exact_enabled',
+        help='Make --compare require the numbers to be written identically, '
+             'ignoring --tolerance.'
+    )
     parser.add_argument(
         '--quiet', '-q',
         action='store_true',
@@ -91,6 +226,14 @@ def set_up_args() -> argparse.Namespace:
         action='store_true',
         help='Drop the output folder if it already exist.'
     )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        dest='resume_enabled',
+        help='Skip the users already processed by a previous run on the same '
+             'output folder, whose results are complete and up to date '
+             '(see manifest.json). Implies that the folder is not dropped.'
+    )
     parser.add_argument(
         '--zip',
         help='Zip the output folder',
@@ -109,7 +252,10 @@ def set_up_args() -> argparse.Namespace:
         help="Once the execution ends, send a message to this email.",
         dest='notify'
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.stratification_enabled and args.sample_fraction is None:
+        parser.error("--stratified requires --sample-fraction")
+    return args
 
 
 def main():
@@ -122,7 +268,8 @@ def main():
     logger = logging.getLogger('analyzer')
     logger.setLevel(logging.INFO)
 
-    if args.drop and os.path.exists(args.out) and os.listdir(args.out):
+    if args.drop and not args.resume_enabled and os.path.exists(args.out) \
+            and os.listdir(args.out):
         logger.info("Emptying output directory ('%s')",
                     os.path.abspath(args.out))
         shutil.rmtree(args.out, ignore_errors=True)
@@ -142,16 +289,40 @@ def main():
             "[%(levelname)s] %(asctime)s (%(name)s) %(message)s"))
         file_handler.setLevel(logging.INFO)
         logger.addHandler(file_handler)
-    if args.multiprocessing_enabled:
+    if args.workers > 1 and args.multiprocessing_enabled:
+        logger.warning("Multiprocessing disabled: the users are already "
+                       "processed by %d processes.", args.workers)
+        args.multiprocessing_enabled = False
+    if args.workers > 1 and args.chunks > 1:
+        logger.warning("Chunks disabled: the users are already processed by "
+                       "%d processes.", args.workers)
+        args.chunks = 0
+    if args.compare_enabled and args.sample_fraction is not None:
+        logger.warning("Sampling disabled: the engines are compared on all "
+                       "the emotion frames.")
+        args.sample_fraction = None
+    if args.pruning_enabled or args.sample_fraction is not None:
+        args.columnar_enabled = True
+    if args.chunks > 1:
+        args.columnar_enabled = True
+        if args.multiprocessing_enabled:
+            logger.warning("Multiprocessing disabled: the chunks of each "
+                           "user are already processed in parallel.")
+            args.multiprocessing_enabled = False
+    if args.multiprocessing_enabled or args.workers > 1 or args.chunks > 1:
         import multiprocessing_logging
         multiprocessing_logging.install_mp_handler()
 
     if args.test:
         os.environ['TESTING_MODE'] = 'True'
+    if args.tracemalloc_enabled:
+        tracemalloc.start()
 
     db = None
     if args.db:
         db = pymongo.MongoClient(args.db).get_default_database()
+        if args.streaming_enabled:
+            create_interactions_index(db)
 
     users, __ = load_users(mongodb=db)
 
@@ -171,24 +342,137 @@ def main():
     user_times = list()
     if args.user:
         users = [args.user]
-    for i, user in enumerate(users, 1):
-        __, t = process_user(
-            user, websites,
-            db=db,
-            index=i,
-            total_users=len(users),
+    users = list(users)
+    manifest = Manifest(args.out)
+    manifest_options = run_options(
+        sample_fraction=args.sample_fraction, seed=args.seed,
+        enable_stratification=args.stratification_enabled,
+        enable_pruning=args.pruning_enabled)
+    counts, __ = count_interactions(users, mongodb=db)
+    if args.resume_enabled:
+        pending = [user for user in users if not manifest.is_done(
+            user, counts.get(user), args.output_format, manifest_options)]
+        logger.info("Resuming: %d of %d users already done",
+                    len(users) - len(pending), len(users))
+        users = pending
+    if args.compare_enabled:
+        different = 0
+        for i, user in enumerate(users, 1):
+            logger.info("Comparing the engines on user '%s' (%d of %d)",
+                        user, i, len(users))
+            with METRICS.labels(user=user):
+                mismatch, __ = compare_user(
+                    user, websites, db,
+                    tolerance=args.tolerance,
+                    exact=args.exact_enabled,
+                    enable_gc=args.gc_enabled,
+                    enable_columnar=args.columnar_enabled,
+                    enable_multiprocessing=args.multiprocessing_enabled,
+                    enable_streaming=args.streaming_enabled,
+                    cache_dir=args.cache_dir,
+                    chunks=args.chunks,
+                    enable_pruning=args.pruning_enabled
+                )
+            if mismatch is None:
+                logger.info("User '%s': the engines match", user)
+            else:
+                different += 1
+                logger.error("User '%s': first mismatch at %s", user,
+                             mismatch)
+        logger.info("The engines differ on %d of %d users", different,
+                    len(users))
+        METRICS.save(args.out)
+        sys.exit(1 if different else 0)
+    if args.workers > 1 and len(users) > 1:
+        user_times = process_users(
+            list(users), websites,
+            db_uri=args.db,
+            counts=counts,
+            n_workers=min(args.workers, len(users)),
             enable_gc=args.gc_enabled,
             out_dir=args.out,
-            enable_multiprocessing=args.multiprocessing_enabled
+            enable_columnar=args.columnar_enabled,
+            enable_streaming=args.streaming_enabled,
+            cache_dir=args.cache_dir,
+            output_format=args.output_format,
+            manifest=manifest,
+            enable_tracemalloc=args.tracemalloc_enabled,
+            enable_pruning=args.pruning_enabled,
+            sample_fraction=args.sample_fraction,
+            enable_stratification=args.stratification_enabled,
+            seed=args.seed
         )
-        user_times.append(t)
+    else:
+        if args.streaming_enabled and db and len(users) > 1 \
+                and not args.cache_dir:
+            # A single query for all the users
+            sources = stream_users_interactions(db, users)
+        else:
+            sources = ((user, None) for user in users)
+        if args.pipeline_depth > 0:
+            user_times = process_users_pipelined(
+                sources, websites,
+                db=db,
+                depth=args.pipeline_depth,
+                total_users=len(users),
+                enable_gc=args.gc_enabled,
+                out_dir=args.out,
+                enable_multiprocessing=args.multiprocessing_enabled,
+                enable_columnar=args.columnar_enabled,
+                enable_streaming=args.streaming_enabled,
+                cache_dir=args.cache_dir,
+                output_format=args.output_format,
+                manifest=manifest,
+                counts=counts,
+                chunks=args.chunks,
+                enable_pruning=args.pruning_enabled,
+                sample_fraction=args.sample_fraction,
+                enable_stratification=args.stratification_enabled,
+                seed=args.seed
+            )
+        else:
+            for i, (user, interactions) in enumerate(sources, 1):
+                manifest.start(user, counts.get(user), args.output_format,
+                               manifest_options)
+                try:
+                    with METRICS.labels(user=user):
+                        __, t = process_user(
+                            user, websites,
+                            db=db,
+                            index=i,
+                            total_users=len(users),
+                            enable_gc=args.gc_enabled,
+                            out_dir=args.out,
+                            enable_multiprocessing=args.multiprocessing_enabled,
+                            enable_columnar=args.columnar_enabled,
+                            enable_streaming=args.streaming_enabled,
+                            cache_dir=args.cache_dir,
+                            interactions=interactions,
+                            output_format=args.output_format,
+                            chunks=args.chunks,
+                            enable_pruning=args.pruning_enabled,
+                            sample_fraction=args.sample_fraction,
+                            enable_stratification=args.stratification_enabled,
+                            seed=args.seed
+                        )
+                except BaseException as e:
+                    manifest.fail(user, counts.get(user), args.output_format,
+                                  e, manifest_options)
+                    raise
+                manifest.complete(user, counts.get(user), args.output_format,
+                                  t, manifest_options)
+                user_times.append(t)
 
     end_time = time.time()
     total_time = end_time - start_time
     logger.info("DONE after %.3fs", total_time)
-    avg = sum(user_times) / len(user_times)
-    std = math.sqrt(sum([(x - avg) ** 2 for x in user_times]) / len(user_times))
-    logger.info("AVERAGE TIME PER USER: %.3fs (SD: %.3fs)", avg, std)
+    METRICS.timer('run', total_time)
+    METRICS.memory()
+    METRICS.save(args.out)
+    if user_times:
+        avg = sum(user_times) / len(user_times)
+        std = math.sqrt(sum([(x - avg) ** 2 for x in user_times]) / len(user_times))
+        logger.info("AVERAGE TIME PER USER: %.3fs (SD: %.3fs)", avg, std)
 
     if args.notify:
         notify(args.out, args.notify)
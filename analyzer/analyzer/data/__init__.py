@@ -34,4 +34,5 @@ from .user import User
 from .website import Website
 from .interaction import Interaction
 
-from .loader import load_interactions, load_websites, load_users
+from .loader import load_interactions, load_websites, load_users, \
+    count_interactions, create_interactions_index, stream_users_interactions
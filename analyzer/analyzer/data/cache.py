@@ -0,0 +1,108 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to keep a local copy of the interactions of each user.
+
+The decoded interactions of a user are stored in a NumPy ``.npz`` file, with
+the same columns used by :class:`analyzer.data.columnar.ColumnarBuilder`.
+Following runs load the file and fetch only the documents collected after the
+cached ones (the high-water mark).
+"""
+
+import logging
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+from .columnar import ColumnarBuilder
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARACTERS = re.compile(r"[^\w.-]")
+
+
+def cache_path(cache_dir: str, user: str) -> str:
+    """Get the path of the cached interactions of a user.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory of the cache.
+    user : str
+        The ID of the user.
+
+    Returns
+    -------
+    str
+        The path of the file.
+    """
+    return os.path.join(cache_dir, _UNSAFE_CHARACTERS.sub('_', user) + '.npz')
+
+
+def load_cached(cache_dir: str, user: str) -> Optional[ColumnarBuilder]:
+    """Load the cached interactions of a user.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory of the cache.
+    user : str
+        The ID of the user.
+
+    Returns
+    -------
+    ColumnarBuilder, optional
+        A builder holding the cached interactions, or None if the user is not
+        cached or the file cannot be read.
+    """
+    path = cache_path(cache_dir, user)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            builder = ColumnarBuilder.from_arrays(arrays)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring the cached interactions ('%s'): %s", path, e)
+        return None
+    logger.info("Loaded %d cached interactions ('%s')", len(builder), path)
+    return builder
+
+
+def save_cached(cache_dir: str, user: str, builder: ColumnarBuilder) -> None:
+    """Save the interactions of a user to the cache.
+
+    The file is replaced atomically, so that an interrupted run never leaves a
+    corrupted cache.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory of the cache.
+    user : str
+        The ID of the user.
+    builder : ColumnarBuilder
+        The builder holding the interactions.
+    """
+    path = cache_path(cache_dir, user)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, **builder.to_arrays())
+    os.replace(temporary_path, path)
+    logger.info("Cached %d interactions ('%s')", len(builder), path)
@@ -0,0 +1,1228 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to work with interaction data stored column by column.
+
+The classes defined in this module hold the same information as
+:class:`analyzer.data.interaction.InteractionsList`, but instead of keeping an
+`Interaction` object (and all of its nested objects) for each collected event,
+every feature is stored in a typed NumPy array. Single `Interaction` objects are
+rebuilt on demand, so that a `ColumnarInteractions` can be used wherever an
+`InteractionsList` is expected.
+
+Notes
+-----
+
+The values written to the CSV files by the object-based implementation depend
+on the Python type of the values found in the documents (e.g. an emotion equal
+to ``0`` is written as ``0``, while ``0.0`` is written as ``0.0``). To produce
+identical files, every numeric value is stored as a float and a bit mask keeps
+track of the values that were originally integers.
+"""
+
+import csv
+import gc
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import time
+from array import array
+from binascii import hexlify
+from itertools import repeat
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Optional, \
+    Union, Sequence
+
+import numpy as np
+from bson import ObjectId
+
+from .base import MouseData, ScreenCoordinates, ScrollData, KeyboardData, \
+    Speed2D
+from .emotions import Emotions
+from .features import BasicStats
+from .interaction import Interaction
+from .interval import IntervalStore, LOCATIONS, FLOAT, INT
+from .sampling import sample_frames
+from .vectorized import derive_motion, locate_windows, \
+    locate_nested_windows, changed_rows, prefix_counts, window_deviations, \
+    window_statistics, Windows
+from .website import Website
+from ..decorators import timed
+from ..metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = Emotions.__slots__[1:]
+"""The names of the emotions, in the order used by the columns."""
+EMOTIONS_KEYS = ["j", "f", "d", "s", "a", "su", "c", "v", "e"]
+"""The keys used by the documents for each emotion."""
+
+POSITION_BIT = 0
+SCROLL_BIT = 2
+EMOTIONS_BIT = 6
+TIMESTAMP_BIT = 15
+
+_FLAG_VALUES = (False, True, None)
+"""The values of a flag, indexed by their encoding (-1 stands for None)."""
+
+CLICKS_COLUMNS = ["all", "left", "right", "middle", "other"]
+"""The buttons of the columns of the clicks' flags."""
+KEYS_COLUMNS = ["all", "alphabetic", "numeric", "function", "symbol",
+                "alphanumeric"]
+"""The kinds of keys of the columns of the keys' flags."""
+_OTHER_BUTTONS = re.compile(r"^b\d+?$")
+
+
+_EMPTY: dict = {}
+_NO_PAIR = (None, None)
+_NO_EMOTIONS = (None,) * len(EMOTIONS_KEYS)
+_MAIN_BUTTONS = frozenset(['l', 'r', 'm'])
+DECODE_BATCH_SIZE = 4096
+"""The number of documents decoded together by `ColumnarBuilder.extend`."""
+
+
+class OtherButtons(dict):
+    """Whether a key of the mouse buttons is one of the other buttons.
+
+    Each key is matched only the first time it is found.
+    """
+
+    def __missing__(self, key: str) -> bool:
+        self[key] = bool(_OTHER_BUTTONS.match(key))
+        return self[key]
+
+
+def _is_sorted(timestamps: np.ndarray, generation_times: np.ndarray) -> bool:
+    """Check whether the rows are sorted by timestamp and generation time."""
+    later = timestamps[1:] > timestamps[:-1]
+    same = timestamps[1:] == timestamps[:-1]
+    ordered = generation_times[1:] >= generation_times[:-1]
+    return bool(np.all(later | (same & ordered)))
+
+
+class _Vocabulary(object):
+    """A set of values, each one identified by an integer code."""
+    __slots__ = ["values", "codes"]
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+
+    def code(self, value: Any) -> int:
+        try:
+            return self.codes[value]
+        except KeyError:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+            return self.codes[value]
+
+
+class ColumnarBuilder(object):
+    """A builder of `ColumnarInteractions` objects.
+
+    The builder decodes the documents collected by the extension one by one,
+    storing their content in compact typed buffers.
+    """
+    __slots__ = ["ids", "users", "timestamps", "urls", "numbers", "int_mask",
+                 "flags", "emotions_exist", "user_values", "url_values"]
+
+    _BUFFERS = [("ids", np.uint8), ("users", np.int32),
+                ("timestamps", np.float64), ("urls", np.int32),
+                ("numbers", np.float64), ("int_mask", np.uint16),
+                ("flags", np.int8), ("emotions_exist", np.int8)]
+
+    def __init__(self):
+        self.ids = bytearray()
+        self.users = array('i')
+        self.timestamps = array('d')
+        self.urls = array('i')
+        self.numbers = array('d')
+        self.int_mask = array('H')
+        self.flags = array('b')
+        self.emotions_exist = array('b')
+        self.user_values = _Vocabulary()
+        self.url_values = _Vocabulary()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def extend(self, documents: Iterable[dict],
+               batch_size: int = DECODE_BATCH_SIZE) -> None:
+        """Decode some documents and add them to the buffers.
+
+        The documents are decoded in batches: each document is visited once
+        to collect its raw values, which are then converted all together. The
+        semantics for the missing fields are the same of the objects created
+        by `load_interactions`.
+
+        Parameters
+        ----------
+        documents : iterable [dict]
+            The documents to be decoded.
+        batch_size : int, optional
+            The number of documents decoded together.
+        """
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                self._decode(batch)
+                batch = []
+        if batch:
+            self._decode(batch)
+
+    def _decode(self, documents: List[dict]) -> None:
+        """Decode a batch of documents and add them to the buffers.
+
+        Every sub-document is looked up only once, and the raw values of all
+        the documents are converted to typed arrays together.
+
+        Parameters
+        ----------
+        documents : list [dict]
+            The documents to be decoded.
+        """
+        ids, users, urls, emotions_exist = [], [], [], []
+        numbers, flags = [], []
+        add_numbers, add_flags = numbers.extend, flags.extend
+        user_code, url_code = self.user_values.code, self.url_values.code
+        other_buttons = OtherButtons()
+        for document in documents:
+            mouse = document.get("m", _EMPTY)
+            buttons = mouse.get("b", _EMPTY)
+            keyboard = document.get("k", _EMPTY)
+            scroll = document.get("s", _EMPTY)
+            emotions = document.get("e", None)
+            id_ = document["_id"]
+
+            ids.append(id_.binary if isinstance(id_, ObjectId)
+                       else ObjectId(id_).binary)
+            users.append(user_code(document.get("ui", None)))
+            urls.append(url_code(document.get("u", None)))
+            # The same order of the bits of the mask, timestamp included
+            add_numbers(mouse.get("p", _NO_PAIR))
+            add_numbers(scroll.get("a", _NO_PAIR))
+            add_numbers(scroll.get("r", _NO_PAIR))
+            add_numbers([emotions.get(key, None) for key in EMOTIONS_KEYS]
+                        if emotions else _NO_EMOTIONS)
+            numbers.append(document.get("t", None))
+            add_flags((
+                any(buttons.values()),
+                buttons.get('l', False),
+                buttons.get('r'),
+                buttons.get('m'),
+                False if buttons.keys() <= _MAIN_BUTTONS
+                else any(value for key, value in buttons.items()
+                         if other_buttons[key]),
+                any(keyboard.values()),
+                keyboard.get("a", None),
+                keyboard.get("n", None),
+                keyboard.get("f", None),
+                keyboard.get("s", None),
+            ))
+            emotions_exist.append(emotions is None)
+
+        integers = np.fromiter(map(isinstance, numbers, repeat(int)),
+                               dtype=np.bool_, count=len(numbers))
+        int_mask = integers.reshape(len(documents), TIMESTAMP_BIT + 1) @ \
+            (1 << np.arange(TIMESTAMP_BIT + 1))
+        numbers = np.array(numbers, dtype=np.float64).reshape(
+            len(documents), TIMESTAMP_BIT + 1)
+        flags = np.array(flags, dtype=object)
+        flags = np.where(flags == None, -1,  # noqa: E711
+                         flags.astype(np.bool_)).astype(np.int8)
+
+        self.ids.extend(b''.join(ids))
+        self.users.extend(users)
+        self.urls.extend(urls)
+        self.timestamps.frombytes(numbers[:, TIMESTAMP_BIT].tobytes())
+        self.numbers.frombytes(numbers[:, :TIMESTAMP_BIT].tobytes())
+        self.int_mask.frombytes(int_mask.astype(np.uint16).tobytes())
+        self.flags.frombytes(flags.tobytes())
+        self.emotions_exist.extend(emotions_exist)
+
+    def last_id(self) -> Optional[ObjectId]:
+        """Get the greatest ObjectId of the decoded documents.
+
+        Returns
+        -------
+        bson.ObjectId, optional
+            The greatest ObjectId, or None if no document was decoded.
+        """
+        if not len(self):
+            return None
+        ids = np.frombuffer(bytes(self.ids), dtype=np.uint8).reshape(-1, 12)
+        keys = [ids[:, i] for i in reversed(range(12))]
+        return ObjectId(ids[np.lexsort(keys)[-1]].tobytes())
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the content of the buffers.
+
+        Returns
+        -------
+        dict [str, numpy.ndarray]
+            The buffers, as arrays. The values of the codes of the users and
+            of the URLs are encoded in JSON.
+        """
+        arrays = {name: np.frombuffer(getattr(self, name), dtype=dtype)
+                  for name, dtype in self._BUFFERS}
+        arrays['user_values'] = np.array(json.dumps(self.user_values.values))
+        arrays['url_values'] = np.array(json.dumps(self.url_values.values))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ColumnarBuilder':
+        """Create a builder holding the content returned by `to_arrays`.
+
+        Parameters
+        ----------
+        arrays : dict [str, numpy.ndarray]
+            The content of the buffers.
+
+        Returns
+        -------
+        ColumnarBuilder
+            The builder, ready to decode other documents.
+        """
+        builder = cls()
+        builder.ids.extend(arrays['ids'].tobytes())
+        for name, dtype in cls._BUFFERS[1:]:
+            getattr(builder, name).frombytes(
+                arrays[name].astype(dtype, copy=False).tobytes())
+        for value in json.loads(str(arrays['user_values'])):
+            builder.user_values.code(value)
+        for value in json.loads(str(arrays['url_values'])):
+            builder.url_values.code(value)
+        return builder
+
+    def build(self) -> 'ColumnarInteractions':
+        """Create the list of interactions.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The list containing all the decoded documents.
+        """
+        ids = np.frombuffer(bytes(self.ids), dtype=np.uint8).reshape(-1, 12)
+        numbers = np.frombuffer(self.numbers, dtype=np.float64).reshape(-1, 15)
+        flags = np.frombuffer(self.flags, dtype=np.int8).reshape(-1, 10)
+        return ColumnarInteractions(
+            ids=ids,
+            users=np.frombuffer(self.users, dtype=np.int32),
+            timestamps=np.frombuffer(self.timestamps, dtype=np.float64),
+            urls=np.frombuffer(self.urls, dtype=np.int32),
+            positions=numbers[:, 0:2],
+            scrolls=numbers[:, 2:6],
+            emotions=numbers[:, 6:15],
+            int_mask=np.frombuffer(self.int_mask, dtype=np.uint16),
+            clicks=flags[:, 0:5],
+            keys=flags[:, 5:10],
+            emotions_exist=np.frombuffer(self.emotions_exist, dtype=np.bool_),
+            user_values=self.user_values.values,
+            url_values=self.url_values.values
+        )
+
+
+# pylint: disable=too-many-instance-attributes
+class ColumnarInteractions(object):
+    """A list of interactions, stored as a set of columns.
+
+    Attributes
+    ----------
+    ids : numpy.ndarray
+        The binary ObjectIds of the interactions, with shape (n, 12).
+    users, urls, categories : numpy.ndarray
+        The codes of the user IDs, of the URLs and of the URLs' categories. The
+        values are stored in `user_values`, `url_values` and `category_values`.
+        A category equal to -1 means that the category has not been set.
+    timestamps : numpy.ndarray
+        The timestamps of the interactions, in milliseconds.
+    positions : numpy.ndarray
+        The mouse positions, with shape (n, 2).
+    scrolls : numpy.ndarray
+        The absolute and the relative scroll positions, with shape (n, 4).
+    clicks : numpy.ndarray
+        The flags of the mouse buttons (any, left, right, middle and others),
+        with shape (n, 5). A flag equal to -1 means that it was missing.
+    keys : numpy.ndarray
+        The flags of the keyboard (any, alphabetic, numeric, function and
+        symbol), with shape (n, 5). A flag equal to -1 means that it was
+        missing.
+    emotions : numpy.ndarray
+        The values of the emotions, with shape (n, 9).
+    emotions_exist : numpy.ndarray
+        The `exists` attribute of the emotions.
+    int_mask : numpy.ndarray
+        For each interaction, a bit mask of the numeric values that were
+        integers in the original document.
+    speeds, accelerations : numpy.ndarray
+        The mouse speed and acceleration (total, x and y), with shape (n, 3).
+    slopes : numpy.ndarray
+        The slope of the mouse trajectory.
+    still : numpy.ndarray
+        Whether the speed and the acceleration were reset (and are then equal
+        to the integer 0).
+    prefix_sums : dict [str, any]
+        The cumulative sums used to calculate the statistics of the ranges.
+        They are calculated the first time they are needed.
+    rows : numpy.ndarray, optional
+        If the list was pruned, the index of each interaction in the whole
+        list.
+    frames : numpy.ndarray, optional
+        If the emotion frames were sampled, the indexes of the selected ones.
+    """
+    __slots__ = ["ids", "users", "timestamps", "urls", "categories",
+                 "positions", "scrolls", "clicks", "keys", "emotions",
+                 "emotions_exist", "int_mask", "speeds", "accelerations",
+                 "slopes", "still", "user_values", "url_values",
+                 "category_values", "prefix_sums", "rows", "frames"]
+
+    _ROWS = ["ids", "users", "timestamps", "urls", "positions", "scrolls",
+             "clicks", "keys", "emotions", "emotions_exist", "int_mask"]
+    COLUMNS = _ROWS + ["categories", "speeds", "accelerations", "slopes",
+                       "still"]
+    """The names of all the attributes stored as arrays."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, ids: np.ndarray, users: np.ndarray,
+                 timestamps: np.ndarray, urls: np.ndarray,
+                 positions: np.ndarray, scrolls: np.ndarray,
+                 clicks: np.ndarray, keys: np.ndarray, emotions: np.ndarray,
+                 emotions_exist: np.ndarray, int_mask: np.ndarray,
+                 user_values: List[str], url_values: List[str]):
+        logger.info("Creating ColumnarInteractions object")
+        self.ids: np.ndarray = ids
+        self.users: np.ndarray = users
+        self.timestamps: np.ndarray = timestamps
+        self.urls: np.ndarray = urls
+        self.positions: np.ndarray = positions
+        self.scrolls: np.ndarray = scrolls
+        self.clicks: np.ndarray = clicks
+        self.keys: np.ndarray = keys
+        self.emotions: np.ndarray = emotions
+        self.emotions_exist: np.ndarray = emotions_exist
+        self.int_mask: np.ndarray = int_mask
+        self.user_values: List[str] = user_values
+        self.url_values: List[str] = url_values
+        self.category_values: List[str] = []
+        self.categories: np.ndarray = np.full(len(timestamps), -1,
+                                              dtype=np.int32)
+        self.speeds: np.ndarray = np.zeros((len(timestamps), 3))
+        self.accelerations: np.ndarray = np.zeros((len(timestamps), 3))
+        self.slopes: np.ndarray = np.full(len(timestamps), math.nan)
+        self.still: np.ndarray = np.ones(len(timestamps), dtype=np.bool_)
+        self.prefix_sums: Optional[Dict[str, Any]] = None
+        self.rows: Optional[np.ndarray] = None
+        self.frames: Optional[np.ndarray] = None
+        if not len(self):
+            logger.warning("Empty list")
+            return
+        generation_times = self.ids[:, 0:4].copy().view('>u4').ravel()
+        if not _is_sorted(self.timestamps, generation_times):
+            logger.info("Sorting by timestamps")
+            order = np.lexsort((generation_times, self.timestamps))
+            for name in self._ROWS:
+                setattr(self, name, getattr(self, name)[order])
+        self._set_additional_data()
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray],
+                     user_values: List[str], url_values: List[str],
+                     category_values: List[str]) -> 'ColumnarInteractions':
+        """Create a list from columns that are already sorted and complete.
+
+        Unlike the constructor, the interactions are neither sorted nor
+        analyzed again: the columns are used as they are, without copying them.
+
+        Parameters
+        ----------
+        columns : dict [str, numpy.ndarray]
+            The columns, indexed by the name of the attribute. All the columns
+            listed in `COLUMNS` are required.
+        user_values, url_values, category_values : list [str]
+            The values of the codes used by the columns.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The list of interactions.
+        """
+        interactions = cls.__new__(cls)
+        for name in cls.COLUMNS:
+            setattr(interactions, name, columns[name])
+        interactions.user_values = user_values
+        interactions.url_values = url_values
+        interactions.category_values = category_values
+        interactions.prefix_sums = None
+        interactions.rows = None
+        interactions.frames = None
+        return interactions
+
+    def take(self, rows: np.ndarray) -> 'ColumnarInteractions':
+        """Get some of the interactions, as a new list.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The indexes of the interactions.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The list of the selected interactions, in the given order.
+        """
+        return self.from_columns(
+            {name: getattr(self, name)[rows] for name in self.COLUMNS},
+            self.user_values, self.url_values, self.category_values)
+
+    def __iter__(self) -> Iterator[Interaction]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, item: Union[int, slice]) -> \
+            Union[Interaction, List[Interaction]]:
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        numbers = [
+            self._value(self.positions, item, 0, POSITION_BIT),
+            self._value(self.positions, item, 1, POSITION_BIT + 1),
+            *(self._value(self.scrolls, item, i, SCROLL_BIT + i)
+              for i in range(4)),
+            *(self._value(self.emotions, item, i, EMOTIONS_BIT + i)
+              for i in range(len(EMOTIONS)))
+        ]
+        clicks = [_FLAG_VALUES[f] for f in self.clicks[item].tolist()]
+        keys = [_FLAG_VALUES[f] for f in self.keys[item].tolist()]
+        speed, acceleration = (self.speeds[item].tolist(),
+                               self.accelerations[item].tolist())
+        if self.still[item]:
+            speed, acceleration = [0, 0, 0], [0, 0, 0]
+        category = self.categories[item]
+        # noinspection PyArgumentList
+        return Interaction(
+            id=str(ObjectId(self.ids[item].tobytes())),
+            user_id=self.user_values[self.users[item]],
+            timestamp=self._value(self.timestamps, item, None, TIMESTAMP_BIT),
+            url=self.url_values[self.urls[item]],
+            url_category=self.category_values[category]
+            if category >= 0 else None,
+            slope=None if math.isnan(self.slopes[item])
+            else float(self.slopes[item]),
+            mouse=MouseData(
+                position=ScreenCoordinates(numbers[0], numbers[1]),
+                clicks=MouseData.Clicks(
+                    any=clicks[0], left=clicks[1], right=clicks[2],
+                    middle=clicks[3], others=clicks[4]
+                ),
+                speed=Speed2D(*speed),
+                acceleration=Speed2D(*acceleration)
+            ),
+            scroll=ScrollData(
+                absolute=ScreenCoordinates(numbers[2], numbers[3]),
+                relative=ScreenCoordinates(numbers[4], numbers[5])
+            ),
+            keyboard=KeyboardData(
+                any=keys[0], alpha=keys[1], numeric=keys[2],
+                function=keys[3], symbol=keys[4]
+            ),
+            emotions=Emotions(
+                exists=bool(self.emotions_exist[item]),
+                **dict(zip(EMOTIONS, numbers[6:]))
+            )
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _value(self, values: np.ndarray, row: int, column: Optional[int],
+               bit: int) -> Union[int, float, None]:
+        value = values[row] if column is None else values[row, column]
+        if math.isnan(value):
+            return None
+        return int(value) if self.int_mask[row] & (1 << bit) else float(value)
+
+    def _restore(self, values: np.ndarray, bit: int, start: int = 0,
+                 end: Optional[int] = None) -> List[Union[int, float, None]]:
+        """Convert a slice of a column to the values found in the documents.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            The column.
+        bit : int
+            The bit of `int_mask` associated to the column.
+        start, end : int, optional
+            The slice to be converted. By default, the whole column.
+
+        Returns
+        -------
+        list [int or float or None]
+            The converted values.
+        """
+        end = len(self) if end is None else end
+        restored = values[start:end].tolist()
+        for i in np.flatnonzero(self.int_mask[start:end] & (1 << bit)):
+            restored[i] = int(restored[i])
+        for i in np.flatnonzero(np.isnan(values[start:end])):
+            restored[i] = None
+        return restored
+
+    @timed("Set additional data in %.3fs", stage='derive')
+    def _set_additional_data(self):
+        logger.info("Setting speed and direction")
+        self.speeds, self.accelerations, self.slopes, self.still = \
+            derive_motion(self.timestamps, self.positions, self.urls)
+
+    def _emotions_over_value(self) -> np.ndarray:
+        limit = 1.0
+        with np.errstate(invalid='ignore'):
+            return (self.emotions >= limit).any(axis=1)
+
+    def _frames(self) -> np.ndarray:
+        """Get the indexes of the middle interactions of the ranges."""
+        if self.frames is not None:
+            return self.frames
+        return np.flatnonzero(self._emotions_over_value())
+
+    def _get_intervals(self, width: float) -> Windows:
+        return locate_windows(self.timestamps, self._frames(), width)
+
+    @staticmethod
+    def _halves(windows: Windows, range_width: float) -> \
+            List[Tuple[np.ndarray, np.ndarray, float]]:
+        """Get the slices of the full ranges and of their two halves.
+
+        Parameters
+        ----------
+        windows : (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            The bounds of the ranges.
+        range_width : float
+            The width of the ranges.
+
+        Returns
+        -------
+        list [(numpy.ndarray, numpy.ndarray, float)]
+            The first indexes, the indexes following the last ones and the
+            width of the full ranges, of the first halves and of the second
+            halves.
+        """
+        starts, middles, ends = windows
+        return [(starts, ends, range_width),
+                (starts, middles + 1, range_width / 2),
+                (middles, ends, range_width / 2)]
+
+    def process_intervals(self, range_width: float, enable_gc: bool = True) \
+            -> Tuple[IntervalStore, float]:
+        @timed(f"Analyzed all intervals of {range_width} ms in %.3fs",
+               stage='intervals', width=range_width)
+        def inner_function():
+            logger.info("Getting intervals of %d milliseconds", range_width)
+            windows = self._get_intervals(range_width)
+            logger.info("Calculating aggregate data on intervals of %dms",
+                        range_width)
+            intervals = self._process_intervals(windows, range_width)
+            if enable_gc:
+                logger.info("Running garbage collector")
+                collected = gc.collect()
+                logger.info("Garbage collector collected %d objects",
+                            collected)
+            return intervals, range_width
+
+        return inner_function()
+
+    @timed("Analyzed all intervals in %.3fs")
+    def process_all_intervals(self, range_widths: Sequence[float],
+                              enable_gc: bool = True) -> \
+            Dict[float, IntervalStore]:
+        """Calculate the data of the ranges of several widths in one sweep.
+
+        The ranges of all the widths are located at once and all of them share
+        the same cumulative sums.
+
+        Parameters
+        ----------
+        range_widths : list [float]
+            The widths of the ranges.
+        enable_gc : bool, optional
+            Whether or not to explicitly run the garbage collector after each
+            width.
+
+        Returns
+        -------
+        dict [float, IntervalStore]
+            For each width, the data of each range, indexed by its middle
+            interaction.
+        float
+            The time the execution took. Returned by the `@timed` decorator.
+        """
+        logger.info("Getting intervals of %s milliseconds",
+                    ", ".join(str(width) for width in range_widths))
+        all_windows = locate_nested_windows(self.timestamps, self._frames(),
+                                            range_widths)
+        intervals, times = self._process_all_windows(all_windows, enable_gc)
+        for range_width, t in times.items():
+            METRICS.timer('intervals', t, width=range_width)
+        return intervals
+
+    def _process_all_windows(self, all_windows: Dict[float, Windows],
+                             enable_gc: bool = True) -> \
+            Tuple[Dict[float, IntervalStore], Dict[float, float]]:
+        intervals, times = dict(), dict()
+        for range_width, windows in all_windows.items():
+            logger.info("Calculating aggregate data on intervals of %dms",
+                        range_width)
+            start_time = time.time()
+            intervals[range_width] = self._process_intervals(windows,
+                                                             range_width)
+            times[range_width] = time.time() - start_time
+            if enable_gc:
+                logger.info("Running garbage collector")
+                collected = gc.collect()
+                logger.info("Garbage collector collected %d objects",
+                            collected)
+        return intervals, times
+
+    def chunk(self, start: int, end: int) -> 'ColumnarInteractions':
+        """Get a contiguous slice of the interactions.
+
+        The columns of the slice are views of the ones of the list, and its
+        cumulative sums are slices of the ones of the list: the data of a
+        range located in the slice is then exactly the same as in the list.
+
+        Parameters
+        ----------
+        start, end : int
+            The bounds of the slice.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The interactions in the slice.
+        """
+        prefix_sums = self._get_prefix_sums()
+        chunk = self.from_columns(
+            {name: getattr(self, name)[start:end] for name in self.COLUMNS},
+            self.user_values, self.url_values, self.category_values)
+        changes = prefix_sums['changes']
+        chunk.prefix_sums = {name: values[start:end + 1] for name, values
+                             in prefix_sums.items()
+                             if name not in ('changes', 'idle', 'idle_times')}
+        chunk.prefix_sums['changes'] = changes[np.searchsorted(
+            changes, start):np.searchsorted(changes, end)] - start
+        chunk.prefix_sums['idle'] = prefix_sums['idle'][start:end]
+        chunk.prefix_sums['idle_times'] = prefix_sums['idle_times'][start:end]
+        return chunk
+
+    def chunks(self, range_widths: Sequence[float], count: int) -> \
+            List[Tuple[int, 'ColumnarInteractions', Dict[float, Windows]]]:
+        """Split the ranges of several widths into contiguous chunks.
+
+        The middle interactions are split into (at most) `count` groups of
+        the same size. Each chunk holds the interactions of the ranges of its
+        group: besides the middle interactions, a halo of up to
+        ``max(range_widths) / 2`` milliseconds on each side.
+
+        Parameters
+        ----------
+        range_widths : list [float]
+            The widths of the ranges.
+        count : int
+            The number of chunks.
+
+        Returns
+        -------
+        list [(int, ColumnarInteractions, dict [float, Windows])]
+            The index of the first interaction of each chunk, its interactions
+            and the bounds of its ranges of each width, relative to the chunk.
+        """
+        all_windows = locate_nested_windows(self.timestamps, self._frames(),
+                                            range_widths)
+        middles = next(iter(all_windows.values()))[1] if all_windows \
+            else np.empty(0, dtype=np.int64)
+        groups = np.array_split(np.arange(len(middles)),
+                                max(min(count, len(middles)), 1))
+        chunks = []
+        for group in groups:
+            if len(group):
+                first, last = group[0], group[-1] + 1
+                # The ranges of the smaller widths are nested in the others
+                start = min(windows[0][first] for windows in
+                            all_windows.values())
+                end = max(windows[2][last - 1] for windows in
+                          all_windows.values())
+            else:
+                first = last = start = end = 0
+            chunks.append((int(start), self.chunk(start, end), {
+                width: tuple(bounds[first:last] - start for bounds in windows)
+                for width, windows in all_windows.items()}))
+        return chunks
+
+    def prune(self, range_widths: Sequence[float]) -> 'ColumnarInteractions':
+        """Drop the interactions that are not in any range.
+
+        The ranges are built only around the emotion frames (the selected
+        ones, if they were sampled), so the interactions farther than
+        ``max(range_widths) / 2`` from all of them never contribute to the
+        aggregate data. The kept interactions are
+        copied to a new list, with their speeds and directions: each range
+        of the new list holds the same interactions as in this one.
+
+        Parameters
+        ----------
+        range_widths : list [float]
+            The widths of the ranges.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The interactions in the ranges of the widest width. Its `rows`
+            are their indexes in this list.
+        """
+        starts, __, ends = locate_nested_windows(
+            self.timestamps, self._frames(), [max(range_widths)]).popitem()[1]
+        # The number of ranges covering each interaction
+        coverage = np.cumsum(np.bincount(starts, minlength=len(self) + 1) -
+                             np.bincount(ends, minlength=len(self) + 1))
+        rows = np.flatnonzero(coverage[:-1])
+        logger.info("Pruned %d of %d interactions", len(self) - len(rows),
+                    len(self))
+        pruned = self.take(rows)
+        pruned.rows = rows if self.rows is None else self.rows[rows]
+        if self.frames is not None:
+            pruned.frames = np.searchsorted(rows, self.frames)
+        return pruned
+
+    def sample(self, fraction: float, seed: Union[int, Sequence[int]] = 0,
+               stratified: bool = False) -> None:
+        """Select the emotion frames whose ranges are calculated.
+
+        See `analyzer.data.sampling.sample_frames`.
+
+        Parameters
+        ----------
+        fraction : float
+            The fraction of the frames to be selected, in [0, 1].
+        seed : int or list [int], optional
+            The seed of the random generator.
+        stratified : bool, optional
+            Whether or not to select the same number of frames for each
+            discretized value of each emotion.
+        """
+        frames = self._frames()
+        self.frames = sample_frames(self.emotions, frames, fraction,
+                                    np.random.default_rng(seed), stratified)
+        logger.info("Sampled %d of %d emotion frames", len(self.frames),
+                    len(frames))
+
+    def process_chunk(self, all_windows: Dict[float, Windows], offset: int,
+                      enable_gc: bool = True) -> \
+            Tuple[Dict[float, IntervalStore], Dict[float, float]]:
+        """Calculate the data of the ranges of a chunk.
+
+        This method is meant to be run by the worker processes, on the chunks
+        returned by `chunks`.
+
+        Parameters
+        ----------
+        all_windows : dict [float, Windows]
+            The bounds of the ranges of each width, relative to the chunk.
+        offset : int
+            The index of the first interaction of the chunk in the whole list.
+        enable_gc : bool, optional
+            Whether or not to explicitly run the garbage collector after each
+            width.
+
+        Returns
+        -------
+        dict [float, IntervalStore]
+            For each width, the data of each range, indexed by its middle
+            interaction in the whole list.
+        dict [float, float]
+            The time spent on each width.
+        """
+        intervals, times = self._process_all_windows(all_windows, enable_gc)
+        for store in intervals.values():
+            store.middles += offset
+        return intervals, times
+
+    def _flags(self) -> Dict[str, np.ndarray]:
+        """Get the flags of the clicks and of the keys of each interaction.
+
+        Returns
+        -------
+        dict [str, numpy.ndarray]
+            The flags of the columns in `CLICKS_COLUMNS` and in
+            `KEYS_COLUMNS` (an alphanumeric key is either alphabetic or
+            numeric).
+        """
+        keys = np.maximum(self.keys, 0)
+        return {'clicks': np.maximum(self.clicks, 0),
+                'keys': np.column_stack((keys, keys[:, 1:3].max(axis=1)))}
+
+    def _get_prefix_sums(self) -> Dict[str, Any]:
+        """Get the cumulative sums used to calculate the window statistics.
+
+        The sums are calculated only once and shared by all the widths.
+
+        Returns
+        -------
+        dict [str, any]
+            The cumulative counts of the reset interactions, of the clicks'
+            and keys' flags and of the changes of slope and URL, and the
+            cumulative sums of the idle times, together with the indexes of
+            the interactions that changed with respect to the previous one,
+            the idle time before each interaction and the cumulative counts
+            of the idle times with a float timestamp.
+        """
+        if self.prefix_sums is None:
+            logger.info("Calculating cumulative sums")
+            flags = self._flags()
+            # The same features used by Interaction.get_changed_features
+            changed = changed_rows(self.users, self.urls, self.categories,
+                                   self.clicks, self.keys, self.positions,
+                                   self.scrolls, self.speeds,
+                                   self.accelerations, self.slopes)
+            times = np.zeros(len(self))
+            times[1:] = np.diff(self.timestamps)
+            # The idle times are integers unless a timestamp was a float
+            float_timestamps = (self.int_mask & (1 << TIMESTAMP_BIT)) == 0
+            float_idle = np.zeros(len(self), dtype=np.bool_)
+            float_idle[1:] = ~changed[1:] & (float_timestamps[1:] |
+                                             float_timestamps[:-1])
+            idle_times = np.where(changed, 0, times)
+            self.prefix_sums = {
+                'still': prefix_counts(self.still),
+                'clicks': prefix_counts(flags['clicks']),
+                'keys': prefix_counts(flags['keys']),
+                'slopes': prefix_counts(changed_rows(self.slopes)),
+                'urls': prefix_counts(changed_rows(self.urls)),
+                'changes': np.flatnonzero(changed),
+                'idle': np.cumsum(idle_times),
+                'idle_times': idle_times,
+                'float_idle': prefix_counts(float_idle),
+            }
+        return self.prefix_sums
+
+    def _set_direction_changes(self, store: IntervalStore, windows: Windows,
+                               range_width: float) -> None:
+        slopes = self._get_prefix_sums()['slopes']
+        for location, (starts, ends, width) in zip(
+                LOCATIONS, self._halves(windows, range_width)):
+            changes = slopes[ends] - slopes[starts + 1]
+            store.set(f"slopes.{location}.changes", changes, INT)
+            store.set(f"slopes.{location}.change_rate", changes / width, FLOAT)
+
+    def _set_mouse_movements(self, store: IntervalStore, windows: Windows,
+                             range_width: float) -> None:
+        # InteractionsList compares the positions and the scrolls by
+        # identity, so every interaction counts as a movement and as a scroll
+        for location, (starts, ends, width) in zip(
+                LOCATIONS, self._halves(windows, range_width)):
+            counts = ends - starts - 1
+            for feature in ('mouse_movements', 'scrolls'):
+                store.set(f"{feature}.{location}.rate", counts / width, FLOAT)
+                store.set(f"{feature}.{location}.total", counts, INT)
+
+    def _set_basic_stats(self, store: IntervalStore, feature: str, name: str,
+                         windows: Windows) -> None:
+        """Set the sums, the means and the variances of speeds or
+        accelerations.
+
+        Parameters
+        ----------
+        store : IntervalStore
+            The store of the ranges.
+        feature : "avg_speed", "avg_acceleration"
+            The feature to be set.
+        name : "speeds", "accelerations"
+            The values to be considered.
+        windows : (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            The bounds of the ranges.
+        """
+        prefix_sums = self._get_prefix_sums()
+        for location, (starts, ends, __) in zip(LOCATIONS,
+                                                self._halves(windows, 0)):
+            sizes = ends - starts
+            totals, means, variances = window_statistics(
+                getattr(self, name), starts, ends)
+            # The sum of values that were all reset is the integer 0
+            still = (prefix_sums['still'][ends] -
+                     prefix_sums['still'][starts]) == sizes
+            for i in range(3):
+                prefix = f"{feature}.{location}.{i}"
+                store.set(f"{prefix}.sum", np.where(still, 0, totals[:, i]),
+                          np.where(still, INT, FLOAT))
+                store.set(f"{prefix}.avg", means[:, i], FLOAT)
+                store.set(f"{prefix}.std", variances[:, i], FLOAT)
+
+    @staticmethod
+    def _set_flags_stats(store: IntervalStore, feature: str,
+                         names: Sequence[str], flags: np.ndarray,
+                         prefix_counts: np.ndarray, windows: Windows,
+                         range_width: float, combined: bool = False) -> None:
+        """Set the statistics of some columns of flags.
+
+        The variance is calculated around the rate of the events, as
+        ``sum((flag - rate) ** 2) / size``, flag by flag like
+        `InteractionsList`. It is 0 in the ranges without events.
+
+        Parameters
+        ----------
+        store : IntervalStore
+            The store of the ranges.
+        feature : "clicks", "keys"
+            The feature to be set.
+        names : list [str]
+            The name of each column of flags.
+        flags : numpy.ndarray
+            The flags of each interaction.
+        prefix_counts : numpy.ndarray
+            The cumulative counts of the flags.
+        windows : (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            The bounds of the ranges.
+        range_width : float
+            The width of the ranges.
+        combined : bool, optional
+            If True, the events of the last column are counted as the sum of
+            the events of the second and the third column (e.g. the
+            alphanumeric keys), while its flags are used for the variance.
+        """
+        for location, (starts, ends, width) in zip(
+                LOCATIONS, ColumnarInteractions._halves(windows, range_width)):
+            counts = prefix_counts[ends] - prefix_counts[starts]
+            if combined:
+                counts[:, -1] = counts[:, 1] + counts[:, 2]
+            rates = counts / width
+            # A single interaction is described by the number of its events
+            single = ends - starts == 1
+            for i, name in enumerate(names):
+                variances = np.zeros(len(starts))
+                events = np.flatnonzero((counts[:, i] > 0) & ~single)
+                variances[events] = window_deviations(
+                    flags[:, i], starts[events], ends[events],
+                    rates[events, i])
+                prefix = f"{feature}.{location}.{name}"
+                store.set(f"{prefix}.sum", counts[:, i], INT)
+                store.set(f"{prefix}.avg",
+                          np.where(single, counts[:, i], rates[:, i]),
+                          np.where(single, INT, FLOAT))
+                store.set(f"{prefix}.std", variances,
+                          np.where(single, INT, FLOAT))
+
+    def _set_urls_statistics(self, store: IntervalStore, windows: Windows,
+                             range_width: float) -> None:
+        changed_urls = self._get_prefix_sums()['urls']
+        for location, (starts, ends, width) in zip(
+                LOCATIONS, self._halves(windows, range_width)):
+            changes = changed_urls[ends] - changed_urls[starts + 1]
+            store.set(f"urls.{location}.unique",
+                      [len(set(self.urls[start:end].tolist())) for start, end
+                       in zip(starts.tolist(), ends.tolist())], INT)
+            store.set(f"urls.{location}.changed", changes, INT)
+            store.set(f"urls.{location}.change_rate", changes / width, FLOAT)
+
+    @staticmethod
+    def _set_statistics(store: IntervalStore, prefix: str,
+                        statistics_list: List[BasicStats]) -> None:
+        for name in BasicStats.__slots__:
+            store.set(f"{prefix}.{name}", [getattr(stats, name)
+                                           for stats in statistics_list])
+
+    def _set_event_times(self, store: IntervalStore,
+                         windows: Windows) -> None:
+        for location, (starts, ends, __) in zip(LOCATIONS,
+                                                self._halves(windows, 0)):
+            statistics_list = []
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                timestamps = self._restore(self.timestamps, TIMESTAMP_BIT,
+                                           start, end)
+                times = [t1 - t0 for t0, t1 in zip(timestamps, timestamps[1:])]
+                statistics_list.append(BasicStats(
+                    sum(times), statistics.mean(times),
+                    statistics.stdev(times)) if len(times) > 1
+                                       else BasicStats(0, 0, 0))
+            self._set_statistics(store, f"event_times.{location}",
+                                 statistics_list)
+
+    def _float_idle_times(self, bounds: List[int],
+                          idle_times: List[float]) -> List[Union[int, float]]:
+        """Get the idle times of a range with float timestamps.
+
+        As in InteractionsList, only the runs of idle time with a float
+        timestamp are floats, summed in order: the other ones are integers.
+
+        Parameters
+        ----------
+        bounds : list [int]
+            The interaction before each run of idle time, followed by the last
+            interaction of the range.
+        idle_times : list [float]
+            The idle time of each run.
+
+        Returns
+        -------
+        list [int or float]
+            The idle times of the range.
+        """
+        prefix_sums = self._get_prefix_sums()
+        float_idle = prefix_sums['float_idle']
+        times = prefix_sums['idle_times']
+        result = []
+        for i, idle_time in enumerate(idle_times):
+            first, last = bounds[i] + 1, bounds[i + 1] + 1
+            if float_idle[last] > float_idle[first]:
+                result.append(float(np.cumsum(times[first:last])[-1]))
+            else:
+                result.append(int(idle_time))
+        return result
+
+    def _set_average_idle_time(self, store: IntervalStore,
+                               windows: Windows) -> None:
+        prefix_sums = self._get_prefix_sums()
+        changes, idle = prefix_sums['changes'], prefix_sums['idle']
+        for location, (starts, ends, __) in zip(LOCATIONS,
+                                                self._halves(windows, 0)):
+            first_changes = np.searchsorted(changes, starts + 1)
+            last_changes = np.searchsorted(changes, ends)
+            floats = (prefix_sums['float_idle'][ends] -
+                      prefix_sums['float_idle'][starts + 1]) > 0
+            statistics_list = []
+            for start, end, first, last, is_float in zip(
+                    starts.tolist(), ends.tolist(), first_changes.tolist(),
+                    last_changes.tolist(), floats.tolist()):
+                # Each change ends a run of idle time (possibly empty)
+                runs = [start, *changes[first:last].tolist()]
+                bounds = idle[runs]
+                idle_times = np.diff(bounds).tolist()
+                current_idle = idle[end - 1] - bounds[-1]
+                if current_idle != 0 or not idle_times:
+                    idle_times.append(current_idle)
+                if is_float:
+                    idle_times = self._float_idle_times([*runs, end - 1],
+                                                        idle_times)
+                else:
+                    idle_times = [int(t) for t in idle_times]
+
+                statistics_list.append(BasicStats(
+                    sum(idle_times), statistics.mean(idle_times),
+                    statistics.stdev(idle_times)) if len(idle_times) > 1
+                                       else BasicStats(0, 0, 0))
+            self._set_statistics(store, f"idle.{location}", statistics_list)
+
+    def _process_intervals(self, windows: Windows,
+                           range_width: float) -> IntervalStore:
+        """Calculate the data of a set of ranges.
+
+        Every feature is written directly into the columns of the store,
+        without creating an `IntervalData` object for each range.
+
+        Parameters
+        ----------
+        windows : (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            The bounds of the ranges.
+        range_width : float
+            The width of the ranges.
+
+        Returns
+        -------
+        IntervalStore
+            The data of each range, indexed by its middle interaction.
+        """
+        prefix_sums = self._get_prefix_sums()
+        store = IntervalStore(windows[1])
+        self._set_direction_changes(store, windows, range_width)
+        self._set_mouse_movements(store, windows, range_width)
+        self._set_basic_stats(store, 'avg_speed', 'speeds', windows)
+        self._set_basic_stats(store, 'avg_acceleration', 'accelerations',
+                              windows)
+        flags = self._flags()
+        self._set_flags_stats(store, 'clicks', CLICKS_COLUMNS,
+                              flags['clicks'], prefix_sums['clicks'], windows,
+                              range_width)
+        self._set_flags_stats(store, 'keys', KEYS_COLUMNS, flags['keys'],
+                              prefix_sums['keys'], windows, range_width,
+                              combined=True)
+        self._set_urls_statistics(store, windows, range_width)
+        self._set_event_times(store, windows)
+        self._set_average_idle_time(store, windows)
+        return store
+
+    def set_website_categories(self, websites: Dict[str, Website]) -> None:
+        logger.info("Setting websites categories")
+        categories = _Vocabulary()
+        codes = [categories.code(websites.get(url, Website(None)).category)
+                 for url in self.url_values]
+        self.categories = np.array(codes, dtype=np.int32)[self.urls] \
+            if codes else np.full(len(self), -1, dtype=np.int32)
+        self.category_values = categories.values
+        # The categories are used to find the idle interactions
+        self.prefix_sums = None
+
+    def _columns(self) -> List[List[Any]]:
+        """Get the content of the list, one column for each CSV field.
+
+        Returns
+        -------
+        list [list]
+            The columns, in the same order of the keys of
+            `Interaction.to_dict`.
+        """
+        ids = hexlify(self.ids.tobytes()).decode()
+        category_values = self.category_values + [None]
+        speeds = self.speeds.T.tolist() + self.accelerations.T.tolist()
+        for column in speeds:
+            for i in np.flatnonzero(self.still):
+                column[i] = 0
+        slopes = self.slopes.tolist()
+        for i in np.flatnonzero(np.isnan(self.slopes)):
+            slopes[i] = None
+        flag = _FLAG_VALUES.__getitem__
+        return [
+            [ids[i:i + 24] for i in range(0, len(ids), 24)],
+            [self.user_values[u] for u in self.users.tolist()],
+            self._restore(self.timestamps, TIMESTAMP_BIT),
+            [self.url_values[u] for u in self.urls.tolist()],
+            [category_values[c] for c in self.categories.tolist()],
+            self._restore(self.positions[:, 0], POSITION_BIT),
+            self._restore(self.positions[:, 1], POSITION_BIT + 1),
+            *([flag(f) for f in column] for column in self.clicks.T.tolist()),
+            *speeds,
+            slopes,
+            *(self._restore(self.scrolls[:, i], SCROLL_BIT + i)
+              for i in range(4)),
+            *([flag(f) for f in column] for column in self.keys.T.tolist()),
+            self.emotions_exist.tolist(),
+            *(self._restore(self.emotions[:, i], EMOTIONS_BIT + i)
+              for i in range(len(EMOTIONS)))
+        ]
+
+    def to_csv(self, *filename: str, mode: str = 'w'):
+        dest_path = os.path.join(*filename)
+
+        if not os.path.exists(os.path.dirname(dest_path)):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        with open(dest_path, mode=mode, encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            if mode != 'a' and mode != 'ab':
+                writer.writerow(self[0].to_dict().keys())
+
+            writer.writerows(zip(*self._columns()))
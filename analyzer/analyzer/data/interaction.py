@@ -28,6 +28,7 @@ import statistics
 from copy import copy
 from typing import List, Dict, Any, Sequence, Iterator, Tuple, Set
 
+import numpy as np
 from bson import ObjectId
 
 from analyzer.data.features import DirectionStatistics, RateStats, BasicStats, \
@@ -36,6 +37,7 @@ from analyzer.data.ranges import Range
 from .base import *
 from .emotions import Emotions
 from .interval import IntervalData, RangeData
+from .vectorized import locate_windows
 from .website import Website
 from ..decorators import timed
 
@@ -169,7 +171,7 @@ class InteractionsList(object):
     def __len__(self):
         return len(self.interactions)
 
-    @timed("Set additional data in %.3fs")
+    @timed("Set additional data in %.3fs", stage='derive')
     def _set_additional_data(self):
         def set_speed():
             logger.info("Setting speed")
@@ -232,30 +234,19 @@ class InteractionsList(object):
                    (obj.emotions.valence or -1) >= limit or \
                    (obj.emotions.engagement or -1) >= limit
 
-        def get_emotions_indexes() -> Iterator[int]:
-            for i, obj in enumerate(self.interactions):
-                if has_emotions_over_value(obj):
-                    yield i
-
-        for index in get_emotions_indexes():
-            current_range = Range([], index, [])
-
-            for i in range(max(math.floor(index - width / 2), 0), index):
-                if self.interactions[i].timestamp >= self.interactions[
-                    index].timestamp - width / 2:
-                    current_range.preceding.append(i)
-
-            for i in range(index + 1, min(math.floor(index + width / 2) + 1,
-                                          len(self.interactions))):
-                if self.interactions[i].timestamp > self.interactions[
-                    index].timestamp + width / 2:
-                    break
-                current_range.following.append(i)
-            yield current_range
+        middles = [i for i, obj in enumerate(self.interactions)
+                   if has_emotions_over_value(obj)]
+        timestamps = np.array([obj.timestamp for obj in self.interactions])
+        for start, index, end in zip(*(bounds.tolist() for bounds in
+                                       locate_windows(timestamps, middles,
+                                                      width))):
+            yield Range(list(range(start, index)), index,
+                        list(range(index + 1, end)))
 
     def process_intervals(self, range_width: float, enable_gc: bool = True) -> \
             Tuple[Dict[int, IntervalData], float]:
-        @timed(f"Analyzed all intervals of {range_width} ms in %.3fs")
+        @timed(f"Analyzed all intervals of {range_width} ms in %.3fs",
+               stage='intervals', width=range_width)
         def inner_function():
             logger.info("Getting intervals of %d milliseconds", range_width)
             temp_intervals = self._get_intervals(range_width)
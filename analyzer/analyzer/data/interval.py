@@ -17,7 +17,12 @@
 
 """A module containing various definitions to work with intervals."""
 
-from typing import Tuple
+from collections.abc import Mapping
+from itertools import repeat
+from typing import Tuple, List, Dict, Iterator, Any, Callable, Sequence, \
+    Union
+
+import numpy as np
 
 from .features import DirectionStatistics, RateStats, BasicStats, Clicks, \
     Keyboard, VisitedWebsites
@@ -154,3 +159,284 @@ class IntervalData:
                            else None,
             'idle': self.idle.to_dict() if self.idle else None,
         }
+
+
+FLOAT, INT, NONE, BOOL = range(4)
+"""The Python types of the values stored by `IntervalStore`."""
+
+LOCATIONS = RangeData.__slots__
+"""The parts of a range: 'full', 'before' and 'after'."""
+
+
+def _fields(cls: type) -> Callable[[Iterator[Any]], Any]:
+    def build(values: Iterator[Any]) -> Any:
+        return cls(**{name: next(values) for name in cls.__slots__})
+
+    build.names = list(cls.__slots__)
+    return build
+
+
+def _group(names: Sequence[Any], item: Callable[[Iterator[Any]], Any],
+           cls: type = None) -> Callable[[Iterator[Any]], Any]:
+    def build(values: Iterator[Any]) -> Any:
+        if cls is None:
+            return tuple(item(values) for __ in names)
+        return cls(**{name: item(values) for name in names})
+
+    build.names = [f"{name}.{leaf}" for name in names for leaf in item.names]
+    return build
+
+
+FEATURES: List[Tuple[str, Callable[[Iterator[Any]], Any]]] = [
+    ('slopes', _fields(DirectionStatistics)),
+    ('mouse_movements', _fields(RateStats)),
+    ('scrolls', _fields(RateStats)),
+    ('avg_speed', _group(range(3), _fields(BasicStats))),
+    ('avg_acceleration', _group(range(3), _fields(BasicStats))),
+    ('clicks', _group(Clicks.__slots__, _fields(BasicStats), Clicks)),
+    ('keys', _group(Keyboard.__slots__, _fields(BasicStats), Keyboard)),
+    ('urls', _fields(VisitedWebsites)),
+    ('event_times', _fields(BasicStats)),
+    ('idle', _fields(BasicStats)),
+]
+"""The features of `IntervalData`, with the functions rebuilding them from
+their values (in the order of the columns of `IntervalStore`)."""
+
+
+def _flatten(value: Any, values: List[Any]) -> None:
+    if isinstance(value, tuple):
+        for item in value:
+            _flatten(item, values)
+    elif hasattr(value, '__slots__'):
+        for name in value.__slots__:
+            _flatten(getattr(value, name), values)
+    else:
+        values.append(value)
+
+
+def value_kinds(values: Sequence[Any]) -> np.ndarray:
+    """Get the kinds (`FLOAT`, `INT`, `NONE` or `BOOL`) of some values.
+
+    Parameters
+    ----------
+    values : list
+        The values.
+
+    Returns
+    -------
+    numpy.ndarray
+        The kind of each value.
+    """
+    size = len(values)
+    kinds = np.full(size, FLOAT, dtype=np.int8)
+    kinds[np.fromiter(map(isinstance, values, repeat(int)), dtype=np.bool_,
+                      count=size)] = INT
+    kinds[np.fromiter(map(isinstance, values, repeat(bool)), dtype=np.bool_,
+                      count=size)] = BOOL
+    kinds[np.fromiter((value is None for value in values), dtype=np.bool_,
+                      count=size)] = NONE
+    return kinds
+
+
+class IntervalStore(Mapping):
+    """The data of a set of ranges of the same width, stored as a matrix.
+
+    Each range is a row and each value of `IntervalData` is a column (see
+    `COLUMNS`). Since a value can be an integer, a float or None, the Python
+    type of each value is kept in a second matrix, so that the same values
+    are written to the CSV files.
+
+    The store is a mapping from the middle indexes to the data of the ranges:
+    `IntervalData` objects are built only when they are requested.
+
+    Attributes
+    ----------
+    middles : numpy.ndarray
+        The index of the middle object of each range.
+    values : numpy.ndarray
+        The values, with shape (ranges, columns). Missing values are NaN.
+    kinds : numpy.ndarray
+        The type of each value (`FLOAT`, `INT`, `NONE` or `BOOL`), with the
+        same shape of `values`.
+    """
+    __slots__ = ["middles", "values", "kinds", "_rows"]
+
+    COLUMNS: List[str] = [f"{feature}.{location}.{name}"
+                          for feature, build in FEATURES
+                          for location in LOCATIONS
+                          for name in build.names]
+    """The names of the columns, as feature, location and value (e.g.
+    'clicks.before.left.avg')."""
+    INDEX: Dict[str, int] = {name: i for i, name in enumerate(COLUMNS)}
+    """The index of each column."""
+
+    def __init__(self, middles: Sequence[int]):
+        """Create an empty store.
+
+        Parameters
+        ----------
+        middles : list [int]
+            The index of the middle object of each range.
+        """
+        self.middles: np.ndarray = np.asarray(middles, dtype=np.int64)
+        self.values: np.ndarray = np.full(
+            (len(self.middles), len(self.COLUMNS)), np.nan)
+        self.kinds: np.ndarray = np.full(self.values.shape, NONE,
+                                         dtype=np.int8)
+        self._rows = None
+
+    def __getstate__(self):
+        return self.middles, self.values, self.kinds
+
+    def __setstate__(self, state):
+        self.middles, self.values, self.kinds = state
+        self._rows = None
+
+    def set(self, column: str, values: Union[np.ndarray, Sequence[Any]],
+            kinds: Union[int, np.ndarray] = None) -> None:
+        """Set the values of a column.
+
+        Parameters
+        ----------
+        column : str
+            The name of the column.
+        values : numpy.ndarray or list
+            The value of each range.
+        kinds : int or numpy.ndarray, optional
+            The type of the values. If None, it is taken from the values,
+            which must then be Python objects.
+        """
+        i = self.INDEX[column]
+        if kinds is None:
+            kinds = value_kinds(values)
+            values = np.array(values, dtype=np.float64)
+        self.values[:, i] = values
+        self.kinds[:, i] = kinds
+
+    @classmethod
+    def concatenate(cls, stores: Sequence['IntervalStore']) -> \
+            'IntervalStore':
+        """Join the ranges of several stores, in the given order.
+
+        Parameters
+        ----------
+        stores : list [IntervalStore]
+            The stores.
+
+        Returns
+        -------
+        IntervalStore
+            The store holding the ranges of all the stores.
+        """
+        if not stores:
+            return cls([])
+        store = cls.__new__(cls)
+        store.__setstate__((
+            np.concatenate([part.middles for part in stores]),
+            np.concatenate([part.values for part in stores]),
+            np.concatenate([part.kinds for part in stores])))
+        return store
+
+    @classmethod
+    def from_intervals(cls, intervals: Mapping) -> 'IntervalStore':
+        """Store the data of a set of ranges.
+
+        Parameters
+        ----------
+        intervals : dict [int, IntervalData]
+            The data of each range, indexed by its middle interaction.
+
+        Returns
+        -------
+        IntervalStore
+            The store holding the same values.
+        """
+        if isinstance(intervals, IntervalStore):
+            return intervals
+        store = cls(list(intervals))
+        rows = []
+        for data in intervals.values():
+            row = []
+            for feature, __ in FEATURES:
+                _flatten(getattr(data, feature), row)
+            rows.append(row)
+        if rows:
+            store.values[...] = np.array(rows, dtype=np.float64)
+            store.kinds[...] = value_kinds(
+                [value for row in rows for value in row]).reshape(
+                store.kinds.shape)
+        return store
+
+    def objects(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """Get a block of values, as Python objects.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The indexes of the rows. A negative index stands for a missing
+            range, whose values are all None.
+        columns : numpy.ndarray
+            The indexes of the columns.
+
+        Returns
+        -------
+        numpy.ndarray
+            The values, with shape (rows, columns) and type object.
+        """
+        values = self.values[rows][:, columns]
+        kinds = self.kinds[rows][:, columns]
+        kinds[rows < 0] = NONE
+        objects = values.astype(object)
+        for kind, dtype in ((INT, np.int64), (BOOL, np.bool_)):
+            mask = kinds == kind
+            if mask.any():
+                objects[mask] = values[mask].astype(dtype).astype(object)
+        objects[kinds == NONE] = None
+        return objects
+
+    def row(self, i: int) -> List[Any]:
+        """Get the values of a range, as Python objects.
+
+        Parameters
+        ----------
+        i : int
+            The index of the row.
+
+        Returns
+        -------
+        list
+            The values, in the order of `COLUMNS`.
+        """
+        return self.objects(np.array([i]),
+                            np.arange(len(self.COLUMNS)))[0].tolist()
+
+    def __getitem__(self, middle: int) -> IntervalData:
+        if self._rows is None:
+            self._rows = {m: i for i, m in enumerate(self.middles.tolist())}
+        values = iter(self.row(self._rows[middle]))
+        return IntervalData(middle, **{
+            feature: RangeData(build(values), build(values), build(values))
+            for feature, build in FEATURES})
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.middles.tolist())
+
+    def __len__(self) -> int:
+        return len(self.middles)
+
+    def to_dict(self, middle: int) -> Dict[str, Any]:
+        """Convert the data of a range to a dictionary.
+
+        This is equivalent to ``self[middle].to_dict()``.
+
+        Parameters
+        ----------
+        middle : int
+            The index of the middle object of the range.
+
+        Returns
+        -------
+        dict [str, any]
+            A dictionary representing the data of the range.
+        """
+        return self[middle].to_dict()
@@ -21,15 +21,21 @@ import gc
 import logging
 import math
 import os
-import re
 import urllib.parse
-from typing import Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 
+import pymongo
 import pymongo.database as db
 import requests
+import requests.adapters
 
 from analyzer.decorators import timed
 from .base import MouseData, ScreenCoordinates, ScrollData, KeyboardData
+from .cache import load_cached, save_cached
+from .columnar import ColumnarBuilder, ColumnarInteractions, OtherButtons, \
+    DECODE_BATCH_SIZE
 from .emotions import Emotions
 from .interaction import InteractionsList, Interaction
 from .user import User
@@ -39,10 +45,104 @@ logger = logging.getLogger(__name__)
 
 BASE_API_URL = "https://giuseppe-desolda.ddns.net:8080"
 
+INTERACTION_FIELDS = {field: True for field in
+                      ["ui", "t", "u", "m.p", "m.b", "s.a", "s.r", "k", "e"]}
+"""The fields of the interactions that are decoded (`_id` is always
+included)."""
+INTERACTIONS_ORDER = [("t", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+"""The order used to stream the interactions from the database."""
+INTERACTIONS_INDEX = [("ui", pymongo.ASCENDING)] + INTERACTIONS_ORDER
+"""The index supporting the streaming of the interactions of a user."""
+STREAM_BATCH_SIZE = 10000
+"""The number of interactions fetched by each round trip while streaming."""
+REST_CONCURRENCY = 8
+"""The maximum number of pages requested at the same time to the REST APIs."""
 
-@timed("Loaded interactions in %.3fs")
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+
+
+def get_session() -> requests.Session:
+    """Get the HTTP session used to call the REST APIs.
+
+    The session keeps its connections open, so that the following requests do
+    not repeat the TLS handshake. Each process gets its own session.
+
+    Returns
+    -------
+    requests.Session
+        The session of the current process.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = requests.Session()
+        _session.verify = False
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=REST_CONCURRENCY)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session_pid = os.getpid()
+    return _session
+
+
+def fetch_pages(api_url: str, pages: int, page_size: int,
+                extend: bool = True, start: int = 0) -> Iterator[list]:
+    """Fetch the pages of a paginated endpoint of the REST APIs.
+
+    Up to `REST_CONCURRENCY` pages are requested at the same time, but they
+    are returned in order.
+
+    Parameters
+    ----------
+    api_url : str
+        The URL of the endpoint, with two placeholders for the index of the
+        first object and for the number of objects of the page.
+    pages : int
+        The number of pages to be fetched.
+    page_size : int
+        The number of objects of each page.
+    extend : bool, optional
+        Whether or not to keep fetching the following pages (one at a time)
+        while the last one is full, in case the objects were added after
+        they were counted.
+    start : int, optional
+        The index of the first object to be fetched.
+
+    Yields
+    ------
+    list
+        The objects of each page.
+    """
+    session = get_session()
+
+    def fetch(page: int) -> list:
+        return session.get(api_url.format(start + page * page_size,
+                                          page_size)).json()
+
+    content = None
+    with ThreadPoolExecutor(max_workers=REST_CONCURRENCY) as executor:
+        requested = deque()
+        for page in range(pages):
+            requested.append(executor.submit(fetch, page))
+            if len(requested) >= REST_CONCURRENCY:
+                content = requested.popleft().result()
+                yield content
+        while requested:
+            content = requested.popleft().result()
+            yield content
+
+    page = pages
+    while extend and content is not None and len(content) >= page_size:
+        content = fetch(page)
+        yield content
+        page += 1
+
+
+@timed("Loaded interactions in %.3fs", stage='load')
 def load_interactions(mongodb: db.Database = None, user: str = None,
-                      enable_gc: bool = True) -> InteractionsList:
+                      enable_gc: bool = True, columnar: bool = False,
+                      streaming: bool = False, cache_dir: str = None) -> \
+        Union[InteractionsList, ColumnarInteractions]:
     """Load the interactions.
 
     Parameters
@@ -57,10 +157,23 @@ def load_interactions(mongodb: db.Database = None, user: str = None,
         Whether or not to enable the explicit calls to the garbage collection.
         This will improve the memory footprint but will make the program run
         slower.
+    columnar : bool, optional
+        Whether or not to store the interactions column by column, instead of
+        creating an object for each interaction.
+    streaming : bool, optional
+        Whether or not to stream the interactions from the database, fetching
+        only the decoded fields, already sorted by the database, in large
+        batches. The interactions are always stored column by column. It has
+        no effect if the REST APIs are used.
+    cache_dir : str, optional
+        A directory where the interactions of each user are cached. If given,
+        only the interactions collected after the cached ones are fetched,
+        and the interactions are always stored column by column. It has no
+        effect if `user` is None or in testing mode.
 
     Returns
     -------
-    InteractionsList
+    InteractionsList or ColumnarInteractions
         The list of interactions.
     float
         The time the execution took. Returned by the `@timed` decorator.
@@ -79,6 +192,12 @@ def load_interactions(mongodb: db.Database = None, user: str = None,
         Interaction
             The converted object.
         """
+        mouse = to_convert.get("m", {})
+        buttons = mouse.get("b", {})
+        scroll = to_convert.get("s", {})
+        keyboard = to_convert.get("k", {})
+        emotions = to_convert.get("e", None)
+        known_emotions = emotions or {}
         # noinspection PyArgumentList
         return Interaction(
             id=to_convert["_id"],
@@ -86,98 +205,115 @@ def load_interactions(mongodb: db.Database = None, user: str = None,
             timestamp=to_convert.get("t", None),
             url=to_convert.get("u", None),
             mouse=MouseData(
-                position=ScreenCoordinates(
-                    *to_convert.get("m", {}).get("p", [None, None])),
+                position=ScreenCoordinates(*mouse.get("p", [None, None])),
                 clicks=MouseData.Clicks(
-                    any=any(to_convert.get("m", {}).get("b", {}).values()),
-                    left=to_convert.get("m", {}).get("b", {}).get('l', False),
-                    right=to_convert.get("m", {}).get("b", {}).get('r'),
-                    middle=to_convert.get("m", {}).get("b", {}).get('m'),
-                    others=any([value for key, value in
-                                to_convert.get("m", {}).get("b", {}).items() if
-                                re.match(r"^b\d+?$", key)]),
+                    any=any(buttons.values()),
+                    left=buttons.get('l', False),
+                    right=buttons.get('r'),
+                    middle=buttons.get('m'),
+                    others=any([value for key, value in buttons.items() if
+                                other_buttons[key]]),
                 )
             ),
             scroll=ScrollData(
-                absolute=ScreenCoordinates(
-                    *to_convert.get("s", {}).get("a", [None, None])),
-                relative=ScreenCoordinates(
-                    *to_convert.get("s", {}).get("r", [None, None])),
+                absolute=ScreenCoordinates(*scroll.get("a", [None, None])),
+                relative=ScreenCoordinates(*scroll.get("r", [None, None])),
             ),
             keyboard=KeyboardData(
-                any=any(to_convert.get("k", {}).values()),
-                alpha=to_convert.get("k", {}).get("a", None),
-                numeric=to_convert.get("k", {}).get("n", None),
-                function=to_convert.get("k", {}).get("f", None),
-                symbol=to_convert.get("k", {}).get("s", None),
+                any=any(keyboard.values()),
+                alpha=keyboard.get("a", None),
+                numeric=keyboard.get("n", None),
+                function=keyboard.get("f", None),
+                symbol=keyboard.get("s", None),
             ),
             emotions=Emotions(
-                exists=to_convert.get("e", None) is None,
-                joy=to_convert.get("e", {}).get("j", None),
-                fear=to_convert.get("e", {}).get("f", None),
-                disgust=to_convert.get("e", {}).get("d", None),
-                sadness=to_convert.get("e", {}).get("s", None),
-                anger=to_convert.get("e", {}).get("a", None),
-                surprise=to_convert.get("e", {}).get("su", None),
-                contempt=to_convert.get("e", {}).get("c", None),
-                valence=to_convert.get("e", {}).get("v", None),
-                engagement=to_convert.get("e", {}).get("e", None)
+                exists=emotions is None,
+                joy=known_emotions.get("j", None),
+                fear=known_emotions.get("f", None),
+                disgust=known_emotions.get("d", None),
+                sadness=known_emotions.get("s", None),
+                anger=known_emotions.get("a", None),
+                surprise=known_emotions.get("su", None),
+                contempt=known_emotions.get("c", None),
+                valence=known_emotions.get("v", None),
+                engagement=known_emotions.get("e", None)
             )
         )
 
+    other_buttons = OtherButtons()
     is_test_mode = os.getenv('TESTING_MODE', 'False') == 'True'
     testing_limit = 20000
 
-    if mongodb:
+    caching = cache_dir is not None and user is not None and not is_test_mode
+    cached = load_cached(cache_dir, user) if caching else None
+    cached_size = len(cached) if cached else 0
+    query = {} if user is None else {'ui': user}
+    if cached:
+        # Only the documents following the high-water mark are fetched
+        query['_id'] = {'$gt': cached.last_id()}
+
+    columnar = columnar or caching or (streaming and bool(mongodb))
+    if columnar:
+        interactions = cached or ColumnarBuilder()
+        add_objects = interactions.extend
+    else:
+        interactions = list()
+
+        def add_objects(objects: Iterable[dict]) -> None:
+            interactions.extend(map(convert_object, objects))
+
+    if mongodb and streaming:
+        logger.info("Streaming interactions from database...")
+        cursor = mongodb['interactions'].find(
+            query,
+            projection=INTERACTION_FIELDS,
+            sort=INTERACTIONS_ORDER,
+            batch_size=STREAM_BATCH_SIZE)
+        if is_test_mode:
+            cursor.limit(testing_limit)
+
+        add_objects(cursor)
+    elif mongodb:
         logger.info("Loading interactions from database...")
-        interactions = mongodb['interactions'].find() if user is None else \
-            mongodb['interactions'].find({'ui': user})
-        logger.info("Got %d objects", interactions.count())
+        cursor = mongodb['interactions'].find(query)
+        logger.info("Got %d objects", cursor.count())
         if is_test_mode:
-            interactions.limit(testing_limit)
+            cursor.limit(testing_limit)
 
-        interactions = [convert_object(obj) for obj in interactions]
+        add_objects(cursor)
     else:
         api_url = f"{BASE_API_URL}/api/interactions/{{}}-{{}}" if user is None \
             else f"{BASE_API_URL}/api/user/{user}/interactions/{{}}-{{}}"
-        current_base = 0
         skip = 10000
 
-        number_of_objects = int(requests.get(
-            api_url[0:-5] + 'count', verify=False).text)
-        expected_iterations = math.ceil(number_of_objects / skip) \
+        number_of_objects = int(
+            get_session().get(api_url[0:-5] + 'count').text)
+        # The REST APIs return the interactions in a stable order, so the
+        # high-water mark is the number of cached interactions
+        expected_iterations = \
+            math.ceil((number_of_objects - cached_size) / skip) \
             if not is_test_mode or number_of_objects < testing_limit \
             else math.ceil(testing_limit / skip)
 
         if number_of_objects == 0:
             logger.warning("No data to load")
-            return InteractionsList([])
-
-        interactions = list()
-        while True:
-            if is_test_mode and current_base >= testing_limit:
-                break
-
-            logger.info(
-                "Loading interactions from web APIs (%d of %d)...",
-                round(current_base / skip) + 1,
-                expected_iterations)
-            db_content = requests.get(api_url.format(current_base, skip),
-                                      verify=False).json()
+            return ColumnarBuilder().build() if columnar \
+                else InteractionsList([])
 
+        pages = fetch_pages(api_url, max(expected_iterations, 0), skip,
+                            extend=not is_test_mode, start=cached_size)
+        for page, db_content in enumerate(pages, 1):
             if not db_content:
                 logger.info(
                     "Loaded interactions from web APIs (%d of %d): empty",
-                    round(current_base / skip) + 1, expected_iterations)
-                break
+                    page, expected_iterations)
+                continue
 
-            interactions.extend(convert_object(obj) for obj in db_content)
+            add_objects(db_content)
             del db_content
-            current_base += skip
             logger.info(
                 "Loaded interactions from web APIs (%d of %d)",
-                round(current_base / skip),
-                expected_iterations)
+                page, expected_iterations)
         if enable_gc:
             logger.info("Running garbage collector")
             collected = gc.collect()
@@ -204,9 +340,145 @@ def load_interactions(mongodb: db.Database = None, user: str = None,
     #         filter(lambda obj: obj not in to_remove, interactions))
     # logger.info("Done. New number of interactions: %d", len(interactions))
 
+    if caching and (not cached or len(interactions) > cached_size):
+        save_cached(cache_dir, user, interactions)
+    if columnar:
+        return interactions.build()
     return InteractionsList(interactions)
 
 
+def stream_users_interactions(mongodb: db.Database, users: Iterable[str]) \
+        -> Iterator[Tuple[str, ColumnarInteractions]]:
+    """Stream the interactions of several users with a single query.
+
+    The interactions are fetched sorted by user, so each user's interactions
+    are complete (and handed to the caller) as soon as the next user's ones
+    begin.
+
+    Parameters
+    ----------
+    mongodb : pymongo.database.Database
+        An instance of a MongoDB database.
+    users : iterable [str]
+        The IDs of the users whose interactions will be fetched.
+
+    Yields
+    ------
+    str
+        The ID of a user. Users without interactions come last.
+    ColumnarInteractions
+        The interactions of the user.
+    """
+    users = list(users)
+    is_test_mode = os.getenv('TESTING_MODE', 'False') == 'True'
+    testing_limit = 20000
+
+    logger.info("Streaming interactions of %d users from database...",
+                len(users))
+    # The cursor is idle while the caller processes each user, which can
+    # take longer than the timeout of the server: it is kept alive in an
+    # explicit session, closed with the cursor when the stream ends
+    session = mongodb.client.start_session()
+    cursor = mongodb['interactions'].find(
+        {'ui': {'$in': users}},
+        projection=INTERACTION_FIELDS,
+        sort=INTERACTIONS_INDEX,
+        batch_size=STREAM_BATCH_SIZE,
+        no_cursor_timeout=True,
+        session=session)
+
+    def build() -> ColumnarInteractions:
+        builder.extend(batch)
+        logger.info("Done. Loaded %d interactions of user '%s'",
+                    len(builder), user)
+        return builder.build()
+
+    user, builder, batch = None, None, []
+    loaded = set()
+    try:
+        for document in cursor:
+            if document.get('ui', None) != user or builder is None:
+                if builder is not None:
+                    yield user, build()
+                user, builder, batch = document.get('ui', None), \
+                    ColumnarBuilder(), []
+                loaded.add(user)
+            if is_test_mode and len(builder) + len(batch) >= testing_limit:
+                continue
+            batch.append(document)
+            if len(batch) >= DECODE_BATCH_SIZE:
+                builder.extend(batch)
+                batch = []
+    finally:
+        cursor.close()
+        session.end_session()
+    if builder is not None:
+        yield user, build()
+
+    for user in users:
+        if user not in loaded:
+            yield user, ColumnarBuilder().build()
+
+
+def create_interactions_index(mongodb: db.Database) -> None:
+    """Create the index used to stream the interactions of a user, if missing.
+
+    Parameters
+    ----------
+    mongodb : pymongo.database.Database
+        An instance of a MongoDB database.
+    """
+    logger.info("Creating the index of the interactions (if missing)")
+    mongodb['interactions'].create_index(INTERACTIONS_INDEX)
+
+
+@timed("Counted interactions in %.3fs")
+def count_interactions(users: Iterable[str],
+                       mongodb: db.Database = None) -> Dict[str, int]:
+    """Count the interactions of some users.
+
+    On the REST APIs, up to `REST_CONCURRENCY` users are counted at the same
+    time.
+
+    Parameters
+    ----------
+    users : iterable [str]
+        The IDs of the users whose interactions will be counted.
+    mongodb : pymongo.database.Database, optional
+        An instance of a MongoDB database to get the data. If None, the REST
+        APIs will be used.
+
+    Returns
+    -------
+    dict [str, int]
+        A dictionary containing the number of interactions of each user. Users
+        without interactions are counted as 0.
+    float
+        The time the execution took. Returned by the `@timed` decorator.
+    """
+    users = list(users)
+    if mongodb:
+        logger.info("Counting interactions from database...")
+        counts = {str(group['_id']): group['count'] for group in
+                  mongodb['interactions'].aggregate([
+                      {'$match': {'ui': {'$in': users}}},
+                      {'$group': {'_id': '$ui', 'count': {'$sum': 1}}}
+                  ])}
+    else:
+        logger.info("Counting interactions from web APIs...")
+        session = get_session()
+
+        def count(user: str) -> int:
+            return int(session.get(
+                f"{BASE_API_URL}/api/user/{user}/interactions/count").text)
+
+        with ThreadPoolExecutor(max_workers=REST_CONCURRENCY) as executor:
+            counts = dict(zip(users, executor.map(count, users)))
+
+    logger.info("Done. Counted the interactions of %d users", len(users))
+    return {user: counts.get(user, 0) for user in users}
+
+
 @timed("Loaded users in %.3fs")
 def load_users(mongodb: db.Database = None) -> Dict[str, User]:
     """Load the users.
@@ -230,9 +502,7 @@ def load_users(mongodb: db.Database = None) -> Dict[str, User]:
         db_content = list(mongodb['users'].find())
     else:
         logger.info("Loading users from web APIs...")
-        db_content = requests.get(
-            "https://giuseppe-desolda.ddns.net:8080/api/users",
-            verify=False).json()
+        db_content = get_session().get(f"{BASE_API_URL}/api/users").json()
 
     users = dict()
     for user in db_content:
@@ -270,9 +540,7 @@ def load_websites(mongodb: db.Database = None) -> Dict[str, Website]:
             del website['_id']
     else:
         logger.info("Loading websites from web APIs...")
-        db_content = requests.get(
-            "https://giuseppe-desolda.ddns.net:8080/api/websites",
-            verify=False).json()
+        db_content = get_session().get(f"{BASE_API_URL}/api/websites").json()
         for website in db_content:
             website['url'] = urllib.parse.urlparse(website['url'])
 
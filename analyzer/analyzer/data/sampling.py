@@ -0,0 +1,119 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to select the emotion frames whose ranges are calculated.
+
+The classification uses only a part of the aggregate data: a random split or
+the stratified sample built by ``sample.py``, which takes the same number of
+rows for each discretized value of each emotion. The same selection can be
+made on the emotion frames before their ranges are calculated, so that the
+ranges of the discarded frames are never computed.
+
+The discretization is the one of
+`classification.data_loader.discretize_emotions`: the range of each emotion
+(from -100 to 100 for the valence, from 0 to 100 for the others) is split
+into `DISCRETE_STEPS` steps of the same width, the maximum belongs to the last
+step and the missing values count as 0.
+"""
+
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+DISCRETE_STEPS = 7
+"""The number of steps of the discretized emotions."""
+EMOTIONS_RANGES: List[Tuple[float, float]] = [(0, 100)] * 7 + \
+    [(-100, 100), (0, 100)]
+"""The minimum and the maximum value of each emotion, in the order of
+`analyzer.data.columnar.EMOTIONS_KEYS`."""
+
+
+def discretize(values: np.ndarray, minimum: float = 0, maximum: float = 100,
+               steps: int = DISCRETE_STEPS) -> np.ndarray:
+    """Find the step of each value of an emotion.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The values of the emotion.
+    minimum, maximum : float, optional
+        The range of the emotion.
+    steps : int, optional
+        The number of steps.
+
+    Returns
+    -------
+    numpy.ndarray
+        The step of each value, or -1 if the value is out of the range.
+    """
+    step_width = (maximum - minimum) / steps
+    # The same bounds compared by discretize_emotions
+    bounds = minimum + step_width * np.arange(steps + 1)
+    indexes = np.searchsorted(bounds, values, side='right') - 1
+    indexes[(indexes < 0) | (indexes >= steps)] = -1
+    indexes[values == maximum] = steps - 1
+    return indexes
+
+
+def sample_frames(emotions: np.ndarray, frames: np.ndarray, fraction: float,
+                  rng: np.random.Generator, stratified: bool = False,
+                  steps: int = DISCRETE_STEPS) -> np.ndarray:
+    """Select a part of the emotion frames.
+
+    Without stratification, ``ceil(len(frames) * fraction)`` frames are
+    chosen at random. With stratification, the quota of ``sample.py`` is
+    applied to each step of each emotion: up to
+    ``ceil(ceil(len(frames) * fraction) / steps)`` frames are chosen at random
+    among the ones in that step, and the frames chosen for any emotion are
+    kept.
+
+    Parameters
+    ----------
+    emotions : numpy.ndarray
+        The values of the emotions of all the interactions, with shape
+        (n, 9).
+    frames : numpy.ndarray
+        The indexes of the emotion frames.
+    fraction : float
+        The fraction of the frames to be selected, in [0, 1].
+    rng : numpy.random.Generator
+        The random generator.
+    stratified : bool, optional
+        Whether or not to select the same number of frames for each step of
+        each emotion.
+    steps : int, optional
+        The number of steps of the discretized emotions.
+
+    Returns
+    -------
+    numpy.ndarray
+        The indexes of the selected frames, sorted.
+    """
+    total = math.ceil(len(frames) * fraction)
+    if not stratified:
+        return np.sort(rng.choice(frames, total, replace=False))
+    quota = math.ceil(total / steps)
+    values = np.nan_to_num(emotions[frames], nan=0)
+    selected = np.zeros(len(frames), dtype=np.bool_)
+    for column, (minimum, maximum) in enumerate(EMOTIONS_RANGES):
+        indexes = discretize(values[:, column], minimum, maximum, steps)
+        for step in range(steps):
+            candidates = np.flatnonzero(indexes == step)
+            selected[rng.choice(candidates, min(quota, len(candidates)),
+                                replace=False)] = True
+    return frames[selected]
@@ -0,0 +1,171 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to share interactions and results between processes.
+
+The columns of a `ColumnarInteractions` are copied once into a block of shared
+memory: the worker processes attach to the block and use the columns without
+copying them. The data of the ranges is sent back as an `IntervalStore`, whose
+few arrays are much cheaper to pickle than the `IntervalData` objects.
+"""
+
+import logging
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .columnar import ColumnarInteractions
+from .interval import IntervalStore
+
+logger = logging.getLogger(__name__)
+
+
+class SharedInteractions(object):
+    """The columns of a `ColumnarInteractions`, stored in shared memory.
+
+    The object that creates the block owns it and frees it when it is closed
+    (or at the end of a ``with`` statement). The object can be pickled and sent
+    to other processes, which can then use `attach` to access the columns.
+
+    Attributes
+    ----------
+    name : str
+        The name of the block of shared memory.
+    layout : list [(str, str, tuple [int], int)]
+        The name, the data type, the shape and the offset of each column.
+    values : (list [str], list [str], list [str])
+        The values of the codes of the users, of the URLs and of the
+        categories.
+    frames : numpy.ndarray, optional
+        If the emotion frames were sampled, the indexes of the selected ones.
+    rows : numpy.ndarray, optional
+        If the list was pruned, the index of each interaction in the whole
+        list.
+    """
+    __slots__ = ["name", "layout", "values", "frames", "rows", "_memory"]
+
+    def __init__(self, interactions: ColumnarInteractions):
+        """Copy the columns of a list of interactions into shared memory.
+
+        Parameters
+        ----------
+        interactions : ColumnarInteractions
+            The interactions to be shared. The categories of the websites must
+            already be set.
+        """
+        columns = [np.ascontiguousarray(getattr(interactions, name))
+                   for name in ColumnarInteractions.COLUMNS]
+        self.layout: List[Tuple[str, str, Tuple[int, ...], int]] = []
+        size = 0
+        for name, column in zip(ColumnarInteractions.COLUMNS, columns):
+            # Keep every column aligned to 8 bytes
+            size += -size % 8
+            self.layout.append((name, column.dtype.str, column.shape, size))
+            size += column.nbytes
+        self._memory = SharedMemory(create=True, size=max(size, 1))
+        self.name: str = self._memory.name
+        for (__, dtype, shape, offset), column in zip(self.layout, columns):
+            np.ndarray(shape, dtype, buffer=self._memory.buf,
+                       offset=offset)[...] = column
+        self.values: Tuple[List[str], List[str], List[str]] = (
+            interactions.user_values, interactions.url_values,
+            interactions.category_values)
+        self.frames: Optional[np.ndarray] = interactions.frames
+        self.rows: Optional[np.ndarray] = interactions.rows
+        logger.info("Shared %d bytes of interactions ('%s')", size, self.name)
+
+    def __getstate__(self):
+        return self.name, self.layout, self.values, self.frames, self.rows
+
+    def __setstate__(self, state):
+        self.name, self.layout, self.values, self.frames, self.rows = state
+        self._memory = None
+
+    def __enter__(self) -> 'SharedInteractions':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Free the block of shared memory, if it is owned by this object."""
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def attach(self, memory: SharedMemory) -> ColumnarInteractions:
+        """Get the interactions stored in a block of shared memory.
+
+        Parameters
+        ----------
+        memory : multiprocessing.shared_memory.SharedMemory
+            The block named `name`, opened by the caller. It can be closed only
+            after all the references to the returned object are dropped.
+
+        Returns
+        -------
+        ColumnarInteractions
+            The interactions, whose columns are views of the shared memory,
+            with the same sampled frames and pruned rows.
+        """
+        columns = {name: np.ndarray(shape, dtype, buffer=memory.buf,
+                                    offset=offset)
+                   for name, dtype, shape, offset in self.layout}
+        interactions = ColumnarInteractions.from_columns(columns,
+                                                         *self.values)
+        interactions.frames = self.frames
+        interactions.rows = self.rows
+        return interactions
+
+
+def process_shared_intervals(shared: SharedInteractions, range_width: float,
+                             enable_gc: bool = True) -> \
+        Tuple[Tuple[IntervalStore, float], float]:
+    """Calculate the data of the ranges of shared interactions.
+
+    This function is meant to be run by the worker processes: it attaches to
+    the shared interactions and returns the data of the ranges.
+
+    Parameters
+    ----------
+    shared : SharedInteractions
+        The shared interactions.
+    range_width : float
+        The width of the ranges.
+    enable_gc : bool, optional
+        Whether or not to explicitly run the garbage collector.
+
+    Returns
+    -------
+    (IntervalStore, float)
+        The data of the ranges and their width.
+    float
+        The time the execution took, as returned by
+        `ColumnarInteractions.process_intervals`.
+    """
+    memory = SharedMemory(name=shared.name)
+    try:
+        interactions = shared.attach(memory)
+        (intervals, __), t = interactions.process_intervals(
+            range_width, enable_gc=enable_gc)
+        # The views of the shared memory must be dropped before closing it
+        del interactions
+        return (intervals, range_width), t
+    finally:
+        memory.close()
@@ -0,0 +1,257 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to generate synthetic interaction documents.
+
+The documents have the same schema of the ones collected by the extension
+(the one decoded by `load_interactions`), so that the analyzer can be run and
+benchmarked without access to the real data. The generation is seeded: the
+same parameters always give the same documents.
+
+Each user browses in sessions separated by long pauses. During a session, the
+events follow a Poisson process; the mouse moves with a random walk, while
+clicks, scrolls and key presses are rare. The emotions are sampled at a fixed
+frequency and attached to the first event following each sample, as done by
+the extension.
+
+The documents can be kept in an in-memory `Database`, so that the tests and
+the benchmarks run without a MongoDB server.
+"""
+
+import logging
+import urllib.parse
+from typing import Any, Iterator, List, Tuple, Dict
+
+import numpy as np
+from bson import ObjectId
+
+from .columnar import EMOTIONS_KEYS
+from .website import Website
+
+logger = logging.getLogger(__name__)
+
+START_TIME = 1601510400000
+"""The timestamp of the first event (2020-10-01), in milliseconds."""
+SCREEN_SIZE = (1920, 1080)
+"""The bounds of the mouse positions."""
+WEBSITES = 50
+"""The number of distinct websites visited by the users."""
+CATEGORIES = ['news', 'social', 'shopping', 'search', 'video', 'education']
+"""The categories of the websites."""
+
+
+def _pages(rng: np.random.Generator) -> List[Tuple[str, str]]:
+    pages = []
+    for i in range(WEBSITES):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        pages.extend((f"https://www.website{i}.com/page{j}", category)
+                     for j in range(rng.integers(1, 6)))
+    return pages
+
+
+def generate_websites(seed: int = 0) -> Dict[str, Website]:
+    """Generate the websites visited by the synthetic interactions.
+
+    Parameters
+    ----------
+    seed : int, optional
+        The seed given to `generate_interactions`.
+
+    Returns
+    -------
+    dict [str, Website]
+        The websites, indexed by their URL, as returned by `load_websites`.
+    """
+    return {url: Website(urllib.parse.urlparse(url), category=category)
+            for url, category in _pages(np.random.default_rng(seed))}
+
+
+def _emotions(rng: np.random.Generator, n_frames: int) -> np.ndarray:
+    """Generate the values of the emotions of a user.
+
+    Each emotion is a smooth random walk around a baseline: most of the
+    values are below 1, with bursts lasting a few seconds.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        The random generator.
+    n_frames : int
+        The number of sampled frames.
+
+    Returns
+    -------
+    numpy.ndarray
+        A matrix with the value of each emotion (columns) in each frame.
+    """
+    # An autoregressive process, truncated to the last seconds
+    kernel = 0.95 ** np.arange(100)
+    noise = rng.normal(0, 1, (n_frames + len(kernel), len(EMOTIONS_KEYS)))
+    values = np.column_stack([
+        np.convolve(column, kernel, mode='valid')[1:] for column in noise.T])
+    valence = EMOTIONS_KEYS.index('v')
+    others = np.arange(len(EMOTIONS_KEYS)) != valence
+    values[:, valence] *= 6
+    values[:, others] = np.maximum(np.abs(values[:, others]) - 5, 0) * 10
+    return np.clip(values, -100, 100)
+
+
+def generate_interactions(n_interactions: int, users: int = 1,
+                          session_length: float = 600000,
+                          event_rate: float = 25,
+                          emotion_frequency: float = 10,
+                          url_churn: float = 2,
+                          seed: int = 0) -> Iterator[dict]:
+    """Generate synthetic interaction documents.
+
+    The documents of each user are generated in chronological order, one user
+    after the other.
+
+    Parameters
+    ----------
+    n_interactions : int
+        The total number of documents.
+    users : int, optional
+        The number of users. The documents are split evenly among them.
+    session_length : float, optional
+        The average length of a browsing session, in milliseconds.
+    event_rate : float, optional
+        The average number of events per second during a session.
+    emotion_frequency : float, optional
+        The number of times the emotions are sampled per second.
+    url_churn : float, optional
+        The average number of visited pages per minute.
+    seed : int, optional
+        The seed of the random generator.
+
+    Yields
+    ------
+    dict
+        A document, in the schema used by the extension.
+    """
+    rng = np.random.default_rng(seed)
+    urls = [url for url, __ in _pages(rng)]
+    # The websites are visited with a Zipf-like popularity
+    popularity = 1 / np.arange(1, len(urls) + 1)
+    popularity /= popularity.sum()
+    machine = rng.bytes(5)
+    counter = 0
+    for user in range(users):
+        size = n_interactions // users + (user < n_interactions % users)
+        user_id = f"{user:024x}"
+        logger.info("Generating %d interactions of user '%s'", size, user_id)
+
+        # Exponential gaps between the events and long pauses between sessions
+        gaps = rng.exponential(1000 / event_rate, size)
+        sessions = rng.random(size) < 1000 / event_rate / session_length
+        gaps[sessions] += rng.uniform(3600000, 86400000, sessions.sum())
+        timestamps = START_TIME + np.floor(np.cumsum(gaps)).astype(np.int64)
+        timestamps += user * 1000
+
+        # A new page is visited at the beginning of each session or randomly
+        navigations = sessions | (rng.random(size) <
+                                  url_churn / 60 / event_rate)
+        navigations[0] = True
+        pages = rng.choice(len(urls), navigations.sum(), p=popularity)
+        visited = pages[np.cumsum(navigations) - 1]
+
+        steps = rng.normal(0, 15, (size, 2)).round().astype(np.int64)
+        steps[rng.random(size) < 0.3] = 0
+        positions = np.abs(np.cumsum(steps, axis=0) +
+                           np.array(SCREEN_SIZE) // 2)
+        positions %= 2 * np.array(SCREEN_SIZE)
+        positions = np.minimum(positions, 2 * np.array(SCREEN_SIZE) -
+                               positions)
+
+        scrolling = rng.random(size) < 0.08
+        relative = np.where(scrolling, rng.choice([-100, -50, 50, 100], size),
+                            0)
+        absolute = np.maximum(np.cumsum(relative), 0)
+
+        buttons = rng.random((size, 4)) < [0.04, 0.005, 0.003, 0.001]
+        keys = rng.random((size, 4)) < [0.06, 0.02, 0.005, 0.01]
+
+        # The first event after each sample of the emotions carries it
+        period = 1000 / emotion_frequency
+        ticks = np.floor((timestamps - START_TIME) / period)
+        sampled = np.ones(size, dtype=np.bool_)
+        sampled[1:] = ticks[1:] != ticks[:-1]
+        emotions = _emotions(rng, int(sampled.sum())).round(4).tolist()
+        emotions_index = np.cumsum(sampled) - 1
+
+        for t, url, (x, y), scroll, delta, clicks, keyboard, has_emotions, \
+                frame in zip(timestamps.tolist(), visited.tolist(),
+                             positions.tolist(), absolute.tolist(),
+                             relative.tolist(), buttons.tolist(),
+                             keys.tolist(), sampled.tolist(),
+                             emotions_index.tolist()):
+            generation_time = (t // 1000).to_bytes(4, 'big')
+            document = {
+                '_id': ObjectId(generation_time + machine +
+                                (counter & 0xFFFFFF).to_bytes(3, 'big')),
+                'ui': user_id,
+                't': t,
+                'u': urls[url],
+                'm': {'p': [x, y],
+                      'b': {'l': clicks[0], 'r': clicks[1], 'm': clicks[2]}},
+                's': {'a': [0, scroll], 'r': [0, delta]},
+                'k': {'a': keyboard[0], 'n': keyboard[1], 'f': keyboard[2],
+                      's': keyboard[3]},
+            }
+            counter += 1
+            if clicks[3]:
+                document['m']['b']['b3'] = True
+            if has_emotions:
+                # The values that are exactly 0 are integers, as collected
+                document['e'] = {key: value if value else 0 for key, value in
+                                 zip(EMOTIONS_KEYS, emotions[frame])}
+            yield document
+
+
+class Cursor(list):
+    """The result of a query to a `Database`."""
+
+    def count(self) -> int:
+        return len(self)
+
+    def limit(self, __) -> 'Cursor':
+        return self
+
+
+class Collection(object):
+    """A collection of documents kept in memory."""
+    __slots__ = ["documents"]
+
+    def __init__(self, documents: List[dict]):
+        self.documents = documents
+
+    def find(self, query: Dict[str, Any] = None, **__) -> Cursor:
+        if query and 'ui' in query:
+            return Cursor(document for document in self.documents
+                          if document['ui'] == query['ui'])
+        return Cursor(self.documents)
+
+
+class Database(dict):
+    """A database holding the interactions in memory, which answers the
+    queries of `load_interactions` as MongoDB would."""
+
+    def __init__(self, documents: List[dict]):
+        super().__init__(interactions=Collection(documents))
+
+    def __bool__(self):
+        return True
@@ -0,0 +1,371 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module containing the array operations used by `ColumnarInteractions`.
+
+Each function works on whole columns at once and reproduces the results of the
+corresponding loop of :class:`analyzer.data.interaction.InteractionsList`.
+"""
+
+from typing import Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+
+Windows = Tuple[np.ndarray, np.ndarray, np.ndarray]
+"""The bounds of a set of ranges: the first indexes, the middle indexes and the
+indexes following the last ones."""
+
+MAX_MOVEMENT_TIME = 200
+"""The maximum time (in milliseconds) between two interactions for the mouse
+speed to be calculated."""
+WINDOW_BLOCK_SIZE = 1 << 15
+"""The maximum number of values of a column gathered at once by
+`window_statistics`."""
+
+
+def derive_motion(timestamps: np.ndarray, positions: np.ndarray,
+                  urls: np.ndarray) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Calculate the mouse speed, acceleration and trajectory slope.
+
+    The speed is calculated only between two interactions on the same URL that
+    are less than `MAX_MOVEMENT_TIME` milliseconds apart: otherwise, both the
+    speed and the acceleration are reset to 0. Interactions with the same
+    timestamp of the previous one copy its speed and acceleration.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        The sorted timestamps of the interactions.
+    positions : numpy.ndarray
+        The mouse positions, with shape (n, 2).
+    urls : numpy.ndarray
+        The codes of the URLs.
+
+    Returns
+    -------
+    speeds : numpy.ndarray
+        The total, horizontal and vertical speed, with shape (n, 3).
+    accelerations : numpy.ndarray
+        The total, horizontal and vertical acceleration, with shape (n, 3).
+    slopes : numpy.ndarray
+        The slope of the trajectory. It is NaN when the mouse did not move and
+        infinite when it moved vertically.
+    still : numpy.ndarray
+        Whether the speed and the acceleration were reset.
+    """
+    size = len(timestamps)
+    times = np.full(size, np.inf)
+    times[1:] = np.diff(timestamps)
+    moving = np.zeros(size, dtype=np.bool_)
+    moving[1:] = (urls[1:] == urls[:-1]) & (times[1:] < MAX_MOVEMENT_TIME)
+    duplicate = moving & (times == 0)
+    computed = np.flatnonzero(moving & ~duplicate)
+    # Interactions with the same timestamp (generated due to the sensibility of
+    # the JavaScript timestamps) take the values of the last interaction with
+    # a different timestamp
+    indexes = np.arange(size)
+    source = np.maximum.accumulate(np.where(duplicate, 0, indexes))
+
+    speeds = np.zeros((size, 3))
+    speeds[computed, 1:] = (positions[computed] - positions[computed - 1]) / \
+        times[computed, np.newaxis]
+    speeds = speeds[source]
+
+    accelerations = np.zeros((size, 3))
+    accelerations[computed, 1:] = \
+        (speeds[computed, 1:] - speeds[computed - 1, 1:]) / \
+        times[computed, np.newaxis]
+    accelerations = accelerations[source]
+
+    for values in (speeds, accelerations):
+        # float_power calls the same pow() used by Python's `**`, while `**`
+        # on arrays is computed as a multiplication, which rounds differently
+        values[:, 0] = np.sqrt(np.float_power(values[:, 1], 2) +
+                               np.float_power(values[:, 2], 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = speeds[:, 2] / speeds[:, 1]
+    slopes[speeds[:, 1] == 0] = np.inf
+    slopes[(speeds[:, 1] == 0) & (speeds[:, 2] == 0)] = np.nan
+
+    still = np.ones(size, dtype=np.bool_)
+    still[computed] = False
+    return speeds, accelerations, slopes, still[source]
+
+
+def locate_windows(timestamps: np.ndarray, middles: np.ndarray,
+                   width: float) -> Windows:
+    """Find the ranges of interactions around a set of interactions.
+
+    A range contains all the interactions whose timestamp is within
+    `width / 2` milliseconds from the timestamp of the middle interaction. As
+    in `InteractionsList`, a range never contains more than `width / 2`
+    interactions before and after the middle one.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        The sorted timestamps of the interactions.
+    middles : numpy.ndarray
+        The indexes of the middle interactions.
+    width : float
+        The width of the ranges, in milliseconds.
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        The index of the first interaction of each range.
+    middles : numpy.ndarray
+        The index of the middle interaction of each range.
+    ends : numpy.ndarray
+        The index following the last interaction of each range.
+    """
+    middles = np.asarray(middles, dtype=np.int64)
+    centers = timestamps[middles]
+    starts = np.searchsorted(timestamps, centers - width / 2, side='left')
+    ends = np.searchsorted(timestamps, centers + width / 2, side='right')
+    starts = np.maximum(starts, np.floor(middles - width / 2).astype(np.int64))
+    ends = np.minimum(ends, np.floor(middles + width / 2).astype(np.int64) + 1)
+    return starts, middles, ends
+
+
+def prefix_counts(flags: np.ndarray) -> np.ndarray:
+    """Get the cumulative counts of some columns of flags.
+
+    Parameters
+    ----------
+    flags : numpy.ndarray
+        The flags (equal to 0 or 1), with shape (n,) or (n, k).
+
+    Returns
+    -------
+    numpy.ndarray
+        An array with shape (n + 1,) or (n + 1, k), whose i-th row is the number
+        of flags set in the first i rows. The number of flags set in the slice
+        ``[start:end]`` is then ``counts[end] - counts[start]``.
+    """
+    counts = np.zeros((len(flags) + 1,) + flags.shape[1:], dtype=np.int64)
+    np.cumsum(flags, axis=0, out=counts[1:])
+    return counts
+
+
+def _sum_rows(matrix: np.ndarray) -> np.ndarray:
+    """Add the rows of a matrix one after the other."""
+    if matrix.shape[1] > 1:
+        return np.add.reduce(matrix, axis=0)
+    # A single column is contiguous, and numpy would sum it pairwise
+    return np.cumsum(matrix, axis=0)[-1]
+
+
+def _squares(deviations: np.ndarray, inside: np.ndarray) -> np.ndarray:
+    """Square the deviations inside the slices, as ``**`` does in Python.
+
+    ``x ** 2`` is calculated by Python with the ``pow`` of the C library,
+    which is not always rounded like ``x * x`` (the square of numpy).
+    """
+    squares = np.float_power(deviations, 2)
+    squares[~inside] = 0
+    return squares
+
+
+def _window_blocks(values: np.ndarray, starts: np.ndarray,
+                   ends: np.ndarray) -> \
+        Iterator[Tuple[np.ndarray, np.ndarray, Iterator[np.ndarray]]]:
+    """Gather a set of non-empty slices of some columns in padded blocks.
+
+    The slices are grouped by length, so that each block holds at most
+    `WINDOW_BLOCK_SIZE` values of a column (small enough to stay in the
+    cache). Outside its slice, each column of a block is 0.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The values, with shape (n, k).
+    starts, ends : numpy.ndarray
+        The bounds of the slices.
+
+    Yields
+    ------
+    numpy.ndarray
+        The indexes of the slices of the block.
+    numpy.ndarray
+        Whether each item of the block is inside its slice, with shape
+        (length of the longest slice, number of slices).
+    iterator [numpy.ndarray]
+        The values of each column in the block, with the same shape.
+    """
+    # The columns are followed by a zero, gathered outside the slices
+    columns = np.zeros((values.shape[1], len(values) + 1))
+    columns[:, :-1] = values.T
+    sizes = ends - starts
+    order = np.argsort(sizes, kind='stable')
+    first = 0
+    while first < len(order):
+        # The longest slice of the block bounds the number of its slices
+        last = min(first + WINDOW_BLOCK_SIZE // max(sizes[order[first]], 1),
+                   len(order))
+        last = min(first + max(WINDOW_BLOCK_SIZE //
+                               max(sizes[order[last - 1]], 1), 1),
+                   len(order))
+        block = order[first:last]
+        offsets = np.arange(sizes[block[-1]])[:, np.newaxis]
+        inside = offsets < sizes[block]
+        indexes = np.where(inside, starts[block] + offsets, len(values))
+        yield block, inside, (column.take(indexes) for column in columns)
+        first = last
+
+
+def window_statistics(values: np.ndarray, starts: np.ndarray,
+                      ends: np.ndarray) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Calculate the sums, the means and the population variances of a set of
+    non-empty slices.
+
+    As in `InteractionsList`, each slice is summed value by value and the
+    variance is the mean of the squared deviations from the mean of the
+    slice, so that no error builds up along the values and the results are
+    the same of its loops. The slices are gathered in padded blocks, whose
+    rows are summed one after the other.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The values, with shape (n,) or (n, k).
+    starts, ends : numpy.ndarray
+        The bounds of the slices.
+
+    Returns
+    -------
+    sums : numpy.ndarray
+        The sum of each column in each slice, with shape (m, k).
+    means : numpy.ndarray
+        The mean of each column in each slice, with shape (m, k).
+    variances : numpy.ndarray
+        The variance of each column in each slice, with shape (m, k).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    sizes = np.asarray(ends) - np.asarray(starts)
+    sums = np.zeros((values.shape[1], len(sizes)))
+    variances = np.zeros_like(sums)
+    for block, inside, columns in _window_blocks(values, np.asarray(starts),
+                                                 np.asarray(ends)):
+        for i, gathered in enumerate(columns):
+            # The rows are added in order, like the items of a list by sum();
+            # the sum starts from 0, so that a sum of negative zeros is 0
+            sums[i, block] = _sum_rows(gathered) + 0.0
+            squares = _squares(gathered - sums[i, block] / sizes[block],
+                               inside)
+            variances[i, block] = _sum_rows(squares) / sizes[block]
+    return sums.T, sums.T / sizes[:, np.newaxis], variances.T
+
+
+def window_deviations(values: np.ndarray, starts: np.ndarray,
+                      ends: np.ndarray, centres: np.ndarray) -> np.ndarray:
+    """Calculate the mean squared deviations of a set of non-empty slices
+    from a value of each slice.
+
+    The squared deviations are summed value by value, as in
+    `window_statistics`.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The values, with shape (n,).
+    starts, ends : numpy.ndarray
+        The bounds of the slices.
+    centres : numpy.ndarray
+        The value each slice deviates from.
+
+    Returns
+    -------
+    numpy.ndarray
+        The mean squared deviation of each slice.
+    """
+    values = np.asarray(values, dtype=np.float64)[:, np.newaxis]
+    sizes = np.asarray(ends) - np.asarray(starts)
+    deviations = np.zeros(len(sizes))
+    for block, inside, columns in _window_blocks(values, np.asarray(starts),
+                                                 np.asarray(ends)):
+        squares = _squares(next(columns) - centres[block], inside)
+        deviations[block] = _sum_rows(squares) / sizes[block]
+    return deviations
+
+
+def locate_nested_windows(timestamps: np.ndarray, middles: np.ndarray,
+                          widths: Sequence[float]) -> Dict[float, Windows]:
+    """Find the ranges of interactions of several widths at once.
+
+    This is equivalent to calling `locate_windows` for each width, but the
+    timestamps are searched only once for all the widths.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        The sorted timestamps of the interactions.
+    middles : numpy.ndarray
+        The indexes of the middle interactions.
+    widths : list [float]
+        The widths of the ranges, in milliseconds.
+
+    Returns
+    -------
+    dict [float, (numpy.ndarray, numpy.ndarray, numpy.ndarray)]
+        The first indexes, the middle indexes and the indexes following the
+        last ones of the ranges of each width.
+    """
+    middles = np.asarray(middles, dtype=np.int64)
+    halves = np.asarray(widths, dtype=np.float64)[:, np.newaxis] / 2
+    centers = timestamps[middles]
+    starts = np.searchsorted(timestamps, (centers - halves).ravel(),
+                             side='left').reshape(len(widths), -1)
+    ends = np.searchsorted(timestamps, (centers + halves).ravel(),
+                           side='right').reshape(len(widths), -1)
+    starts = np.maximum(starts, np.floor(middles - halves).astype(np.int64))
+    ends = np.minimum(ends, np.floor(middles + halves).astype(np.int64) + 1)
+    return {width: (starts[i], middles, ends[i])
+            for i, width in enumerate(widths)}
+
+
+def changed_rows(*columns: np.ndarray) -> np.ndarray:
+    """Check which rows differ from the previous one.
+
+    Missing values (NaN) are considered equal to each other.
+
+    Parameters
+    ----------
+    *columns : numpy.ndarray
+        The columns to be compared, with shape (n,) or (n, k).
+
+    Returns
+    -------
+    numpy.ndarray
+        A boolean array, whose i-th element tells whether the row i differs
+        from the row i - 1 in at least one column. The first row is never
+        changed.
+    """
+    changed = np.zeros(len(columns[0]), dtype=np.bool_)
+    for column in columns:
+        new, old = column[1:], column[:-1]
+        different = new != old
+        if column.dtype.kind == 'f':
+            different &= ~(np.isnan(new) & np.isnan(old))
+        changed[1:] |= different.any(axis=1) if different.ndim > 1 \
+            else different
+    return changed
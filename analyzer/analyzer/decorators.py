@@ -20,10 +20,19 @@ import logging
 import functools
 from typing import Tuple, Any, Callable, TypeVar
 
+from .metrics import METRICS
+
 T = TypeVar('T')
 
 
-def timed(message: str = 'Completed after %.3fs') -> Callable[[Callable[..., T]], Callable[..., Tuple[T, float]]]:
+def timed(message: str = 'Completed after %.3fs', stage: str = None,
+          **labels: Any) \
+        -> Callable[[Callable[..., T]], Callable[..., Tuple[T, float]]]:
+    """Log the time taken by a function and return it with the result.
+
+    If `stage` is given, the time is also recorded in `METRICS`, with the
+    given labels.
+    """
     def inner_function(f: Callable[..., T]) -> Callable[..., Tuple[T, float]]:
         @functools.wraps(f)
         def wrapper(*args, **kwargs) -> Tuple[T, float]:
@@ -31,6 +40,8 @@ def timed(message: str = 'Completed after %.3fs') -> Callable[[Callable[..., T]]
             result = f(*args, **kwargs)
             end_time = time.time()
             logging.getLogger(f.__module__).info(message, end_time - start_time)
+            if stage is not None:
+                METRICS.timer(stage, end_time - start_time, **labels)
             return result, end_time - start_time
 
         return wrapper
@@ -0,0 +1,282 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to check that the engines produce the same aggregate data.
+
+The object-based engine (`InteractionsList`) is the reference: any other
+engine must reproduce what it writes to ``aggregate.csv``, quirks included
+(e.g. the ``std`` columns holding variances, the positions compared by
+identity when counting the mouse movements and the sample deviation of the
+event times). The reference and the engine under test are run side by side on
+the interactions of the same user and every column of their ``aggregate.csv``
+is compared: the numbers within a tolerance, any other value exactly. In the
+exact mode, every value must be written identically, as the engines are
+expected to do. The first mismatch is reported with the frame (the middle
+interaction) and the feature it was found in.
+"""
+
+import csv
+import logging
+import math
+import os
+import tempfile
+from itertools import zip_longest
+from typing import Optional, List, Dict
+
+from pymongo import database as db
+
+from . import utilities
+from .data import Website
+from .decorators import timed
+from .process import _load_user, _prune_user, _compute_intervals
+
+logger = logging.getLogger(__name__)
+
+TOLERANCE = 1e-9
+"""The default relative (and absolute) tolerance on the numbers."""
+
+
+class Mismatch(object):
+    """The first difference between two aggregate files.
+
+    Attributes
+    ----------
+    row : int
+        The number of the row (1 is the first one after the header, 0 the
+        header itself).
+    frame : str, optional
+        The ID of the middle interaction of the row.
+    timestamp : str, optional
+        The timestamp of the middle interaction of the row.
+    feature : str, optional
+        The name of the column. If None, the row is missing from one of the
+        files and the values are the frames of the rows.
+    expected : str, optional
+        The value written by the reference engine.
+    actual : str, optional
+        The value written by the engine under test.
+    """
+    __slots__ = ["row", "frame", "timestamp", "feature", "expected", "actual"]
+
+    def __init__(self, row: int, frame: Optional[str] = None,
+                 timestamp: Optional[str] = None,
+                 feature: Optional[str] = None,
+                 expected: Optional[str] = None,
+                 actual: Optional[str] = None):
+        self.row: int = row
+        self.frame: Optional[str] = frame
+        self.timestamp: Optional[str] = timestamp
+        self.feature: Optional[str] = feature
+        self.expected: Optional[str] = expected
+        self.actual: Optional[str] = actual
+
+    def __str__(self):
+        if self.feature is None:
+            return f"row {self.row}: expected frame {self.expected}, got " \
+                   f"frame {self.actual}"
+        if self.row == 0:
+            return f"column {self.feature!r} of the header: expected " \
+                   f"{self.expected!r}, got {self.actual!r}"
+        return f"row {self.row} (frame {self.frame}, timestamp " \
+               f"{self.timestamp}), feature {self.feature!r}: expected " \
+               f"{self.expected!r}, got {self.actual!r}"
+
+
+def values_match(expected: str, actual: str,
+                 tolerance: float = TOLERANCE, exact: bool = False) -> bool:
+    """Check whether two values of a CSV file are equivalent.
+
+    Parameters
+    ----------
+    expected : str
+        The value written by the reference engine.
+    actual : str
+        The value written by the engine under test.
+    tolerance : float, optional
+        The relative and absolute tolerance on the numbers. The values that
+        are not numbers must be equal.
+    exact : bool, optional
+        Whether or not the numbers must be written identically too (e.g. 0
+        does not match 0.0). If True, the tolerance is ignored.
+
+    Returns
+    -------
+    bool
+        Whether the values match.
+    """
+    if expected == actual:
+        return True
+    if exact:
+        return False
+    try:
+        expected_number, actual_number = float(expected), float(actual)
+    except ValueError:
+        return False
+    if math.isnan(expected_number) or math.isnan(actual_number):
+        return math.isnan(expected_number) and math.isnan(actual_number)
+    return math.isclose(expected_number, actual_number, rel_tol=tolerance,
+                        abs_tol=tolerance)
+
+
+def compare_aggregates(expected_path: str, actual_path: str,
+                       tolerance: float = TOLERANCE,
+                       exact: bool = False) -> Optional[Mismatch]:
+    """Compare two aggregate files, column by column.
+
+    Parameters
+    ----------
+    expected_path : str
+        The file written by the reference engine.
+    actual_path : str
+        The file written by the engine under test.
+    tolerance : float, optional
+        The relative and absolute tolerance on the numbers.
+    exact : bool, optional
+        Whether or not the numbers must be written identically too.
+
+    Returns
+    -------
+    Mismatch, optional
+        The first difference, or None if the files are equivalent.
+    """
+    with open(expected_path, encoding='utf-8', newline='') as expected_file, \
+            open(actual_path, encoding='utf-8', newline='') as actual_file:
+        expected_rows, actual_rows = csv.reader(expected_file), \
+            csv.reader(actual_file)
+        header: List[str] = next(expected_rows, [])
+        actual_header: List[str] = next(actual_rows, [])
+        for expected, actual in zip_longest(header, actual_header):
+            if expected != actual:
+                return Mismatch(0, feature=expected or actual,
+                                expected=expected, actual=actual)
+        columns: Dict[str, int] = {name: i for i, name in enumerate(header)}
+        frame_column = columns.get('middle.id')
+        time_column = columns.get('middle.timestamp')
+        for row, (expected, actual) in enumerate(
+                zip_longest(expected_rows, actual_rows), 1):
+            reference = expected or actual
+            frame = reference[frame_column] if frame_column is not None \
+                else None
+            timestamp = reference[time_column] if time_column is not None \
+                else None
+            if expected is None or actual is None:
+                # A row is missing: the values are the frames of the rows
+                return Mismatch(row, frame, timestamp,
+                                expected=expected and frame,
+                                actual=actual and frame)
+            for feature, expected_value, actual_value in zip(header, expected,
+                                                             actual):
+                if not values_match(expected_value, actual_value, tolerance,
+                                    exact):
+                    return Mismatch(row, frame, timestamp, feature,
+                                    expected_value, actual_value)
+    return None
+
+
+@timed("Compared the engines in %.3fs", stage='compare')
+def compare_user(user: str, websites: Dict[str, Website], db: db.Database,
+                 tolerance: float = TOLERANCE, exact: bool = False,
+                 enable_gc: bool = True, enable_columnar: bool = True,
+                 enable_multiprocessing: bool = False,
+                 enable_streaming: bool = False,
+                 cache_dir: str = None,
+                 chunks: int = 0,
+                 enable_pruning: bool = False) -> Optional[Mismatch]:
+    """Compare the aggregate data of a user computed by the reference engine
+    and by another engine.
+
+    The interactions are loaded once for each engine and the two aggregate
+    files are written to a temporary directory: the one of the reference
+    engine by the original writer (`aggregate_data_to_list` and `to_csv`),
+    the other one by `aggregate_to_csv`.
+
+    Parameters
+    ----------
+    user : str
+        The ID of the user.
+    websites : dict [str, Website]
+        The websites.
+    db : pymongo.database.Database
+        An instance of a MongoDB database to get the data. If None, the REST
+        APIs will be used.
+    tolerance : float, optional
+        The relative and absolute tolerance on the numbers.
+    exact : bool, optional
+        Whether or not the numbers must be written identically too.
+    enable_gc : bool, optional
+        Whether or not to explicitly run the garbage collector.
+    enable_columnar : bool, optional
+        Whether or not the engine under test stores the interactions column
+        by column.
+    enable_multiprocessing : bool, optional
+        Whether or not the engine under test analyzes the widths in parallel.
+    enable_streaming : bool, optional
+        Whether or not the engine under test streams the interactions from
+        the database.
+    cache_dir : str, optional
+        The cache of the interactions used by the engine under test.
+    chunks : int, optional
+        If greater than 1, the number of chunks of the timeline processed in
+        parallel by the engine under test.
+    enable_pruning : bool, optional
+        Whether or not the engine under test calculates the ranges only on
+        the interactions close to the emotion frames.
+
+    Returns
+    -------
+    Mismatch, optional
+        The first difference, or None if the engine matches the reference.
+    float
+        The time the execution took. Returned by the `@timed` decorator.
+    """
+    engines = {
+        'reference': dict(enable_columnar=False),
+        'engine': dict(enable_columnar=enable_columnar,
+                       enable_streaming=enable_streaming,
+                       enable_multiprocessing=enable_multiprocessing,
+                       cache_dir=cache_dir, chunks=chunks,
+                       enable_pruning=enable_pruning),
+    }
+    with tempfile.TemporaryDirectory(prefix='analyzer-') as directory:
+        for name, options in engines.items():
+            # No file is written if there are no ranges
+            open(os.path.join(directory, f'{name}.csv'), 'w').close()
+            logger.info("Computing the aggregate data of user '%s' with the "
+                        "%s engine", user, name)
+            multiprocessing = options.pop('enable_multiprocessing', False)
+            n_chunks = options.pop('chunks', 0)
+            pruning = options.pop('enable_pruning', False)
+            interactions = _load_user(user, websites, db, enable_gc=enable_gc,
+                                      **options)
+            if not interactions:
+                logger.warning("No interactions from the user")
+                return None
+            if pruning:
+                interactions, __ = _prune_user(interactions)
+            intervals = _compute_intervals(
+                interactions, enable_gc=enable_gc,
+                enable_multiprocessing=multiprocessing, chunks=n_chunks)
+            if name == 'reference':
+                utilities.to_csv(utilities.aggregate_data_to_list(
+                    intervals, interactions), directory, f'{name}.csv')
+            else:
+                utilities.aggregate_to_csv(intervals, interactions, directory,
+                                           f'{name}.csv')
+            del interactions, intervals
+        return compare_aggregates(os.path.join(directory, 'reference.csv'),
+                                  os.path.join(directory, 'engine.csv'),
+                                  tolerance, exact)
@@ -0,0 +1,257 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module to keep track of the users processed by a run.
+
+The manifest is a JSON file in the output directory, recording for each user
+its status, the number of interactions it was computed from (the high-water
+mark of the input), the options of the run that change its results, the size
+and checksum of each output file and the time it took. An interrupted run can
+then be resumed, skipping the users whose results are complete and up to
+date.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+"""The name of the manifest in the output directory."""
+MANIFEST_VERSION = 1
+
+RUNNING, DONE, FAILED = 'running', 'done', 'failed'
+"""The status of a user."""
+
+
+def checksum(path: str) -> str:
+    """Get the SHA-256 checksum of a file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def run_options(sample_fraction: Optional[float] = None, seed: int = 0,
+                enable_stratification: bool = False,
+                enable_pruning: bool = False) -> Dict[str, Any]:
+    """Get the options of a run that change the results of its users.
+
+    Parameters
+    ----------
+    sample_fraction : float, optional
+        The fraction of the emotion frames whose ranges are calculated, if
+        they are sampled.
+    seed : int, optional
+        The seed of the sampling.
+    enable_stratification : bool, optional
+        Whether or not the emotion frames are sampled by stratification.
+    enable_pruning : bool, optional
+        Whether or not the interactions far from the emotion frames are
+        pruned.
+
+    Returns
+    -------
+    dict [str, any]
+        The options, as recorded in the manifest.
+    """
+    return {'sample_fraction': sample_fraction, 'seed': seed,
+            'stratified': enable_stratification, 'pruning': enable_pruning}
+
+
+class Manifest(object):
+    """The status of the users of the runs writing to an output directory.
+
+    Every change is immediately saved to disk (atomically), so that the
+    manifest is up to date even if the run is killed. The methods can be
+    called from several threads.
+
+    Attributes
+    ----------
+    out_dir : str
+        The output directory.
+    users : dict [str, dict [str, any]]
+        The entry of each user.
+    """
+    __slots__ = ["out_dir", "users", "_lock"]
+
+    def __init__(self, out_dir: str):
+        """Load the manifest of an output directory, if it exists.
+
+        Parameters
+        ----------
+        out_dir : str
+            The output directory.
+        """
+        self.out_dir: str = out_dir
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        path = os.path.join(out_dir, MANIFEST_NAME)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    self.users = json.load(file)['users']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring the manifest ('%s'): %s", path, e)
+
+    def save(self) -> None:
+        """Write the manifest to the output directory."""
+        path = os.path.join(self.out_dir, MANIFEST_NAME)
+        os.makedirs(self.out_dir, exist_ok=True)
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': MANIFEST_VERSION, 'users': self.users},
+                      file, indent=2)
+        os.replace(temporary_path, path)
+
+    def _update(self, user: str, options: Optional[Dict[str, Any]],
+                **entry: Any) -> None:
+        entry['options'] = options or {}
+        entry['updated'] = datetime.datetime.now().isoformat()
+        with self._lock:
+            self.users[user] = entry
+            self.save()
+
+    def start(self, user: str, interactions: Optional[int],
+              output_format: str,
+              options: Optional[Dict[str, Any]] = None) -> None:
+        """Record that a user is being processed.
+
+        Parameters
+        ----------
+        user : str
+            The ID of the user.
+        interactions : int, optional
+            The number of interactions of the user, if known.
+        output_format : str
+            The format of the output files.
+        options : dict [str, any], optional
+            The options of the run, as returned by `run_options`.
+        """
+        self._update(user, options, status=RUNNING, interactions=interactions,
+                     format=output_format)
+
+    def complete(self, user: str, interactions: Optional[int],
+                 output_format: str, elapsed: float,
+                 options: Optional[Dict[str, Any]] = None) -> None:
+        """Record that a user was processed, with its output files.
+
+        Parameters
+        ----------
+        user : str
+            The ID of the user.
+        interactions : int, optional
+            The number of interactions of the user, if known.
+        output_format : str
+            The format of the output files.
+        elapsed : float
+            The time spent on the user, in seconds.
+        options : dict [str, any], optional
+            The options of the run, as returned by `run_options`.
+        """
+        outputs = {}
+        user_dir = os.path.join(self.out_dir, user)
+        if os.path.isdir(user_dir):
+            for name in sorted(os.listdir(user_dir)):
+                path = os.path.join(user_dir, name)
+                outputs[name] = {'size': os.path.getsize(path),
+                                 'sha256': checksum(path)}
+        self._update(user, options, status=DONE, interactions=interactions,
+                     format=output_format, time=elapsed, outputs=outputs)
+
+    def fail(self, user: str, interactions: Optional[int],
+             output_format: str, error: BaseException,
+             options: Optional[Dict[str, Any]] = None) -> None:
+        """Record that the processing of a user failed.
+
+        Parameters
+        ----------
+        user : str
+            The ID of the user.
+        interactions : int, optional
+            The number of interactions of the user, if known.
+        output_format : str
+            The format of the output files.
+        error : BaseException
+            The error that stopped the processing.
+        options : dict [str, any], optional
+            The options of the run, as returned by `run_options`.
+        """
+        self._update(user, options, status=FAILED, interactions=interactions,
+                     format=output_format, error=repr(error))
+
+    def is_done(self, user: str, interactions: Optional[int],
+                output_format: str,
+                options: Optional[Dict[str, Any]] = None) -> bool:
+        """Check whether the results of a user are complete and up to date.
+
+        A user is stale (and must be processed again) if it was computed from
+        a different number of interactions, in a different format, with
+        different options, or if any of its output files was changed or
+        removed.
+
+        Parameters
+        ----------
+        user : str
+            The ID of the user.
+        interactions : int, optional
+            The current number of interactions of the user, if known.
+        output_format : str
+            The format of the output files.
+        options : dict [str, any], optional
+            The options of the run, as returned by `run_options`.
+
+        Returns
+        -------
+        bool
+            Whether the user can be skipped.
+        """
+        entry = self.users.get(user)
+        if entry is None or entry['status'] != DONE:
+            return False
+        if entry['format'] != output_format or \
+                entry.get('options', {}) != (options or {}) or \
+                interactions is not None and \
+                entry['interactions'] != interactions:
+            logger.info("User '%s' is stale", user)
+            return False
+        user_dir = os.path.join(self.out_dir, user)
+        for name, output in entry['outputs'].items():
+            path = os.path.join(user_dir, name)
+            if not os.path.exists(path) or \
+                    os.path.getsize(path) != output['size'] or \
+                    checksum(path) != output['sha256']:
+                logger.info("Output '%s' of user '%s' changed", name, user)
+                return False
+        return True
@@ -0,0 +1,280 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A module collecting the metrics of a run.
+
+The stages timed with `analyzer.decorators.timed`, the counters (documents,
+emotion frames, ranges) and the memory usage are recorded as samples, each one
+labelled with the user (and the width) it refers to. At the end of the run,
+the samples are written to ``metrics.json`` and to a Prometheus textfile
+(``metrics.prom``), which can be collected by the textfile collector of the
+node exporter.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from typing import Dict, List, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIMER, COUNTER, GAUGE = 'timer', 'counter', 'gauge'
+"""The types of the samples."""
+
+Sample = Dict[str, Any]
+"""A sample: its type, name, labels and value."""
+
+_labels: contextvars.ContextVar = contextvars.ContextVar('labels', default={})
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+class Metrics(object):
+    """A registry of samples.
+
+    The labels set with `labels` are added to every sample recorded in the
+    same thread (or task), until the end of the ``with`` statement.
+
+    Attributes
+    ----------
+    samples : list [dict [str, any]]
+        The recorded samples.
+    """
+    __slots__ = ["samples", "_lock"]
+
+    def __init__(self):
+        self.samples: List[Sample] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def labels(self, **labels: Any) -> Iterator[None]:
+        """Add some labels to the samples recorded inside a ``with`` block.
+
+        Parameters
+        ----------
+        labels : any
+            The labels (e.g. the user and the width).
+        """
+        token = _labels.set({**_labels.get(), **labels})
+        try:
+            yield
+        finally:
+            _labels.reset(token)
+
+    def _record(self, kind: str, name: str, value: float,
+                labels: Dict[str, Any]) -> None:
+        labels = {key: str(label) for key, label in
+                  {**_labels.get(), **labels}.items()}
+        with self._lock:
+            self.samples.append({'type': kind, 'name': name,
+                                 'labels': labels, 'value': value})
+
+    def timer(self, stage: str, seconds: float, **labels: Any) -> None:
+        """Record the time spent in a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage (e.g. 'load').
+        seconds : float
+            The elapsed time.
+        labels : any
+            Additional labels.
+        """
+        self._record(TIMER, stage, seconds, labels)
+
+    def count(self, name: str, value: int, **labels: Any) -> None:
+        """Record a number of objects.
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter (e.g. 'documents').
+        value : int
+            The number of objects.
+        labels : any
+            Additional labels.
+        """
+        self._record(COUNTER, name, value, labels)
+
+    def gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Record a measure.
+
+        Parameters
+        ----------
+        name : str
+            The name of the gauge (e.g. 'peak_rss_bytes').
+        value : float
+            The measured value.
+        labels : any
+            Additional labels.
+        """
+        self._record(GAUGE, name, value, labels)
+
+    def memory(self, **labels: Any) -> None:
+        """Record the peak memory usage of the process.
+
+        The peak resident set size is always recorded. If `tracemalloc` is
+        tracing, the peak of the traced memory since the last call is
+        recorded too.
+
+        Parameters
+        ----------
+        labels : any
+            Additional labels.
+        """
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        if sys.platform != 'darwin':
+            peak_rss *= 1024
+        self.gauge('peak_rss_bytes', peak_rss, **labels)
+        if tracemalloc.is_tracing():
+            __, peak = tracemalloc.get_traced_memory()
+            self.gauge('traced_peak_bytes', peak, **labels)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+    def drain(self) -> List[Sample]:
+        """Remove all the samples from the registry.
+
+        Returns
+        -------
+        list [dict [str, any]]
+            The removed samples.
+        """
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+    def extend(self, samples: List[Sample]) -> None:
+        """Add the samples recorded by another registry (e.g. in a worker).
+
+        Parameters
+        ----------
+        samples : list [dict [str, any]]
+            The samples.
+        """
+        with self._lock:
+            self.samples.extend(samples)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Summarize the timers of each stage.
+
+        Returns
+        -------
+        dict [str, dict [str, float]]
+            The number of samples, the total, the mean, the minimum and the
+            maximum time of each stage.
+        """
+        stages: Dict[str, List[float]] = {}
+        for sample in self.samples:
+            if sample['type'] == TIMER:
+                stages.setdefault(sample['name'], []).append(sample['value'])
+        return {stage: {'count': len(values), 'sum': sum(values),
+                        'mean': sum(values) / len(values),
+                        'min': min(values), 'max': max(values)}
+                for stage, values in stages.items()}
+
+    def _series(self) -> Dict[Tuple[str, str, Tuple], float]:
+        # The samples with the same type, name and labels are merged: the
+        # timers and the counters are summed, the gauges take the maximum
+        series: Dict[Tuple[str, str, Tuple], float] = {}
+        for sample in self.samples:
+            key = (sample['type'], sample['name'],
+                   tuple(sorted(sample['labels'].items())))
+            if sample['type'] == GAUGE:
+                series[key] = max(series.get(key, sample['value']),
+                                  sample['value'])
+            else:
+                series[key] = series.get(key, 0) + sample['value']
+        return series
+
+    def to_prometheus(self) -> str:
+        """Format the samples in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The content of the textfile.
+        """
+        lines = []
+        series = self._series()
+        timer_counts: Dict[Tuple, int] = {}
+        for sample in self.samples:
+            if sample['type'] == TIMER:
+                labels = tuple(sorted({'stage': sample['name'],
+                                       **sample['labels']}.items()))
+                timer_counts[labels] = timer_counts.get(labels, 0) + 1
+        declared = set()
+        for (kind, name, labels), value in sorted(series.items()):
+            if kind == TIMER:
+                metric = 'analyzer_stage_seconds'
+                labels = tuple(sorted({'stage': name, **dict(labels)}.items()))
+                header = ('summary', 'The time spent in each stage.')
+            elif kind == COUNTER:
+                metric = f'analyzer_{name}_total'
+                header = ('counter',
+                          f"The number of {name.replace('_', ' ')}.")
+            else:
+                metric = f'analyzer_{name}'
+                header = ('gauge', f"The {name.replace('_', ' ')}.")
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f'# HELP {metric} {header[1]}')
+                lines.append(f'# TYPE {metric} {header[0]}')
+            text = ','.join(f'{key}="{_escape(label)}"'
+                            for key, label in labels)
+            if kind == TIMER:
+                lines.append(f'{metric}_sum{{{text}}} {value!r}')
+                lines.append(f'{metric}_count{{{text}}} '
+                             f'{timer_counts[labels]}')
+            else:
+                lines.append(f'{metric}{{{text}}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, out_dir: str) -> None:
+        """Write ``metrics.json`` and ``metrics.prom`` to a directory.
+
+        Parameters
+        ----------
+        out_dir : str
+            The output directory.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, 'metrics.json'), 'w',
+                  encoding='utf-8') as file:
+            json.dump({'summary': self.summary(), 'samples': self.samples},
+                      file, indent=2)
+        # The textfile collector must never read a partial file
+        path = os.path.join(out_dir, 'metrics.prom')
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+        os.replace(path + '.tmp', path)
+        logger.info("Saved %d metrics samples", len(self.samples))
+
+
+METRICS = Metrics()
+"""The registry of the current process."""
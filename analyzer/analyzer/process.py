@@ -17,27 +17,114 @@
 
 import gc
 import logging
+import multiprocessing
 import os
-from typing import Dict
+import queue
+import threading
+import time
+import tracemalloc
+import zlib
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
 
+import pymongo
 import pymongo.database as db
 
 from . import utilities
 from .data import *
+from .data.columnar import ColumnarInteractions
+from .data.interaction import InteractionsList
+from .data.interval import IntervalData, IntervalStore
+from .data.shared import SharedInteractions, process_shared_intervals
 from .decorators import timed
+from .manifest import Manifest, run_options
+from .metrics import METRICS
 
 
-@timed("User done in %.3fs")
+RANGES_WIDTHS = [
+    # t = 100 ms is the time between two captured emotions
+    25,  # 1/4 * t
+    50,  # 1/2 * t
+    100,  # 1 * t
+    200,  # 2 * t
+    500,  # 5 * t
+    1000,  # 10 * t
+    2000  # 20 * t
+]
+"""The widths of the ranges, in milliseconds."""
+
+Intervals = Dict[float, Mapping[int, IntervalData]]
+
+
+@timed("User done in %.3fs", stage='user')
 def process_user(user: str, websites: Dict[str, Website], db: db.Database,
                  index: int = 1,
                  total_users: int = 1, out_dir: str = 'out',
                  enable_gc: bool = True,
-                 enable_multiprocessing: bool = False) -> None:
-    """
+                 enable_multiprocessing: bool = False,
+                 enable_columnar: bool = False,
+                 enable_streaming: bool = False,
+                 cache_dir: str = None,
+                 interactions: ColumnarInteractions = None,
+                 output_format: str = 'csv', chunks: int = 0,
+                 enable_pruning: bool = False,
+                 sample_fraction: float = None,
+                 enable_stratification: bool = False, seed: int = 0) -> None:
+    """Process the interactions of a user.
+
+    The interactions are loaded (unless they are given), categorized and
+    saved; then the data of the ranges of all the widths is calculated and
+    saved as the aggregate data of the user.
+
+    Parameters
+    ----------
+    user : str
+        The ID of the user.
+    websites : dict [str, Website]
+        The websites, used to categorize the interactions.
+    db : pymongo.database.Database
+        An instance of a MongoDB database to get the data. If None, the REST
+        APIs will be used.
+    index : int, optional
+        The position of the user among the processed ones, used in the logs.
+    total_users : int, optional
+        The total number of users, used in the logs.
+    out_dir : str, optional
+        The output directory.
+    enable_gc : bool, optional
+        Whether or not to enable the explicit calls to the garbage collection.
+    enable_multiprocessing : bool, optional
+        Whether or not to calculate the widths in parallel.
+    enable_columnar : bool, optional
+        Whether or not to store the interactions column by column.
+    enable_streaming : bool, optional
+        Whether or not to stream the interactions from the database.
+    cache_dir : str, optional
+        The directory where the interactions of each user are cached.
+    interactions : ColumnarInteractions, optional
+        The interactions of the user, if they are already loaded.
+    output_format : "csv", "parquet", "npy", optional
+        The format of the files of the interactions and of the aggregate data.
+    chunks : int, optional
+        If greater than 1, the number of chunks of the timeline calculated in
+        parallel.
+    enable_pruning : bool, optional
+        Whether or not to calculate the ranges only on the interactions close
+        to the emotion frames. The interactions are saved in full.
+    sample_fraction : float, optional
+        If set, the fraction of the emotion frames whose ranges are
+        calculated.
+    enable_stratification : bool, optional
+        Whether or not to sample the same number of emotion frames for each
+        discretized value of each emotion.
+    seed : int, optional
+        The seed of the sampling.
 
     Returns
     -------
-    object
+    None
+        Nothing: the results are written to the output directory.
+    float
+        The time the execution took. Returned by the `@timed` decorator.
     """
     logger = logging.getLogger(__name__)
     if enable_gc:
@@ -47,42 +134,542 @@ def process_user(user: str, websites: Dict[str, Website], db: db.Database,
     logger.info("Processing data by user '%s' (%d of %d)", str(user), index,
                 total_users)
 
-    interactions, __ = load_interactions(mongodb=db, user=user,
-                                         enable_gc=enable_gc)
+    interactions = _load_user(user, websites, db, enable_gc=enable_gc,
+                              enable_columnar=enable_columnar,
+                              enable_streaming=enable_streaming,
+                              cache_dir=cache_dir, interactions=interactions)
     if not interactions:
         logger.warning("No interactions from the user")
         return
-    interactions.set_website_categories(websites)
 
-    interactions.to_csv(out_dir, user, 'interactions.csv')
+    _save_interactions(interactions, out_dir, user, output_format)
+    if sample_fraction is not None:
+        _sample_user(user, interactions, sample_fraction,
+                     enable_stratification=enable_stratification, seed=seed)
+    if enable_pruning:
+        interactions, __ = _prune_user(interactions)
+
+    intervals = _compute_intervals(
+        interactions, enable_gc=enable_gc,
+        enable_multiprocessing=enable_multiprocessing, chunks=chunks)
+
+    _save_aggregate(interactions, intervals, out_dir, user, output_format)
+    METRICS.memory()
+
+
+def _load_user(user: str, websites: Dict[str, Website], db: db.Database,
+               enable_gc: bool = True, enable_columnar: bool = False,
+               enable_streaming: bool = False, cache_dir: str = None,
+               interactions: ColumnarInteractions = None) -> \
+        Union[InteractionsList, ColumnarInteractions]:
+    """Load the interactions of a user (if needed) and set their categories.
+    """
+    if interactions is None:
+        interactions, __ = load_interactions(mongodb=db, user=user,
+                                             enable_gc=enable_gc,
+                                             columnar=enable_columnar,
+                                             streaming=enable_streaming,
+                                             cache_dir=cache_dir)
+    if interactions:
+        interactions.set_website_categories(websites)
+    METRICS.count('documents', len(interactions) if interactions else 0)
+    return interactions
+
+
+def _sample_user(user: str, interactions: Union[InteractionsList,
+                                                ColumnarInteractions],
+                 fraction: float, enable_stratification: bool = False,
+                 seed: int = 0) -> None:
+    """Select the emotion frames of a user whose ranges are calculated.
+
+    The random generator of each user is seeded with both `seed` and the ID
+    of the user, so that the selection does not depend on the order in which
+    the users are processed. Only the interactions stored column by column
+    can be sampled.
+    """
+    if not isinstance(interactions, ColumnarInteractions):
+        return
+    interactions.sample(fraction, seed=[seed, zlib.crc32(user.encode())],
+                        stratified=enable_stratification)
+    METRICS.count('sampled_frames', len(interactions.frames))
+
+
+@timed("Pruned the interactions in %.3fs", stage='prune')
+def _prune_user(interactions: Union[InteractionsList, ColumnarInteractions]) \
+        -> Union[InteractionsList, ColumnarInteractions]:
+    """Keep only the interactions in the ranges of the widest width.
 
+    Only the interactions stored column by column can be pruned: the others
+    are returned as they are.
+    """
+    if not isinstance(interactions, ColumnarInteractions):
+        return interactions
+    pruned = interactions.prune(RANGES_WIDTHS)
+    METRICS.count('pruned_interactions', len(interactions) - len(pruned))
+    return pruned
+
+
+def _compute_intervals(interactions: Union[InteractionsList,
+                                           ColumnarInteractions],
+                       enable_gc: bool = True,
+                       enable_multiprocessing: bool = False,
+                       chunks: int = 0) -> Intervals:
+    """Calculate the data of the ranges of all the widths.
+
+    If `chunks` is greater than 1 (and the interactions are stored column by
+    column), the timeline is split into contiguous chunks, whose ranges of
+    all the widths are calculated in parallel and then joined in order.
+    """
+    logger = logging.getLogger(__name__)
     logger.info("Getting intervals")
     intervals = {}
-    ranges_widths = [
-        # t = 100 ms is the time between two captured emotions
-        25,  # 1/4 * t
-        50,  # 1/2 * t
-        100,  # 1 * t
-        200,  # 2 * t
-        500,  # 5 * t
-        1000,  # 10 * t
-        2000  # 20 * t
-    ]
-
-    if enable_multiprocessing:
+    ranges_widths = RANGES_WIDTHS
+
+    columnar = isinstance(interactions, ColumnarInteractions)
+    if chunks > 1 and columnar:
+        tasks = interactions.chunks(ranges_widths, chunks)
+        n_cpu = min(max(os.cpu_count() - 2, 1), len(tasks))
+        logger.info("Processing %d chunks on %d CPUs", len(tasks), n_cpu)
+        with multiprocessing.Pool(processes=n_cpu) as pool:
+            results = pool.starmap(
+                ColumnarInteractions.process_chunk,
+                [(chunk, windows, offset, enable_gc)
+                 for offset, chunk, windows in tasks])
+        del tasks
+        for width in ranges_widths:
+            intervals[width] = IntervalStore.concatenate(
+                [stores[width] for stores, __ in results])
+        for __, times in results:
+            for width, t in times.items():
+                METRICS.timer('intervals', t, width=width)
+    elif enable_multiprocessing and columnar:
+        n_cpu = max(os.cpu_count() - 2, 1)
+        logger.info("Spawning multiple processes on %d CPUs", n_cpu)
+        from functools import partial
+        with SharedInteractions(interactions) as shared, \
+                multiprocessing.Pool(processes=n_cpu) as pool:
+            process = partial(process_shared_intervals, shared,
+                              enable_gc=enable_gc)
+            for (store, width), t in pool.map(process, ranges_widths):
+                intervals[width] = store
+                METRICS.timer('intervals', t, width=width)
+    elif enable_multiprocessing:
         n_cpu = max(os.cpu_count() - 2, 1)
         logger.info("Spawning multiple processes on %d CPUs", n_cpu)
-        import multiprocessing
         from functools import partial
         process = partial(interactions.process_intervals, enable_gc=enable_gc)
         with multiprocessing.Pool(processes=n_cpu) as pool:
-            for (data, width), __ in pool.map(process, ranges_widths):
+            for (data, width), t in pool.map(process, ranges_widths):
                 intervals.update({width: data})
+                METRICS.timer('intervals', t, width=width)
+    elif columnar:
+        intervals, __ = interactions.process_all_intervals(ranges_widths,
+                                                           enable_gc=enable_gc)
     else:
         for range_width in ranges_widths:
             (intervals[range_width], __), __ = interactions.process_intervals(
                 range_width, enable_gc=enable_gc)
+    for width, data in intervals.items():
+        METRICS.count('ranges', len(data), width=width)
+    METRICS.count('emotion_frames', max(map(len, intervals.values()),
+                                        default=0))
+    return intervals
+
+
+@timed("Saved interactions in %.3fs", stage='write')
+def _save_interactions(interactions: Union[InteractionsList,
+                                           ColumnarInteractions],
+                       out_dir: str, user: str,
+                       output_format: str = 'csv') -> None:
+    if output_format == 'parquet':
+        utilities.interactions_to_parquet(interactions, out_dir, user,
+                                          'interactions.parquet')
+    else:
+        interactions.to_csv(out_dir, user, 'interactions.csv')
+
 
+@timed("Saved aggregate data in %.3fs", stage='write')
+def _save_aggregate(interactions: Union[InteractionsList,
+                                        ColumnarInteractions],
+                    intervals: Intervals, out_dir: str, user: str,
+                    output_format: str = 'csv') -> None:
+    logger = logging.getLogger(__name__)
     logger.info("Saving aggregate data")
-    utilities.to_csv(utilities.aggregate_data_to_list(intervals, interactions),
-                     out_dir, user, 'aggregate.csv')
+    if output_format == 'parquet':
+        utilities.aggregate_to_parquet(intervals, interactions, out_dir, user,
+                                       'aggregate.parquet')
+    elif output_format == 'npy':
+        utilities.aggregate_to_npy(
+            intervals, out_dir, user,
+            interaction_rows=getattr(interactions, 'rows', None))
+    else:
+        utilities.aggregate_to_csv(intervals, interactions, out_dir, user,
+                                   'aggregate.csv')
+
+
+_END = object()
+"""The item closing the queues of `process_users_pipelined`."""
+
+
+def process_users_pipelined(
+        sources: Iterable[Tuple[str, Optional[ColumnarInteractions]]],
+        websites: Dict[str, Website], db: db.Database, depth: int,
+        total_users: int = 1, out_dir: str = 'out', enable_gc: bool = True,
+        enable_multiprocessing: bool = False, enable_columnar: bool = False,
+        enable_streaming: bool = False, cache_dir: str = None,
+        output_format: str = 'csv', manifest: Manifest = None,
+        counts: Dict[str, int] = None, chunks: int = 0,
+        enable_pruning: bool = False, sample_fraction: float = None,
+        enable_stratification: bool = False, seed: int = 0) -> List[float]:
+    """Process several users, overlapping loading, computing and writing.
+
+    A background thread loads the interactions of the next users while the
+    current one is being computed, and another one writes the results of the
+    previous users. Each stage hands its results to the next through a queue
+    holding at most `depth` users, so that no more than ``2 * depth + 3``
+    users are in memory at the same time. If a stage fails, the threads are
+    stopped and its exception is raised.
+
+    Parameters
+    ----------
+    sources : iterable [(str, ColumnarInteractions)]
+        The IDs of the users, each one with its interactions if they are
+        already loaded (None otherwise).
+    websites : dict [str, Website]
+        The websites, used to categorize the interactions.
+    db : pymongo.database.Database
+        An instance of a MongoDB database to get the data. If None, the REST
+        APIs will be used.
+    depth : int
+        The maximum number of users waiting in each queue.
+    total_users : int, optional
+        The total number of users, used in the logs.
+    out_dir : str, optional
+        The output directory.
+    enable_gc : bool, optional
+        Whether or not to enable the explicit calls to the garbage collection.
+    enable_multiprocessing : bool, optional
+        Whether or not to calculate the widths of each user in parallel.
+    enable_columnar : bool, optional
+        Whether or not to store the interactions column by column.
+    enable_streaming : bool, optional
+        Whether or not to stream the interactions from the database.
+    cache_dir : str, optional
+        The directory where the interactions of each user are cached.
+    output_format : "csv", "parquet", "npy", optional
+        The format of the files of the interactions and of the aggregate data.
+    manifest : Manifest, optional
+        The manifest recording the status of each user.
+    counts : dict [str, int], optional
+        The number of interactions of each user, recorded in the manifest.
+    chunks : int, optional
+        If greater than 1, the number of chunks of the timeline of each user
+        calculated in parallel.
+    enable_pruning : bool, optional
+        Whether or not to calculate the ranges only on the interactions close
+        to the emotion frames. The interactions are saved in full.
+    sample_fraction : float, optional
+        If set, the fraction of the emotion frames of each user whose ranges
+        are calculated.
+    enable_stratification : bool, optional
+        Whether or not to sample the same number of emotion frames for each
+        discretized value of each emotion.
+    seed : int, optional
+        The seed of the sampling.
+
+    Returns
+    -------
+    list [float]
+        The time spent on each user by the three stages, in processing order.
+    """
+    logger = logging.getLogger(__name__)
+    loaded = queue.Queue(maxsize=depth)
+    computed = queue.Queue(maxsize=depth)
+    user_times = []
+    errors = []
+    stopped = threading.Event()
+    counts = counts or {}
+    manifest_options = run_options(
+        sample_fraction=sample_fraction, seed=seed,
+        enable_stratification=enable_stratification,
+        enable_pruning=enable_pruning)
+
+    def load() -> None:
+        user = None
+        try:
+            for index, (user, interactions) in enumerate(sources, 1):
+                if stopped.is_set():
+                    break
+                start_time = time.time()
+                if manifest is not None:
+                    manifest.start(user, counts.get(user), output_format,
+                                   manifest_options)
+                with METRICS.labels(user=user):
+                    interactions = _load_user(
+                        user, websites, db, enable_gc=enable_gc,
+                        enable_columnar=enable_columnar,
+                        enable_streaming=enable_streaming,
+                        cache_dir=cache_dir, interactions=interactions)
+                loaded.put((index, user, interactions,
+                            time.time() - start_time))
+        except BaseException as e:  # pylint: disable=broad-except
+            if manifest is not None and user is not None:
+                manifest.fail(user, counts.get(user), output_format, e,
+                              manifest_options)
+            loaded.put(e)
+        loaded.put(_END)
+
+    def write() -> None:
+        while True:
+            item = computed.get()
+            if item is _END:
+                return
+            user, interactions, pruned, intervals, elapsed = item
+            if errors:
+                # Keep emptying the queue, so that the computation can end
+                continue
+            try:
+                start_time = time.time()
+                with METRICS.labels(user=user):
+                    _save_interactions(interactions, out_dir, user,
+                                       output_format)
+                    _save_aggregate(pruned, intervals, out_dir, user,
+                                    output_format)
+                    elapsed += time.time() - start_time
+                    logger.info("User done in %.3fs", elapsed)
+                    METRICS.timer('user', elapsed)
+                    METRICS.memory()
+                user_times.append(elapsed)
+                if manifest is not None:
+                    manifest.complete(user, counts.get(user), output_format,
+                                      elapsed, manifest_options)
+            except BaseException as e:  # pylint: disable=broad-except
+                if manifest is not None:
+                    manifest.fail(user, counts.get(user), output_format, e,
+                                  manifest_options)
+                errors.append(e)
+
+    loader = threading.Thread(target=load, name="loader", daemon=True)
+    writer = threading.Thread(target=write, name="writer", daemon=True)
+    loader.start()
+    writer.start()
+    finished = False
+    try:
+        while not errors:
+            item = loaded.get()
+            if item is _END:
+                finished = True
+                break
+            if isinstance(item, BaseException):
+                raise item
+            index, user, interactions, elapsed = item
+            if enable_gc:
+                logger.info("Running garbage collector")
+                collected = gc.collect()
+                logger.info("Gargage collector collected %d objects",
+                            collected)
+            logger.info("Processing data by user '%s' (%d of %d)", str(user),
+                        index, total_users)
+            if not interactions:
+                logger.warning("No interactions from the user")
+                logger.info("User done in %.3fs", elapsed)
+                METRICS.timer('user', elapsed, user=user)
+                user_times.append(elapsed)
+                if manifest is not None:
+                    manifest.complete(user, counts.get(user), output_format,
+                                      elapsed, manifest_options)
+                continue
+            start_time = time.time()
+            try:
+                with METRICS.labels(user=user):
+                    if sample_fraction is not None:
+                        _sample_user(
+                            user, interactions, sample_fraction,
+                            enable_stratification=enable_stratification,
+                            seed=seed)
+                    pruned = interactions
+                    if enable_pruning:
+                        pruned, __ = _prune_user(interactions)
+                    intervals = _compute_intervals(
+                        pruned, enable_gc=enable_gc,
+                        enable_multiprocessing=enable_multiprocessing,
+                        chunks=chunks)
+            except BaseException as e:
+                if manifest is not None:
+                    manifest.fail(user, counts.get(user), output_format, e,
+                                  manifest_options)
+                raise
+            computed.put((user, interactions, pruned, intervals,
+                          elapsed + time.time() - start_time))
+            del interactions, pruned, intervals
+    finally:
+        computed.put(_END)
+        # The loader may be waiting for room in its queue
+        stopped.set()
+        while not finished:
+            finished = loaded.get() is _END
+        loader.join()
+        writer.join()
+    if errors:
+        raise errors[0]
+    return user_times
+
+
+_worker_db: Optional[db.Database] = None
+_worker_websites: Dict[str, Website] = {}
+_worker_options: dict = {}
+
+
+def _init_worker(db_uri: Optional[str], websites: Dict[str, Website],
+                 options: dict, enable_tracemalloc: bool = False) -> None:
+    """Set up a process of the pool used by `process_users`.
+
+    Each worker opens its own connection to the database, since MongoDB
+    clients cannot be shared between processes.
+    """
+    global _worker_db, _worker_websites, _worker_options
+    if enable_tracemalloc:
+        tracemalloc.start()
+    if db_uri:
+        _worker_db = pymongo.MongoClient(db_uri).get_default_database()
+    _worker_websites = websites
+    _worker_options = options
+
+
+def _process_user_task(task: Tuple[int, str]) -> \
+        Tuple[int, Optional[float], List[dict], Optional[Exception]]:
+    """Process a user inside a process of the pool used by `process_users`.
+
+    The metrics recorded by the worker are sent back with the time. If the
+    processing fails, the error is sent back instead of the time, so that
+    the pool can go on with the other users.
+    """
+    index, user = task
+    try:
+        with METRICS.labels(user=user):
+            __, t = process_user(user, _worker_websites, db=_worker_db,
+                                 index=index, **_worker_options)
+    except Exception as e:  # pylint: disable=broad-except
+        logging.getLogger(__name__).exception(
+            "Processing of user '%s' failed", user)
+        return index, None, METRICS.drain(), e
+    return index, t, METRICS.drain(), None
+
+
+def process_users(users: List[str], websites: Dict[str, Website],
+                  db_uri: Optional[str], counts: Dict[str, int],
+                  n_workers: int, total_users: int = None,
+                  out_dir: str = 'out', enable_gc: bool = True,
+                  enable_columnar: bool = False,
+                  enable_streaming: bool = False,
+                  cache_dir: str = None,
+                  output_format: str = 'csv',
+                  manifest: Manifest = None,
+                  enable_tracemalloc: bool = False,
+                  enable_pruning: bool = False,
+                  sample_fraction: float = None,
+                  enable_stratification: bool = False,
+                  seed: int = 0) -> List[float]:
+    """Process several users in parallel.
+
+    The users are processed by a persistent pool of processes, each one with
+    its own database connection. The users with more interactions are
+    scheduled first, so that the longest tasks do not end up running alone
+    at the end of the execution.
+
+    Parameters
+    ----------
+    users : list [str]
+        The IDs of the users to be processed.
+    websites : dict [str, Website]
+        The websites, used to categorize the interactions.
+    db_uri : str, optional
+        The MongoDB connection string. If None, the REST APIs will be used.
+    counts : dict [str, int]
+        The number of interactions of each user, used to schedule the users.
+    n_workers : int
+        The number of processes of the pool.
+    total_users : int, optional
+        The total number of users, used in the logs. By default, it is the
+        number of processed users.
+    out_dir : str, optional
+        The output directory.
+    enable_gc : bool, optional
+        Whether or not to enable the explicit calls to the garbage collection.
+    enable_columnar : bool, optional
+        Whether or not to store the interactions column by column.
+    enable_streaming : bool, optional
+        Whether or not to stream the interactions from the database.
+    cache_dir : str, optional
+        The directory where the interactions of each user are cached.
+    output_format : "csv", "parquet", "npy", optional
+        The format of the files of the interactions and of the aggregate data.
+    manifest : Manifest, optional
+        The manifest recording the status of each user.
+    enable_tracemalloc : bool, optional
+        Whether or not to trace the memory allocations of the workers.
+    enable_pruning : bool, optional
+        Whether or not to calculate the ranges only on the interactions close
+        to the emotion frames. The interactions are saved in full.
+    sample_fraction : float, optional
+        If set, the fraction of the emotion frames of each user whose ranges
+        are calculated.
+    enable_stratification : bool, optional
+        Whether or not to sample the same number of emotion frames for each
+        discretized value of each emotion.
+    seed : int, optional
+        The seed of the sampling.
+
+    Returns
+    -------
+    list [float]
+        The time taken by each user, in the same order of `users`. The users
+        whose processing failed are skipped: they are logged and marked as
+        failed in the manifest, while the other users go on.
+    """
+    logger = logging.getLogger(__name__)
+    options = dict(total_users=total_users or len(users), out_dir=out_dir,
+                   enable_gc=enable_gc, enable_columnar=enable_columnar,
+                   enable_streaming=enable_streaming, cache_dir=cache_dir,
+                   output_format=output_format, enable_pruning=enable_pruning,
+                   sample_fraction=sample_fraction,
+                   enable_stratification=enable_stratification, seed=seed)
+    manifest_options = run_options(
+        sample_fraction=sample_fraction, seed=seed,
+        enable_stratification=enable_stratification,
+        enable_pruning=enable_pruning)
+    tasks = sorted(enumerate(users, 1),
+                   key=lambda task: counts.get(task[1], 0), reverse=True)
+    user_times: List[Optional[float]] = [None] * len(users)
+    failed = 0
+    if manifest is not None:
+        # The pool takes all the tasks at once, so the users are recorded as
+        # running from the start of the run until they complete or fail
+        for __, user in tasks:
+            manifest.start(user, counts.get(user), output_format,
+                           manifest_options)
+
+    logger.info("Processing %d users on %d processes", len(users), n_workers)
+    with multiprocessing.Pool(processes=n_workers, initializer=_init_worker,
+                              initargs=(db_uri, websites, options,
+                                        enable_tracemalloc)) as pool:
+        # Tasks are handed out one at a time, in the order given, so that
+        # each free worker takes the largest user still waiting
+        for index, t, samples, error in pool.imap_unordered(
+                _process_user_task, tasks, chunksize=1):
+            METRICS.extend(samples)
+            user = users[index - 1]
+            if error is not None:
+                failed += 1
+                logger.error("User '%s' failed: %r", user, error)
+                if manifest is not None:
+                    manifest.fail(user, counts.get(user), output_format,
+                                  error, manifest_options)
+                continue
+            user_times[index - 1] = t
+            if manifest is not None:
+                manifest.complete(user, counts.get(user), output_format, t,
+                                  manifest_options)
+    if failed:
+        logger.error("%d of %d users failed", failed, len(users))
+    return [t for t in user_times if t is not None]
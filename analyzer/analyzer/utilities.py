@@ -16,21 +16,62 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import csv
+import json
 import os
 from itertools import tee
-from typing import List, Dict, Union, Any, Tuple, Iterator
+from typing import List, Dict, Union, Any, Tuple, Iterator, Mapping, Optional
 import logging
 
+import numpy as np
+
 from analyzer.data import User, Website
 from analyzer.data.base import BaseObject
+from analyzer.data.columnar import ColumnarInteractions
+from analyzer.data.features import BasicStats, Clicks, Keyboard, RateStats, \
+    DirectionStatistics, VisitedWebsites
 from analyzer.data.interaction import InteractionsList
-from analyzer.data.interval import IntervalData
+from analyzer.data.interval import IntervalData, IntervalStore, LOCATIONS, NONE
 
 BaseValues = Union[int, str, float, bool]
 AnalyzerValues = Union[Iterator[Dict[str, BaseValues]], Dict[str, Union[User, Website, BaseValues]], InteractionsList]
 
 logger = logging.getLogger(__name__)
 
+AGGREGATE_BLOCK_SIZE = 4096
+"""The number of rows of `aggregate.csv` converted at once."""
+
+_AGGREGATE_FEATURES = [
+    ('clicks', [f"{k}.{j}" for k in Clicks.__slots__
+                for j in BasicStats.__slots__]),
+    ('event_times', BasicStats.__slots__),
+    ('idle', BasicStats.__slots__),
+    ('keys', [f"{k}.{j}" for k in Keyboard.__slots__
+              for j in BasicStats.__slots__]),
+    ('mouse_movements', RateStats.__slots__),
+    ('scrolls', RateStats.__slots__),
+    ('slopes', DirectionStatistics.__slots__),
+    ('urls', VisitedWebsites.__slots__),
+]
+"""The features written to `aggregate.csv` (after the speed), in the order of
+`AggregateData.to_records`."""
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'npy']
+"""The formats of the files of the interactions and of the aggregate data
+(with 'npy', the aggregate data is written by `aggregate_to_npy` and the
+interactions to a CSV file)."""
+
+_DICTIONARY_FIELDS = {'user_id', 'url', 'url.category'}
+_BOOLEAN_FIELDS = {'mouse.clicks', 'mouse.clicks.left', 'mouse.clicks.right',
+                   'mouse.clicks.middle', 'mouse.clicks.others', 'keyboard',
+                   'keyboard.alpha', 'keyboard.numeric', 'keyboard.function',
+                   'keyboard.symbol', 'emotions.exists'}
+_INTEGER_VALUES = {'slopes.changes', 'mouse_movements.total', 'scrolls.total',
+                   'urls.unique', 'urls.changed',
+                   *(f'clicks.{k}.sum' for k in Clicks.__slots__),
+                   *(f'keys.{k}.sum' for k in Keyboard.__slots__)}
+"""The values of the ranges that are always integers (as feature and value)."""
+
+
 def to_csv(values: AnalyzerValues, *filename: str, mode: str = 'w') -> None:
     dest_path = os.path.join(*filename)
     if not os.path.exists(os.path.dirname(dest_path)):
@@ -126,6 +167,337 @@ class AggregateData(object):
             yield d
 
 
+def _location_columns(location: str) -> List[Tuple[str, str, str]]:
+    # The name of the features of a location, in the order of
+    # AggregateData.to_records, with the name of their column in aggregate.csv
+    # (without the width) and in IntervalStore
+    columns = []
+    for i, axis in enumerate(['total', 'x', 'y']):
+        for k in BasicStats.__slots__:
+            columns.append((f'avg_speed.{axis}.{k}',
+                            f'avg_speed.{location}.{axis}.{k}',
+                            f'avg_speed.{location}.{i}.{k}'))
+    for feature, keys in _AGGREGATE_FEATURES:
+        for k in keys:
+            columns.append((f'{feature}.{k}', f'{location}.{feature}.{k}',
+                            f'{feature}.{location}.{k}'))
+    return columns
+
+
+def aggregate_columns(range_width: float) -> Tuple[List[str], np.ndarray]:
+    """Get the layout of the columns of `aggregate.csv` for a width.
+
+    Parameters
+    ----------
+    range_width : float
+        The width of the ranges.
+
+    Returns
+    -------
+    list [str]
+        The names of the columns, in the order of `AggregateData.to_records`.
+    numpy.ndarray
+        The index of the corresponding column of `IntervalStore`.
+    """
+    columns = [column for location in LOCATIONS
+               for column in _location_columns(location)]
+    return [f'{range_width}.{name}' for __, name, __ in columns], \
+        np.array([IntervalStore.INDEX[column] for __, __, column in columns])
+
+
+def tensor_columns() -> Tuple[List[str], np.ndarray]:
+    """Get the layout of the tensors written by `aggregate_to_npy`.
+
+    Returns
+    -------
+    list [str]
+        The names of the features (e.g. 'clicks.left.avg'), in the order of
+        `aggregate.csv`.
+    numpy.ndarray
+        The index of the column of `IntervalStore` of each feature and
+        location, with shape (features, 3). The locations are ordered as in
+        `LOCATIONS`.
+    """
+    columns = [_location_columns(location) for location in LOCATIONS]
+    return [feature for feature, __, __ in columns[0]], \
+        np.array([[IntervalStore.INDEX[column] for __, __, column in location]
+                  for location in columns]).T
+
+
+def _store_rows(store: IntervalStore, middles: np.ndarray) -> np.ndarray:
+    # The row of each middle interaction in the store (-1 if missing)
+    if np.array_equal(store.middles, middles):
+        return np.arange(len(middles))
+    rows = {middle: i for i, middle in enumerate(store.middles.tolist())}
+    return np.array([rows.get(middle, -1) for middle in middles.tolist()],
+                    dtype=np.int64)
+
+
+def _aggregate_layout(values: Dict[float, Mapping[int, IntervalData]]) -> \
+        Tuple[np.ndarray, Dict[float, Tuple[IntervalStore, np.ndarray,
+                                            List[str], np.ndarray]]]:
+    # The rows and the columns of the aggregate data, as in
+    # AggregateData.to_records
+    stores = {width: IntervalStore.from_intervals(data)
+              for width, data in values.items()}
+    # The rows are sorted by first appearance
+    middles = np.concatenate([store.middles for store in stores.values()] or
+                             [np.empty(0, dtype=np.int64)])
+    __, first = np.unique(middles, return_index=True)
+    middles = middles[np.sort(first)]
+    # The columns are the ones of the first row
+    columns = {}
+    for width, store in stores.items():
+        rows = _store_rows(store, middles)
+        if len(rows) and rows[0] >= 0:
+            columns[width] = (store, rows, *aggregate_columns(width))
+        elif (rows >= 0).any():
+            raise ValueError(f"Ranges of {width} ms are missing from the "
+                             f"first row")
+    return middles, columns
+
+
+def _interactions_columns(interactions: Union[InteractionsList,
+                                              ColumnarInteractions],
+                          rows: np.ndarray = None) -> \
+        Tuple[List[str], List[List[Any]]]:
+    # The fields of the interactions (or of some of them), column by column
+    if not len(interactions) or rows is not None and not len(rows):
+        return [], []
+    keys = list(interactions[0].to_dict().keys())
+    if isinstance(interactions, ColumnarInteractions):
+        if rows is not None:
+            interactions = interactions.take(rows)
+        return keys, interactions._columns()
+    selected = interactions if rows is None else \
+        (interactions[i] for i in rows.tolist())
+    return keys, [list(column) for column in
+                  zip(*(o.to_dict().values() for o in selected))]
+
+
+def aggregate_to_csv(values: Dict[float, Mapping[int, IntervalData]],
+                     interactions: Union[InteractionsList,
+                                         ColumnarInteractions],
+                     *filename: str, mode: str = 'w') -> None:
+    """Write the data of the ranges of all the widths to a CSV file.
+
+    The file is identical to the one written by `to_csv` from
+    `aggregate_data_to_list`, but the layout of the columns is calculated once
+    for each width and the rows are converted in blocks of
+    `AGGREGATE_BLOCK_SIZE` straight from the matrices of `IntervalStore`.
+
+    Parameters
+    ----------
+    values : dict [float, dict [int, IntervalData]]
+        For each width, the data of each range, indexed by its middle
+        interaction.
+    interactions : InteractionsList or ColumnarInteractions
+        The interactions.
+    filename : str
+        The path of the file.
+    mode : str, optional
+        The mode used to open the file. If the file is appended to, the header
+        is not written.
+    """
+    middles, columns = _aggregate_layout(values)
+    if not len(middles):
+        logger.warning("No values to convert")
+        return
+
+    middle_keys = interactions[int(middles[0])].to_dict().keys()
+    header = [f'middle.{k}' for k in middle_keys]
+    for __, __, names, __ in columns.values():
+        header.extend(names)
+
+    dest_path = os.path.join(*filename)
+    if not os.path.exists(os.path.dirname(dest_path)):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(dest_path, mode=mode, encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        if mode != 'a' and mode != 'ab':
+            writer.writerow(header)
+        for start in range(0, len(middles), AGGREGATE_BLOCK_SIZE):
+            end = start + AGGREGATE_BLOCK_SIZE
+            __, middle_columns = _interactions_columns(interactions,
+                                                       middles[start:end])
+            data_rows = np.hstack([
+                store.objects(rows[start:end], store_columns)
+                for store, rows, __, store_columns in columns.values()
+            ]).tolist()
+            writer.writerows([*middle_row, *data_row] for middle_row, data_row
+                             in zip(zip(*middle_columns), data_rows))
+
+
+def _interaction_type(pa, key: str):
+    # The Parquet type of a field of Interaction.to_dict
+    if key in _DICTIONARY_FIELDS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if key in _BOOLEAN_FIELDS:
+        return pa.bool_()
+    if key == 'id':
+        return pa.string()
+    return pa.float64()
+
+
+def _interactions_arrays(pa, interactions: Union[InteractionsList,
+                                                 ColumnarInteractions],
+                         rows: np.ndarray = None, prefix: str = '') -> \
+        Tuple[List[Any], List[Any]]:
+    # The typed fields and the arrays of the interactions
+    keys, columns = _interactions_columns(interactions, rows)
+    fields, arrays = [], []
+    for key, column in zip(keys, columns):
+        field = pa.field(prefix + key, _interaction_type(pa, key))
+        if key == 'id':
+            # The legacy interactions hold ObjectIds
+            array = pa.array(map(str, column), type=field.type)
+        elif pa.types.is_dictionary(field.type):
+            array = pa.array(column, type=pa.string()).dictionary_encode()
+        else:
+            array = pa.array(column, type=field.type)
+        fields.append(field)
+        arrays.append(array)
+    return fields, arrays
+
+
+def _write_parquet(pa, fields: List[Any], arrays: List[Any],
+                   *filename: str) -> None:
+    import pyarrow.parquet as pq
+
+    dest_path = os.path.join(*filename)
+    if not os.path.exists(os.path.dirname(dest_path)):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+    pq.write_table(table, dest_path, compression='snappy',
+                   write_statistics=True)
+
+
+def interactions_to_parquet(interactions: Union[InteractionsList,
+                                                ColumnarInteractions],
+                            *filename: str) -> None:
+    """Write the interactions to a Parquet file.
+
+    The file has the same columns of the CSV file, with an explicit type:
+    the flags are booleans, the identifiers are strings, the user, the URL and
+    its category are dictionary-encoded and every other value is a float.
+    Missing values are nulls.
+
+    Parameters
+    ----------
+    interactions : InteractionsList or ColumnarInteractions
+        The interactions.
+    filename : str
+        The path of the file.
+    """
+    import pyarrow as pa
+
+    if not len(interactions):
+        logger.warning("No values to convert")
+        return
+    _write_parquet(pa, *_interactions_arrays(pa, interactions), *filename)
+
+
+def aggregate_to_parquet(values: Dict[float, Mapping[int, IntervalData]],
+                         interactions: Union[InteractionsList,
+                                             ColumnarInteractions],
+                         *filename: str) -> None:
+    """Write the data of the ranges of all the widths to a Parquet file.
+
+    The file has the same rows and columns written by `aggregate_to_csv`. The
+    fields of the middle interactions have the types used by
+    `interactions_to_parquet`, the counts of events are integers and every
+    other value is a float. Missing values are nulls.
+
+    Parameters
+    ----------
+    values : dict [float, dict [int, IntervalData]]
+        For each width, the data of each range, indexed by its middle
+        interaction.
+    interactions : InteractionsList or ColumnarInteractions
+        The interactions.
+    filename : str
+        The path of the file.
+    """
+    import pyarrow as pa
+
+    middles, columns = _aggregate_layout(values)
+    if not len(middles):
+        logger.warning("No values to convert")
+        return
+
+    fields, arrays = _interactions_arrays(pa, interactions, middles,
+                                          prefix='middle.')
+    for store, rows, names, store_columns in columns.values():
+        data = store.values[rows][:, store_columns]
+        missing = (store.kinds[rows][:, store_columns] == NONE) | \
+            (rows < 0)[:, np.newaxis]
+        data[missing] = 0
+        for j, (name, column) in enumerate(zip(names, store_columns.tolist())):
+            feature, __, value = IntervalStore.COLUMNS[column].split('.', 2)
+            array = pa.array(data[:, j], mask=missing[:, j])
+            if f'{feature}.{value}' in _INTEGER_VALUES:
+                array = array.cast(pa.int64())
+            fields.append(pa.field(name, array.type))
+            arrays.append(array)
+    _write_parquet(pa, fields, arrays, *filename)
+
+
+def aggregate_to_npy(values: Dict[float, Mapping[int, IntervalData]],
+                     *dirname: str,
+                     interaction_rows: Optional[np.ndarray] = None) -> None:
+    """Write the data of the ranges of each width to a memory-mappable tensor.
+
+    For each width, a file named ``aggregate.{width}.npy`` holds a float32
+    tensor of shape (ranges, features, locations), where the locations are
+    'full', 'before' and 'after' (missing values are NaN). The rows are in the
+    order of `aggregate.csv`: the indexes of their middle interactions (i.e.
+    the rows of the interactions' file) are saved in ``aggregate.middles.npy``.
+    The names of the features, of the locations and of the files are listed
+    in ``aggregate.json``.
+
+    The tensors can be read with ``numpy.load(path, mmap_mode='r')``, so that
+    a width and a location can be selected without parsing nor copying the
+    whole file.
+
+    Parameters
+    ----------
+    values : dict [float, dict [int, IntervalData]]
+        For each width, the data of each range, indexed by its middle
+        interaction.
+    dirname : str
+        The path of the directory of the files.
+    interaction_rows : numpy.ndarray, optional
+        If the ranges were calculated on pruned interactions, the row of each
+        of them in the interactions' file.
+    """
+    middles, columns = _aggregate_layout(values)
+    if not len(middles):
+        logger.warning("No values to convert")
+        return
+
+    dest_dir = os.path.join(*dirname)
+    os.makedirs(dest_dir, exist_ok=True)
+    features, store_columns = tensor_columns()
+    index = {
+        'features': features,
+        'locations': list(LOCATIONS),
+        'ranges': len(middles),
+        'middles': 'aggregate.middles.npy',
+        'widths': {},
+    }
+    np.save(os.path.join(dest_dir, index['middles']),
+            middles if interaction_rows is None else interaction_rows[middles])
+    for width, (store, rows, __, __) in columns.items():
+        tensor = store.values[rows][:, store_columns].astype(np.float32)
+        tensor[(store.kinds[rows][:, store_columns] == NONE) |
+               (rows < 0)[:, np.newaxis, np.newaxis]] = np.nan
+        index['widths'][str(width)] = f'aggregate.{width}.npy'
+        np.save(os.path.join(dest_dir, index['widths'][str(width)]), tensor)
+    with open(os.path.join(dest_dir, 'aggregate.json'), 'w',
+              encoding='utf-8') as file:
+        json.dump(index, file, indent=2)
+
+
 def aggregate_data_to_list(values: Dict[float, Dict[int, IntervalData]], interactions: InteractionsList) -> Iterator[
     Dict[str, BaseValues]]:
     aggregate = AggregateData()
@@ -0,0 +1,134 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The fixtures of the benchmarks.
+
+The benchmarks run on the synthetic interactions of a single user, generated
+with a fixed seed for each size. By default, only the columnar engine is
+measured on 10,000 and 100,000 interactions: the object-based engine is
+enabled with ``--legacy`` (its ranges are analyzed one by one, so it is only
+practical on the smaller sizes) and the sizes are chosen with ``--sizes``.
+"""
+
+import logging
+from typing import Any, Callable
+
+import pytest
+
+from analyzer.data import load_interactions
+from analyzer.data.synthetic import Database, generate_interactions, \
+    generate_websites
+from analyzer.process import _compute_intervals
+
+SEED = 42
+"""The seed of the generated interactions."""
+USER = f"{0:024x}"
+"""The ID of the generated user."""
+DEFAULT_SIZES = '10000,100000'
+"""The sizes measured by default (the baselines include 1,000,000 too)."""
+ROUNDS = {10000: 5, 100000: 3}
+"""The number of rounds of each size (one for larger sizes)."""
+MAX_AGGREGATE_SIZE = 100000
+"""The largest size whose ranges of all the widths are kept in memory to be
+written (with 1,000,000 interactions they take several GB)."""
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('analyzer')
+    group.addoption('--sizes', default=DEFAULT_SIZES,
+                    help="The comma-separated numbers of interactions to be "
+                         f"generated (default: {DEFAULT_SIZES}).")
+    group.addoption('--legacy', action='store_true',
+                    help="Measure the object-based engine too (slow).")
+
+
+def pytest_configure(config):
+    # The analyzer logs every step
+    logging.getLogger('analyzer').setLevel(logging.WARNING)
+
+
+def pytest_generate_tests(metafunc):
+    if 'size' in metafunc.fixturenames:
+        sizes = [int(size) for size in
+                 metafunc.config.getoption('sizes').split(',')]
+        metafunc.parametrize('size', sizes, scope='session')
+    if 'engine' in metafunc.fixturenames:
+        engines = ['columnar']
+        if metafunc.config.getoption('legacy'):
+            engines.append('legacy')
+        metafunc.parametrize('engine', engines, scope='session')
+
+
+@pytest.fixture(scope='session')
+def documents(size):
+    return list(generate_interactions(size, seed=SEED))
+
+
+@pytest.fixture(scope='session')
+def database(documents):
+    return Database(documents)
+
+
+@pytest.fixture(scope='session')
+def websites():
+    return generate_websites(SEED)
+
+
+@pytest.fixture(scope='session')
+def loaded(database, websites, engine):
+    """The interactions, with their categories."""
+    interactions, __ = load_interactions(mongodb=database, user=USER,
+                                         enable_gc=False,
+                                         columnar=engine == 'columnar')
+    interactions.set_website_categories(websites)
+    return interactions
+
+
+@pytest.fixture(scope='session')
+def interactions(loaded):
+    """The interactions, with their speeds and directions."""
+    loaded._set_additional_data()
+    return loaded
+
+
+@pytest.fixture(scope='session')
+def intervals(interactions, size):
+    """The data of the ranges of all the widths."""
+    if size > MAX_AGGREGATE_SIZE:
+        pytest.skip(f"The ranges of {size} interactions are not kept in "
+                    f"memory")
+    return _compute_intervals(interactions, enable_gc=False)
+
+
+@pytest.fixture
+def run(benchmark, size) -> Callable:
+    """Measure a function, with a number of rounds depending on the size."""
+
+    def measure(function: Callable, *args, setup: Callable = None,
+                **kwargs) -> Any:
+        benchmark.extra_info['size'] = size
+        if setup is not None:
+            def set_up():
+                setup()
+                return args, kwargs
+
+            return benchmark.pedantic(function, setup=set_up,
+                                      rounds=ROUNDS.get(size, 1))
+        return benchmark.pedantic(function, args=args, kwargs=kwargs,
+                                  rounds=ROUNDS.get(size, 1))
+
+    return measure
@@ -0,0 +1,136 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The benchmarks of the calculation of the data of the ranges."""
+
+import pytest
+
+from analyzer.data.columnar import CLICKS_COLUMNS, KEYS_COLUMNS
+from analyzer.data.interval import IntervalStore
+from analyzer.data.vectorized import locate_nested_windows
+from analyzer.process import RANGES_WIDTHS
+
+FEATURE_WIDTH = 1000
+"""The width of the ranges used to measure each feature."""
+
+COLUMNAR_FEATURES = {
+    'direction_changes': lambda interactions, store, windows:
+    interactions._set_direction_changes(store, windows, FEATURE_WIDTH),
+    'mouse_movements': lambda interactions, store, windows:
+    interactions._set_mouse_movements(store, windows, FEATURE_WIDTH),
+    'average_speed': lambda interactions, store, windows:
+    interactions._set_basic_stats(store, 'avg_speed', 'speeds', windows),
+    'average_acceleration': lambda interactions, store, windows:
+    interactions._set_basic_stats(store, 'avg_acceleration',
+                                  'accelerations', windows),
+    'clicks_statistics': lambda interactions, store, windows:
+    interactions._set_flags_stats(
+        store, 'clicks', CLICKS_COLUMNS, interactions._flags()['clicks'],
+        interactions._get_prefix_sums()['clicks'], windows, FEATURE_WIDTH),
+    'keyboard_statistics': lambda interactions, store, windows:
+    interactions._set_flags_stats(
+        store, 'keys', KEYS_COLUMNS, interactions._flags()['keys'],
+        interactions._get_prefix_sums()['keys'], windows, FEATURE_WIDTH,
+        combined=True),
+    'urls_statistics': lambda interactions, store, windows:
+    interactions._set_urls_statistics(store, windows, FEATURE_WIDTH),
+    'event_times': lambda interactions, store, windows:
+    interactions._set_event_times(store, windows),
+    'average_idle_time': lambda interactions, store, windows:
+    interactions._set_average_idle_time(store, windows),
+}
+"""The function setting each feature in the columnar engine (the mouse
+movements include the scrolls)."""
+
+LEGACY_FEATURES = {
+    'direction_changes': lambda interactions, interval:
+    interactions._get_direction_changes(interval, FEATURE_WIDTH),
+    'mouse_movements': lambda interactions, interval:
+    (interactions._get_mouse_movements(interval, FEATURE_WIDTH),
+     interactions._get_scrolls(interval, FEATURE_WIDTH)),
+    'average_speed': lambda interactions, interval:
+    interactions._get_average_speed(interval),
+    'average_acceleration': lambda interactions, interval:
+    interactions._get_average_acceleration(interval),
+    'clicks_statistics': lambda interactions, interval:
+    interactions._get_clicks_statistics(interval, FEATURE_WIDTH),
+    'keyboard_statistics': lambda interactions, interval:
+    interactions._get_keyboard_statistics(interval, FEATURE_WIDTH),
+    'urls_statistics': lambda interactions, interval:
+    interactions._get_urls_statistics(interval, FEATURE_WIDTH),
+    'event_times': lambda interactions, interval:
+    interactions._get_event_times(interval),
+    'average_idle_time': lambda interactions, interval:
+    interactions._get_average_idle_time(interval),
+}
+"""The function getting each feature of a range in the object-based
+engine."""
+
+
+@pytest.mark.parametrize('width', RANGES_WIDTHS)
+def test_get_intervals(run, interactions, engine, width):
+    if engine == 'columnar':
+        run(interactions._get_intervals, width)
+    else:
+        run(lambda: list(interactions._get_intervals(width)))
+
+
+def test_locate_nested_windows(run, interactions, engine):
+    if engine != 'columnar':
+        pytest.skip("The ranges of all the widths are located together only "
+                    "by the columnar engine")
+    middles = interactions._emotions_over_value().nonzero()[0]
+    run(locate_nested_windows, interactions.timestamps, middles,
+        RANGES_WIDTHS)
+
+
+def test_get_prefix_sums(run, interactions, engine):
+    if engine != 'columnar':
+        pytest.skip("The cumulative sums are used only by the columnar "
+                    "engine")
+
+    def reset():
+        interactions.prefix_sums = None
+
+    run(interactions._get_prefix_sums, setup=reset)
+
+
+def test_prune(run, interactions, engine):
+    if engine != 'columnar':
+        pytest.skip("Only the interactions stored column by column can be "
+                    "pruned")
+    run(interactions.prune, RANGES_WIDTHS)
+
+
+@pytest.mark.parametrize('feature', list(COLUMNAR_FEATURES))
+def test_feature(run, interactions, engine, feature):
+    if engine == 'columnar':
+        windows = interactions._get_intervals(FEATURE_WIDTH)
+        store = IntervalStore(windows[1])
+        interactions._get_prefix_sums()
+        run(COLUMNAR_FEATURES[feature], interactions, store, windows)
+    else:
+        intervals = list(interactions._get_intervals(FEATURE_WIDTH))
+        function = LEGACY_FEATURES[feature]
+        run(lambda: [function(interactions, interval)
+                     for interval in intervals])
+
+
+@pytest.mark.parametrize('width', RANGES_WIDTHS)
+def test_process_intervals(run, interactions, width):
+    run(interactions.process_intervals, width, enable_gc=False)
@@ -0,0 +1,41 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The benchmarks of the loading of the interactions."""
+
+from analyzer.data import load_interactions
+from analyzer.data.synthetic import generate_interactions
+
+from .conftest import SEED, USER
+
+
+def test_generate_interactions(run, size):
+    run(lambda: sum(1 for __ in generate_interactions(size, seed=SEED)))
+
+
+def test_load_interactions(run, database, engine):
+    run(load_interactions, mongodb=database, user=USER, enable_gc=False,
+        columnar=engine == 'columnar')
+
+
+def test_set_website_categories(run, loaded, websites):
+    run(loaded.set_website_categories, websites)
+
+
+def test_set_additional_data(run, loaded):
+    run(loaded._set_additional_data)
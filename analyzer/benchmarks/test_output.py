@@ -0,0 +1,37 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The benchmarks of the output files."""
+
+import pytest
+
+from analyzer import utilities
+from analyzer.process import _save_aggregate
+
+
+def test_interactions_to_csv(run, interactions, tmp_path):
+    run(interactions.to_csv, str(tmp_path), 'interactions.csv')
+
+
+@pytest.mark.parametrize('output_format', utilities.OUTPUT_FORMATS)
+def test_save_aggregate(run, interactions, intervals, output_format,
+                        tmp_path):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    run(_save_aggregate, interactions, intervals, str(tmp_path), 'user',
+        output_format)
@@ -30,12 +30,16 @@ setup(
     packages=find_packages(),
     install_requires=[
         'matplotlib',
+        'numpy',
         'coloredlogs',
         'pymongo',
         'requests',
         'multiprocessing-logging',
         'python-dotenv'
     ],
+    extras_require={
+        'parquet': ['pyarrow']
+    },
     entry_points={
         'console_scripts': [
             f'{analyzer.__prog__}=analyzer.cli:main'
@@ -0,0 +1,68 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The fixtures of the tests.
+
+The tests run on the synthetic interactions of `analyzer.data.synthetic`,
+generated with a fixed seed and kept in an in-memory `Database` (the tests of
+the queries use ``mongomock`` instead, which is too slow for long timelines).
+"""
+
+import logging
+
+import pytest
+
+from analyzer.data.synthetic import Database, generate_interactions, \
+    generate_websites
+
+SEED = 42
+"""The seed of the generated interactions."""
+USERS = [f"{i:024x}" for i in range(3)]
+"""The IDs of the generated users."""
+USER = USERS[0]
+"""The ID of the user of the single-user tests."""
+SIZE = 20000
+"""The number of interactions of the generated users."""
+SMALL_SIZE = 500
+"""The number of interactions of the user compared with the object-based
+engine (which is slow)."""
+
+
+def pytest_configure(config):
+    # The analyzer logs every step
+    logging.getLogger('analyzer').setLevel(logging.WARNING)
+
+
+@pytest.fixture(scope='session')
+def documents():
+    return list(generate_interactions(SIZE, users=len(USERS), seed=SEED))
+
+
+@pytest.fixture(scope='session')
+def database(documents):
+    return Database(documents)
+
+
+@pytest.fixture(scope='session')
+def small_database():
+    return Database(list(generate_interactions(SMALL_SIZE, seed=SEED)))
+
+
+@pytest.fixture(scope='session')
+def websites():
+    return generate_websites(SEED)
@@ -0,0 +1,117 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the cache of the interactions."""
+
+import mongomock
+import numpy as np
+import pytest
+
+from analyzer.data import cache
+from analyzer.data.loader import load_interactions
+from analyzer.data.synthetic import generate_interactions
+
+from .conftest import SEED, USER
+from .test_loader import assert_same_interactions
+
+CACHE_SIZE = 1000
+"""The number of interactions stored in ``mongomock`` (it is slow)."""
+CACHED_SIZE = 600
+"""The number of interactions collected before the first run."""
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return list(generate_interactions(CACHE_SIZE, seed=SEED))
+
+
+def create_database(documents) -> mongomock.Database:
+    """Create a ``mongomock`` database with some interactions."""
+    database = mongomock.MongoClient()['analyzer']
+    database['interactions'].insert_many([dict(document)
+                                          for document in documents])
+    return database
+
+
+@pytest.fixture(autouse=True)
+def count(monkeypatch):
+    # The loader counts the documents with the API of pymongo 3
+    monkeypatch.setattr(mongomock.collection.Cursor, 'count',
+                        lambda self: len(list(self.clone())), raising=False)
+
+
+def load(database, cache_dir=None, streaming=False):
+    interactions, __ = load_interactions(mongodb=database, user=USER,
+                                         enable_gc=False, columnar=True,
+                                         streaming=streaming,
+                                         cache_dir=cache_dir)
+    return interactions
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_incremental_refresh(documents, tmp_path, streaming):
+    database = create_database(documents[:CACHED_SIZE])
+    load(database, str(tmp_path), streaming)
+    assert len(cache.load_cached(str(tmp_path), USER)) == CACHED_SIZE
+
+    database['interactions'].insert_many([dict(document) for document
+                                          in documents[CACHED_SIZE:]])
+    # The cached interactions are not fetched again
+    database['interactions'].delete_one({'_id': documents[0]['_id']})
+    refreshed = load(database, str(tmp_path), streaming)
+    expected = load(create_database(documents), streaming=streaming)
+    assert_same_interactions(refreshed, expected)
+    assert len(cache.load_cached(str(tmp_path), USER)) == CACHE_SIZE
+
+
+@pytest.mark.parametrize('content', [b'not a cache', None],
+                         ids=['corrupted', 'missing column'])
+def test_invalid_cache(documents, tmp_path, content):
+    database = create_database(documents)
+    path = cache.cache_path(str(tmp_path), USER)
+    if content is None:
+        load(database, str(tmp_path))
+        with np.load(path) as arrays:
+            arrays = dict(arrays)
+        del arrays['timestamps']
+        np.savez(path, **arrays)
+    else:
+        with open(path, 'wb') as file:
+            file.write(content)
+    assert cache.load_cached(str(tmp_path), USER) is None
+
+    # The invalid cache is ignored and replaced
+    assert_same_interactions(load(database, str(tmp_path)), load(database))
+    assert len(cache.load_cached(str(tmp_path), USER)) == CACHE_SIZE
+
+
+def test_atomic_replace(documents, tmp_path, monkeypatch):
+    database = create_database(documents[:CACHED_SIZE])
+    load(database, str(tmp_path))
+    database['interactions'].insert_many([dict(document) for document
+                                          in documents[CACHED_SIZE:]])
+
+    def interrupted(file, **arrays):
+        file.write(b'partial')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cache.np, 'savez', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        load(database, str(tmp_path))
+    # The previous cache is left untouched
+    assert len(cache.load_cached(str(tmp_path), USER)) == CACHED_SIZE
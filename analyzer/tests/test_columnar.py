@@ -0,0 +1,100 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the interactions stored column by column."""
+
+import pytest
+from bson import ObjectId
+
+from analyzer.data import load_interactions
+from analyzer.data.interval import IntervalStore, LOCATIONS
+from analyzer.data.synthetic import Database
+from analyzer.process import RANGES_WIDTHS, _compute_intervals, _load_user
+from analyzer.utilities import aggregate_data_to_list, aggregate_to_csv, \
+    to_csv
+
+from .conftest import USER
+
+BASIC_STATS = [('avg_speed', 'speeds', '_get_average_speed'),
+               ('avg_acceleration', 'accelerations',
+                '_get_average_acceleration')]
+"""The features calculated from the speeds and the accelerations, with the
+columns they use and the methods of the object-based engine."""
+
+
+@pytest.fixture(scope='module')
+def engines(database):
+    """The interactions of the user, in the columnar and in the object-based
+    engine."""
+    return [load_interactions(mongodb=database, user=USER, enable_gc=False,
+                              columnar=columnar)[0]
+            for columnar in (True, False)]
+
+
+@pytest.mark.parametrize('width', [RANGES_WIDTHS[0], RANGES_WIDTHS[-1]])
+@pytest.mark.parametrize('feature, name, method', BASIC_STATS)
+def test_basic_stats(engines, width, feature, name, method):
+    columnar, legacy = engines
+    windows = columnar._get_intervals(width)
+    store = IntervalStore(windows[1])
+    columnar._set_basic_stats(store, feature, name, windows)
+    ranges = list(legacy._get_intervals(width))
+    assert [interval.middle for interval in ranges] == store.middles.tolist()
+    for i, interval in enumerate(ranges):
+        row = store.row(i)
+        expected = getattr(legacy, method)(interval)
+        for location in LOCATIONS:
+            for j, stats in enumerate(getattr(expected, location)):
+                prefix = f"{feature}.{location}.{j}"
+                assert row[store.INDEX[f"{prefix}.sum"]] == stats.sum
+                assert row[store.INDEX[f"{prefix}.avg"]] == stats.avg
+                assert row[store.INDEX[f"{prefix}.std"]] == stats.std
+
+
+
+@pytest.fixture(scope='module')
+def float_database(small_database):
+    """The interactions of `small_database`, some with a float timestamp."""
+    documents = []
+    for i, document in enumerate(small_database['interactions'].find()):
+        document = dict(document)
+        if i % 7 == 0:
+            document['t'] += 0.1
+        elif i % 7 == 3:
+            # An idle time of 0.0, which ends some ranges
+            document['t'] = float(document['t'])
+            documents.append(dict(document, _id=ObjectId()))
+        documents.append(document)
+    return Database(documents)
+
+
+@pytest.mark.parametrize('database_name', ['small_database',
+                                           'float_database'])
+def test_aggregate_csv(request, database_name, websites, tmp_path):
+    database = request.getfixturevalue(database_name)
+    for columnar, name in [(True, 'columnar.csv'), (False, 'legacy.csv')]:
+        interactions = _load_user(USER, websites, database,
+                                  enable_gc=False, enable_columnar=columnar)
+        intervals = _compute_intervals(interactions, enable_gc=False)
+        if columnar:
+            aggregate_to_csv(intervals, interactions, str(tmp_path), name)
+        else:
+            to_csv(aggregate_data_to_list(intervals, interactions),
+                   str(tmp_path), name)
+    assert (tmp_path / 'columnar.csv').read_bytes() == \
+        (tmp_path / 'legacy.csv').read_bytes()
@@ -0,0 +1,50 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the equivalence of the engines with the reference one."""
+
+import pytest
+
+from analyzer.equivalence import compare_user, values_match
+
+from .conftest import USER
+
+
+@pytest.mark.parametrize('options', [
+    dict(),
+    dict(chunks=3),
+    dict(enable_pruning=True),
+    dict(enable_multiprocessing=True),
+], ids=['columnar', 'chunks', 'pruning', 'multiprocessing'])
+def test_compare_user(small_database, websites, options):
+    mismatch, __ = compare_user(USER, websites, small_database, exact=True,
+                                enable_gc=False, enable_columnar=True,
+                                **options)
+    assert mismatch is None
+
+
+@pytest.mark.parametrize('expected, actual, exact, match', [
+    ('0', '0.0', False, True),
+    ('0', '0.0', True, False),
+    ('0.1', '0.10000000000000002', False, True),
+    ('0.1', '0.10000000000000002', True, False),
+    ('nan', 'nan', True, True),
+    ('True', '1', False, False),
+])
+def test_values_match(expected, actual, exact, match):
+    assert values_match(expected, actual, exact=exact) == match
@@ -0,0 +1,105 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the loading of the interactions."""
+
+import mongomock
+import numpy as np
+import pytest
+
+from analyzer.data.columnar import ColumnarInteractions
+from analyzer.data.loader import load_interactions, stream_users_interactions
+from analyzer.data.synthetic import generate_interactions
+
+from .conftest import SEED, USERS
+
+LOADER_SIZE = 1500
+"""The number of interactions stored in ``mongomock`` (it is slow)."""
+EMPTY_USER = f"{len(USERS):024x}"
+"""A user without interactions."""
+
+
+def assert_same_interactions(actual: ColumnarInteractions,
+                             expected: ColumnarInteractions) -> None:
+    """Check that two lists of interactions hold the same values."""
+    assert len(actual.timestamps) == len(expected.timestamps)
+    for name in ColumnarInteractions.COLUMNS:
+        np.testing.assert_array_equal(getattr(actual, name),
+                                      getattr(expected, name), err_msg=name)
+    assert actual.user_values == expected.user_values
+    assert actual.url_values == expected.url_values
+
+
+class Session(object):
+    """A session of ``mongomock``, which does not support them."""
+    __slots__ = ["ended"]
+
+    def __init__(self):
+        self.ended = False
+
+    def end_session(self) -> None:
+        self.ended = True
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """The sessions started on the ``mongomock`` clients."""
+    started = []
+
+    def start_session(__):
+        started.append(Session())
+        return started[-1]
+
+    monkeypatch.setattr(mongomock.MongoClient, 'start_session', start_session)
+    return started
+
+
+@pytest.fixture
+def mongodb(monkeypatch, sessions):
+    """A ``mongomock`` database with the generated interactions."""
+    # The loader counts the documents with the API of pymongo 3
+    monkeypatch.setattr(mongomock.collection.Cursor, 'count',
+                        lambda self: len(list(self.clone())), raising=False)
+    database = mongomock.MongoClient()['analyzer']
+    database['interactions'].insert_many(list(generate_interactions(
+        LOADER_SIZE, users=len(USERS), seed=SEED)))
+    return database
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_stream_users_interactions(mongodb, streaming):
+    users = [EMPTY_USER] + USERS[::-1]
+    streamed = list(stream_users_interactions(mongodb, users))
+    assert sorted(user for user, __ in streamed) == sorted(users)
+    # The users without interactions come last
+    assert streamed[-1][0] == EMPTY_USER
+    for user, interactions in streamed:
+        expected, __ = load_interactions(mongodb=mongodb, user=user,
+                                         enable_gc=False, columnar=True,
+                                         streaming=streaming)
+        assert_same_interactions(interactions, expected)
+    assert not len(dict(streamed)[EMPTY_USER].timestamps)
+
+
+def test_stream_users_interactions_session(mongodb, sessions):
+    streamed = stream_users_interactions(mongodb, USERS)
+    next(streamed)
+    assert len(sessions) == 1 and not sessions[0].ended
+    # The session ends even if the stream is not consumed
+    streamed.close()
+    assert sessions[0].ended
@@ -0,0 +1,68 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the manifest of the processed users."""
+
+import pytest
+
+from analyzer.manifest import Manifest, run_options
+
+from .conftest import USER
+
+OPTIONS = run_options(sample_fraction=0.5, seed=1,
+                      enable_stratification=True, enable_pruning=True)
+"""The options of the recorded run."""
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    user_dir = tmp_path / USER
+    user_dir.mkdir()
+    (user_dir / 'aggregate.csv').write_text('a,b\n1,2\n')
+    manifest = Manifest(str(tmp_path))
+    manifest.complete(USER, 10, 'csv', 1.0, OPTIONS)
+    return manifest
+
+
+def test_is_done(manifest, tmp_path):
+    assert manifest.is_done(USER, 10, 'csv', OPTIONS)
+    # The manifest is read again from the output directory
+    assert Manifest(str(tmp_path)).is_done(USER, 10, 'csv', OPTIONS)
+
+
+@pytest.mark.parametrize('option, value', [
+    ('sample_fraction', 0.25), ('sample_fraction', None), ('seed', 2),
+    ('enable_stratification', False), ('enable_pruning', False)])
+def test_is_done_options(manifest, option, value):
+    options = dict(sample_fraction=0.5, seed=1, enable_stratification=True,
+                   enable_pruning=True)
+    options[option] = value
+    assert not manifest.is_done(USER, 10, 'csv', run_options(**options))
+
+
+def test_is_done_without_options(manifest):
+    # The entries of the previous manifests have no options
+    del manifest.users[USER]['options']
+    assert not manifest.is_done(USER, 10, 'csv', run_options())
+
+
+def test_is_done_stale(manifest, tmp_path):
+    assert not manifest.is_done(USER, 11, 'csv', OPTIONS)
+    assert not manifest.is_done(USER, 10, 'parquet', OPTIONS)
+    (tmp_path / USER / 'aggregate.csv').write_text('a,b\n1,3\n')
+    assert not manifest.is_done(USER, 10, 'csv', OPTIONS)
@@ -0,0 +1,86 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the metrics of a run."""
+
+import csv
+import json
+
+import pytest
+
+from analyzer import process
+from analyzer.metrics import METRICS
+
+from .conftest import USER
+
+
+@pytest.fixture
+def metrics():
+    """The registry of the process, emptied for the test."""
+    samples = METRICS.drain()
+    yield METRICS
+    METRICS.drain()
+    METRICS.extend(samples)
+
+
+def read_rows(path) -> int:
+    with open(path, encoding='utf-8', newline='') as file:
+        return sum(1 for __ in csv.reader(file)) - 1
+
+
+def test_metrics(metrics, database, websites, tmp_path):
+    out_dir = tmp_path / 'out'
+    with metrics.labels(user=USER):
+        process.process_user(USER, websites, database, out_dir=str(out_dir),
+                             enable_gc=False, enable_columnar=True,
+                             enable_pruning=True)
+    metrics.save(str(tmp_path))
+    documents = read_rows(out_dir / USER / 'interactions.csv')
+    frames = read_rows(out_dir / USER / 'aggregate.csv')
+
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as file:
+        content = json.load(file)
+    summary = content['summary']
+    assert {'user', 'load', 'derive', 'prune', 'intervals', 'write'} <= \
+        set(summary)
+    assert summary['user']['count'] == 1
+    assert summary['write']['count'] == 2
+    assert summary['intervals']['count'] == len(process.RANGES_WIDTHS)
+    assert summary['user']['sum'] >= summary['load']['sum'] + \
+        summary['intervals']['sum'] + summary['write']['sum']
+    counters = {}
+    for sample in content['samples']:
+        assert sample['labels']['user'] == USER
+        if sample['type'] == 'counter':
+            counters[sample['name']] = counters.get(sample['name'], 0) + \
+                sample['value']
+    assert counters['documents'] == documents
+    assert counters['emotion_frames'] == frames
+    interactions = process._load_user(USER, websites, database,
+                                      enable_gc=False, enable_columnar=True)
+    pruned, __ = process._prune_user(interactions)
+    assert counters['pruned_interactions'] == documents - len(pruned)
+    assert counters['ranges'] == frames * len(process.RANGES_WIDTHS)
+
+    lines = (tmp_path / 'metrics.prom').read_text(encoding='utf-8') \
+        .splitlines()
+    assert '# TYPE analyzer_stage_seconds summary' in lines
+    assert f'analyzer_stage_seconds_count{{stage="write",user="{USER}"}} 2' \
+        in lines
+    assert f'analyzer_documents_total{{user="{USER}"}} {documents}' in lines
+    assert f'analyzer_emotion_frames_total{{user="{USER}"}} {frames}' in lines
@@ -0,0 +1,134 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the processing of several users."""
+
+import json
+import os
+import threading
+
+import pytest
+
+from analyzer import process
+from analyzer.manifest import DONE, FAILED, MANIFEST_NAME, Manifest
+
+from .conftest import USER, USERS
+
+FAILING_USER = USERS[1]
+"""The user whose processing fails."""
+
+
+@pytest.fixture
+def pool_database(database, websites, monkeypatch):
+    """Make the processes of the pool read the in-memory database (they are
+    forked, so they inherit it), and the processing of a user fail."""
+    init_worker, load_user = process._init_worker, process._load_user
+
+    def init_database_worker(db_uri, websites, options,
+                             enable_tracemalloc=False):
+        init_worker(None, websites, options, enable_tracemalloc)
+        process._worker_db = database
+
+    def failing_load_user(user, *args, **kwargs):
+        if user == FAILING_USER:
+            raise RuntimeError("The database went away")
+        return load_user(user, *args, **kwargs)
+
+    monkeypatch.setattr(process, '_init_worker', init_database_worker)
+    monkeypatch.setattr(process, '_load_user', failing_load_user)
+    return database
+
+
+def test_process_users_failure(pool_database, websites, tmp_path):
+    out_dir = str(tmp_path)
+    manifest = Manifest(out_dir)
+    counts = {user: 1 for user in USERS}
+    user_times = process.process_users(
+        USERS, websites, db_uri=None, counts=counts, n_workers=2,
+        enable_gc=False, out_dir=out_dir, enable_columnar=True,
+        manifest=manifest)
+    assert len(user_times) == len(USERS) - 1
+    with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as file:
+        entries = json.load(file)['users']
+    assert entries[FAILING_USER]['status'] == FAILED
+    assert 'The database went away' in entries[FAILING_USER]['error']
+    for user in USERS:
+        if user != FAILING_USER:
+            assert entries[user]['status'] == DONE
+            assert entries[user]['outputs']
+
+
+@pytest.mark.parametrize('enable_pruning', [False, True])
+def test_process_user_sampled(database, websites, tmp_path, enable_pruning):
+    # The workers computing the widths use the sampled frames too
+    outputs = {}
+    for enable_multiprocessing in (False, True):
+        out_dir = tmp_path / str(enable_multiprocessing)
+        process.process_user(USER, websites, database, out_dir=str(out_dir),
+                             enable_gc=False,
+                             enable_multiprocessing=enable_multiprocessing,
+                             enable_columnar=True,
+                             enable_pruning=enable_pruning,
+                             sample_fraction=0.1, seed=1)
+        outputs[enable_multiprocessing] = \
+            (out_dir / USER / 'aggregate.csv').read_bytes()
+    assert outputs[False] == outputs[True]
+    full_dir = tmp_path / 'full'
+    process.process_user(USER, websites, database, out_dir=str(full_dir),
+                         enable_gc=False, enable_columnar=True)
+    assert len(outputs[True]) < len((full_dir / USER /
+                                     'aggregate.csv').read_bytes())
+
+
+def test_process_users_pipelined(database, websites, tmp_path):
+    for user in USERS:
+        process.process_user(user, websites, database,
+                             out_dir=str(tmp_path / 'sequential'),
+                             enable_gc=False, enable_columnar=True)
+    user_times = process.process_users_pipelined(
+        ((user, None) for user in USERS), websites, database, depth=1,
+        total_users=len(USERS), out_dir=str(tmp_path / 'pipelined'),
+        enable_gc=False, enable_columnar=True)
+    assert len(user_times) == len(USERS)
+    for user in USERS:
+        for name in ('interactions.csv', 'aggregate.csv'):
+            assert (tmp_path / 'pipelined' / user / name).read_bytes() == \
+                (tmp_path / 'sequential' / user / name).read_bytes()
+
+
+@pytest.mark.parametrize('stage', ['_load_user', '_compute_intervals'])
+def test_process_users_pipelined_failure(database, websites, tmp_path,
+                                         monkeypatch, stage):
+    function = getattr(process, stage)
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("The stage failed")
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(process, stage, failing)
+    # More users than the queues can hold
+    with pytest.raises(RuntimeError, match="The stage failed"):
+        process.process_users_pipelined(
+            ((user, None) for user in USERS * 3), websites, database,
+            depth=1, out_dir=str(tmp_path), enable_gc=False,
+            enable_columnar=True)
+    assert not [thread for thread in threading.enumerate()
+                if thread.name in ('loader', 'writer')]
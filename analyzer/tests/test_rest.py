@@ -0,0 +1,131 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the loading of the interactions from the REST APIs.
+
+The APIs are served by a local stub server, which answers the requests of
+the later pages first.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from analyzer.data import loader
+from analyzer.data.loader import count_interactions, fetch_pages, \
+    load_interactions
+
+from .conftest import USERS
+from .test_loader import assert_same_interactions
+
+ITEMS = 100
+"""The number of objects of the paginated test endpoint."""
+PAGE_SIZE = 7
+"""The number of objects of each page of the test endpoint."""
+CONCURRENCY = 4
+"""The number of pages requested at the same time."""
+DELAY = 0.05
+"""The delay of the first page, in seconds (the following pages are
+faster)."""
+
+
+class StubAPIs(BaseHTTPRequestHandler):
+    """The REST APIs, serving the generated interactions and the numbers up
+    to `ITEMS`, and counting the interactions of each user."""
+    documents: list = []
+    answered: list = []
+
+    def do_GET(self):
+        match = re.fullmatch(r'/api/(?:interactions|items)/(\d+)-(\d+)',
+                             self.path)
+        user = re.fullmatch(r'/api/user/(\w+)/interactions/count', self.path)
+        if self.path == '/api/interactions/count':
+            body = str(len(self.documents))
+        elif user is not None:
+            # The first users are answered last
+            time.sleep(DELAY / (1 + USERS.index(user[1])))
+            body = str(sum(document['ui'] == user[1]
+                           for document in self.documents))
+            self.answered.append(user[1])
+        elif match is not None:
+            start, size = int(match[1]), int(match[2])
+            # The later pages are answered first
+            time.sleep(DELAY / (1 + start // size))
+            if self.path.startswith('/api/items/'):
+                content = list(range(start, min(start + size, ITEMS)))
+            else:
+                content = self.documents[start:start + size]
+            body = json.dumps(content, default=str)
+            self.answered.append(start)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *__):
+        pass
+
+
+@pytest.fixture
+def api_url(documents, monkeypatch):
+    """The URL of the stub server, used as the one of the REST APIs."""
+    monkeypatch.setattr(StubAPIs, 'documents', documents)
+    monkeypatch.setattr(StubAPIs, 'answered', [])
+    monkeypatch.setattr(loader, 'REST_CONCURRENCY', CONCURRENCY)
+    monkeypatch.setattr(loader, '_session', None)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubAPIs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(loader, 'BASE_API_URL', url)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('pages', [-(-ITEMS // PAGE_SIZE), 5])
+def test_fetch_pages(api_url, pages):
+    # The pages that were not counted are fetched while the last one is full
+    fetched = list(fetch_pages(f"{api_url}/api/items/{{}}-{{}}", pages,
+                               PAGE_SIZE))
+    assert [item for page in fetched for item in page] == list(range(ITEMS))
+    assert StubAPIs.answered != sorted(StubAPIs.answered)
+
+
+def test_load_interactions(api_url, database):
+    interactions, __ = load_interactions(enable_gc=False, columnar=True)
+    expected, __ = load_interactions(mongodb=database, enable_gc=False,
+                                     columnar=True)
+    assert_same_interactions(interactions, expected)
+
+
+def test_count_interactions(api_url, documents):
+    counts, __ = count_interactions(USERS)
+    assert counts == {user: sum(document['ui'] == user
+                                for document in documents)
+                      for user in USERS}
+    # The users are counted at the same time
+    assert StubAPIs.answered != USERS
@@ -0,0 +1,109 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the files written by the utilities."""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from analyzer.data.interval import LOCATIONS
+from analyzer.process import _compute_intervals, _load_user, _prune_user
+from analyzer.utilities import aggregate_columns, aggregate_data_to_list, \
+    aggregate_to_csv, aggregate_to_npy, aggregate_to_parquet, to_csv
+
+from .conftest import USER
+
+
+@pytest.fixture(scope='module')
+def aggregate(database, websites):
+    """The interactions of the user and the data of their ranges."""
+    interactions = _load_user(USER, websites, database, enable_gc=False,
+                              enable_columnar=True)
+    return interactions, _compute_intervals(interactions, enable_gc=False)
+
+
+def read_csv(path):
+    """Read the header and the columns of a CSV file."""
+    with open(path, encoding='utf-8', newline='') as file:
+        header, *rows = csv.reader(file)
+    return header, list(zip(*rows))
+
+
+def test_aggregate_to_csv(aggregate, tmp_path):
+    interactions, intervals = aggregate
+    aggregate_to_csv(intervals, interactions, str(tmp_path), 'aggregate.csv')
+    to_csv(aggregate_data_to_list(intervals, interactions), str(tmp_path),
+           'legacy.csv')
+    assert (tmp_path / 'aggregate.csv').read_bytes() == \
+        (tmp_path / 'legacy.csv').read_bytes()
+
+
+def test_aggregate_to_parquet(aggregate, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    interactions, intervals = aggregate
+    aggregate_to_csv(intervals, interactions, str(tmp_path), 'aggregate.csv')
+    aggregate_to_parquet(intervals, interactions, str(tmp_path),
+                         'aggregate.parquet')
+    header, columns = read_csv(tmp_path / 'aggregate.csv')
+    table = pq.read_table(tmp_path / 'aggregate.parquet')
+    assert table.column_names == header
+    assert table.num_rows == len(columns[0])
+    for name, expected in zip(header, columns):
+        for actual, value in zip(table.column(name).to_pylist(), expected):
+            if value == '':
+                assert actual is None, name
+            elif isinstance(actual, (bool, str)):
+                assert str(actual) == value, name
+            else:
+                assert actual == float(value), name
+
+
+@pytest.mark.parametrize('enable_pruning', [False, True])
+def test_aggregate_to_npy(aggregate, tmp_path, enable_pruning):
+    interactions, intervals = aggregate
+    pruned = interactions
+    if enable_pruning:
+        pruned, __ = _prune_user(interactions)
+        intervals = _compute_intervals(pruned, enable_gc=False)
+    aggregate_to_csv(intervals, pruned, str(tmp_path), 'aggregate.csv')
+    aggregate_to_npy(intervals, str(tmp_path),
+                     interaction_rows=getattr(pruned, 'rows', None))
+    header, columns = read_csv(tmp_path / 'aggregate.csv')
+    columns = dict(zip(header, columns))
+    with open(tmp_path / 'aggregate.json', encoding='utf-8') as file:
+        index = json.load(file)
+    assert index['locations'] == list(LOCATIONS)
+
+    # The middles are the rows of the full interactions
+    middles = np.load(tmp_path / index['middles'], mmap_mode='r')
+    assert [str(interactions[i].id) for i in middles.tolist()] == \
+        list(columns['middle.id'])
+    for width, name in index['widths'].items():
+        tensor = np.load(tmp_path / name, mmap_mode='r')
+        assert isinstance(tensor, np.memmap)
+        assert tensor.shape == (index['ranges'], len(index['features']),
+                                len(LOCATIONS))
+        names, __ = aggregate_columns(int(width))
+        expected = np.array([[float(value) if value else np.nan
+                              for value in columns[column]]
+                             for column in names], dtype=np.float32)
+        actual = tensor.transpose(2, 1, 0).reshape(len(names), -1)
+        np.testing.assert_array_equal(actual, expected)
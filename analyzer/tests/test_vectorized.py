@@ -0,0 +1,86 @@
+#  This file is part of 'analyzer', the tool used to process the information
+#  collected for Andrea Esposito's Thesis.
+#  Copyright (C) 2020  Andrea Esposito
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The tests of the vectorized functions of the columnar engine."""
+
+import numpy as np
+import pytest
+
+from analyzer.data.vectorized import WINDOW_BLOCK_SIZE, window_statistics
+
+from .conftest import SEED
+
+TIMELINE_SIZE = 1000000
+"""The number of values of the long timeline."""
+WINDOWS = 2000
+"""The number of slices taken from the long timeline."""
+
+
+def reference_statistics(values):
+    """The sum, the mean and the variance calculated by `InteractionsList`."""
+    total = sum(values)
+    mean = total / len(values)
+    return total, mean, sum((value - mean) ** 2 for value in values) / \
+        len(values)
+
+
+@pytest.fixture(scope='module')
+def timeline():
+    """A long timeline of heavy-tailed values: mostly zeros (the interactions
+    without movements) and a few huge peaks."""
+    rng = np.random.default_rng(SEED)
+    values = rng.standard_cauchy((TIMELINE_SIZE, 3)) * 1000
+    values[rng.random(TIMELINE_SIZE) < 0.9] = 0
+    return values
+
+
+@pytest.fixture(scope='module')
+def windows():
+    """Slices of any length, many of them at the end of the timeline."""
+    rng = np.random.default_rng(SEED)
+    sizes = np.concatenate([rng.integers(1, 10, WINDOWS // 2),
+                            rng.integers(1, 5000, WINDOWS // 2)])
+    starts = rng.integers(0, TIMELINE_SIZE - sizes)
+    starts[::4] = TIMELINE_SIZE - sizes[::4]
+    return starts, starts + sizes
+
+
+@pytest.mark.parametrize('block_size', [100, WINDOW_BLOCK_SIZE])
+def test_window_statistics(timeline, windows, block_size, monkeypatch):
+    # The smaller blocks hold a single slice
+    monkeypatch.setattr('analyzer.data.vectorized.WINDOW_BLOCK_SIZE',
+                        block_size)
+    starts, ends = windows
+    sums, means, variances = window_statistics(timeline, starts, ends)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        for column in range(timeline.shape[1]):
+            total, mean, variance = reference_statistics(
+                timeline[start:end, column].tolist())
+            assert sums[i, column] == total
+            assert means[i, column] == mean
+            assert variances[i, column] == variance
+
+
+def test_window_statistics_constant(timeline):
+    # The slices of equal values have no variance, wherever they are
+    zeros = np.flatnonzero(timeline[:, 0] == 0)
+    starts = zeros[np.flatnonzero(np.diff(zeros) == 1)]
+    sums, means, variances = window_statistics(timeline[:, 0], starts,
+                                               starts + 2)
+    assert not sums.any() and not means.any() and not variances.any()
+
@@ -25,11 +25,17 @@ import gc
 import logging
 import pathlib
 import time
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    # Without the 'parquet' extra, the CSV files are read
+    pq = None
+
 logger = logging.getLogger(__name__)
 
 KEYS_TO_INCLUDE = {
@@ -66,7 +72,9 @@ def load_dataset(base_path: str = '.', width: int = None,
     base_path : str
         The path to the folder containing the dataset. This must contain the
         users' file and the websites' file and, unless `full_dataset` is
-        specified, a folder for each user containing the aggregate data.
+        specified, a folder for each user containing the aggregate data
+        (either 'aggregate.parquet' or 'aggregate.csv'). The Parquet files
+        are read only if pyarrow is installed.
     width : int
         The interval width to be read. If None, all the intervals will be read.
     location : "before", "after", "full", None
@@ -142,8 +150,16 @@ def load_dataset(base_path: str = '.', width: int = None,
         for i, user_id in enumerate(user_ids, 1):
             logger.info("Loading user '%s' (%d of %d)", user_id, i,
                         len(user_ids))
+            parquet_path = pathlib.Path(base_path) / user_id / \
+                'aggregate.parquet'
             path = pathlib.Path(base_path) / user_id / 'aggregate.csv'
-            if not path.exists():
+            if parquet_path.exists() and pq is not None:
+                logger.debug("Loading Parquet file for user '%s'", user_id)
+                yield read_parquet(parquet_path, can_take_column)
+            elif not path.exists():
+                if parquet_path.exists():
+                    logger.warning("Skipping user '%s': reading '%s' "
+                                   "requires pyarrow", user_id, parquet_path)
                 yield pd.DataFrame()
             else:
                 logger.debug("Loading CSV for user '%s'", user_id)
@@ -222,6 +238,26 @@ def load_dataset(base_path: str = '.', width: int = None,
     return x, y
 
 
+def read_parquet(path: pathlib.Path,
+                 can_take_column: Callable[[str], bool]) -> pd.DataFrame:
+    """Read the aggregate data of a user from a Parquet file.
+
+    Only the selected columns are read. The dictionary-encoded columns are
+    converted to plain values, as if they were read from a CSV file.
+
+    :param path: The path of the file.
+    :param can_take_column: A function telling whether a column is needed.
+    :return: The dataframe containing the selected columns.
+    """
+    columns = [col for col in pq.read_schema(path).names
+               if can_take_column(col)]
+    df = pq.read_table(path, columns=columns).to_pandas()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
 def discretize_emotions(data: pd.DataFrame, steps: int = 7) -> pd.DataFrame:
     """Discretize the emotions.
     :param data: The dataframe containing the emotions to be discretized.
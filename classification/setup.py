@@ -22,6 +22,9 @@ setup(
         'joblib',
         'pyyaml'
     ],
+    extras_require={
+        'parquet': ['pyarrow']
+    },
     entry_points={
         'console_scripts': [
             f'{classification.__prog__}=classification.cli:main'